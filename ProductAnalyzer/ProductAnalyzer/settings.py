@@ -93,10 +93,98 @@ DATABASES = {
 
 # Add Groq settings
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+# Any Groq/OpenAI-compatible endpoint can stand in for Groq, e.g. the fake server benchmark_llm starts
+LLM_BASE_URL = os.getenv('LLM_BASE_URL') or None
+LLM_MODEL = os.getenv('LLM_MODEL', 'llama-3.2-3b-preview')
+# Summary chunks sent to the LLM concurrently, and the provider's per-minute limits to respect until
+# its x-ratelimit-* response headers report the real ones
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '4'))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', '30'))
+LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', '6000'))
+# Connections kept open to the LLM backend; the pool is shared by every job in a worker process
+LLM_HTTP_POOL_SIZE = int(os.getenv('LLM_HTTP_POOL_SIZE', '16'))
+# Failed requests are tried up to LLM_RETRY_ATTEMPTS times in all. Each retry waits for the provider's
+# retry-after, or a random time of up to LLM_RETRY_BASE_SECONDS doubled per attempt, at most LLM_RETRY_MAX_SECONDS
+LLM_RETRY_ATTEMPTS = int(os.getenv('LLM_RETRY_ATTEMPTS', '3'))
+LLM_RETRY_BASE_SECONDS = float(os.getenv('LLM_RETRY_BASE_SECONDS', '0.5'))
+LLM_RETRY_MAX_SECONDS = float(os.getenv('LLM_RETRY_MAX_SECONDS', '10'))
+# Hedged requests: once LLM_HEDGE_MIN_SAMPLES latencies have been seen, a request still unanswered at the
+# LLM_HEDGE_PERCENTILE latency (at most LLM_HEDGE_MAX_MEDIAN_MULTIPLE times the median) is sent again and
+# whichever answers first is used. At most LLM_HEDGE_MAX_IN_FLIGHT copies are out at once, on top of
+# LLM_MAX_IN_FLIGHT, and only while the per-minute limits have room for them
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'False') == 'True'
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '0.9'))
+LLM_HEDGE_MAX_MEDIAN_MULTIPLE = float(os.getenv('LLM_HEDGE_MAX_MEDIAN_MULTIPLE', '2'))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '10'))
+LLM_HEDGE_MAX_IN_FLIGHT = int(os.getenv('LLM_HEDGE_MAX_IN_FLIGHT', '2'))
+# Summary requests are packed up to these prompt and completion (max_tokens) budgets, counting
+# LLM_SUMMARY_TOKENS of output per product
+LLM_INPUT_TOKEN_BUDGET = int(os.getenv('LLM_INPUT_TOKEN_BUDGET', '2500'))
+LLM_OUTPUT_TOKEN_BUDGET = int(os.getenv('LLM_OUTPUT_TOKEN_BUDGET', '800'))
+LLM_SUMMARY_TOKENS = int(os.getenv('LLM_SUMMARY_TOKENS', '125'))
+# Products a summary response left out are sent again on their own up to this many times
+LLM_SUMMARY_RETRIES = int(os.getenv('LLM_SUMMARY_RETRIES', '2'))
+# Summaries are written back in batches of up to this size, and at the latest when their request finishes
+LLM_WRITE_BATCH_SIZE = int(os.getenv('LLM_WRITE_BATCH_SIZE', '200'))
+# Process jobs lease unsummarized products in batches of this size so concurrent jobs never summarize
+# the same product; leases left behind by a job that died expire after LLM_LEASE_SECONDS
+LLM_CLAIM_BATCH_SIZE = int(os.getenv('LLM_CLAIM_BATCH_SIZE', '100'))
+LLM_LEASE_SECONDS = int(os.getenv('LLM_LEASE_SECONDS', '1800'))
+# Summaries are cached by model, prompt version and product content; entries unused for the TTL
+# are evicted, and the least recently used ones beyond the entry limit
+LLM_SUMMARY_CACHE_ENABLED = os.getenv('LLM_SUMMARY_CACHE_ENABLED', 'True') == 'True'
+LLM_SUMMARY_CACHE_TTL_DAYS = int(os.getenv('LLM_SUMMARY_CACHE_TTL_DAYS', '90'))
+LLM_SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv('LLM_SUMMARY_CACHE_MAX_ENTRIES', '100000'))
+# Products whose description SimHashes are at most this many of 64 bits apart are treated as variants of one
+# product: flagged with duplicate_of when scraped, and summarized once with the summary shared
+NEAR_DUPLICATE_ENABLED = os.getenv('NEAR_DUPLICATE_ENABLED', 'True') == 'True'
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', '4'))
+# Every LLM call is recorded in the LLMCall table (see /api/metrics/) and kept for LLM_METRICS_RETENTION_DAYS.
+# Call costs use these US dollar prices per million prompt and completion tokens
+LLM_METRICS_RETENTION_DAYS = int(os.getenv('LLM_METRICS_RETENTION_DAYS', '30'))
+LLM_PROMPT_COST_PER_MILLION = float(os.getenv('LLM_PROMPT_COST_PER_MILLION', '0.06'))
+LLM_COMPLETION_COST_PER_MILLION = float(os.getenv('LLM_COMPLETION_COST_PER_MILLION', '0.06'))
 
 # Add scraper settings
 MAX_SCRAPE_PAGES = int(os.getenv('MAX_SCRAPE_PAGES', '10'))
 SCRAPE_DELAY = int(os.getenv('SCRAPE_DELAY', '2'))
+# Concurrent scraper: requests kept in flight, and per-host requests/second with burst size
+SCRAPE_CONCURRENCY = int(os.getenv('SCRAPE_CONCURRENCY', '8'))
+SCRAPE_RATE_LIMIT = float(os.getenv('SCRAPE_RATE_LIMIT', '0.67'))
+SCRAPE_BURST = float(os.getenv('SCRAPE_BURST', '2'))
+# Adaptive (AIMD) control: the concurrency and rate above are starting points, raised while Amazon
+# answers normally and halved on block pages, 429/503 and timeouts, within these bounds
+SCRAPE_ADAPTIVE = os.getenv('SCRAPE_ADAPTIVE', 'True') == 'True'
+SCRAPE_MAX_CONCURRENCY = int(os.getenv('SCRAPE_MAX_CONCURRENCY', '32'))
+SCRAPE_MAX_RATE = float(os.getenv('SCRAPE_MAX_RATE', '4'))
+SCRAPE_MIN_RATE = float(os.getenv('SCRAPE_MIN_RATE', '0.1'))
+# HTML extraction backend: auto, lxml, targeted or soup (the full parse, also used as fallback)
+SCRAPE_PARSER = os.getenv('SCRAPE_PARSER', 'auto')
+# Read product pages only until the title, price, rating and feature bullets have been seen
+SCRAPE_STREAM_PRODUCTS = os.getenv('SCRAPE_STREAM_PRODUCTS', 'True') == 'True'
+# On-disk cache of product pages shared by all processes (TTL in seconds, size bound in MB)
+SCRAPE_CACHE_ENABLED = os.getenv('SCRAPE_CACHE_ENABLED', 'True') == 'True'
+SCRAPE_CACHE_PATH = os.getenv('SCRAPE_CACHE_PATH', os.path.join(BASE_DIR, 'scrape_cache.sqlite3'))
+SCRAPE_CACHE_TTL = int(os.getenv('SCRAPE_CACHE_TTL', '21600'))
+SCRAPE_CACHE_MAX_MB = int(os.getenv('SCRAPE_CACHE_MAX_MB', '200'))
+# Incremental scrapes skip products refreshed within this many hours (0 disables skipping)
+SCRAPE_FRESHNESS_HOURS = int(os.getenv('SCRAPE_FRESHNESS_HOURS', '24'))
+# Scraped products are written to the database in batches of this size as they arrive
+SCRAPE_WRITE_BATCH_SIZE = int(os.getenv('SCRAPE_WRITE_BATCH_SIZE', '20'))
+
+# Background jobs: worker poll interval, progress/heartbeat period, and when a silent running job is requeued
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '2'))
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '5'))
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', '300'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Distributed scraping: product pages go through a shared URL frontier that any number of
+# frontier workers lease batches from; a lease must outlive the batch it covers
+SCRAPE_DISTRIBUTED = os.getenv('SCRAPE_DISTRIBUTED', 'False') == 'True'
+FRONTIER_BATCH_SIZE = int(os.getenv('FRONTIER_BATCH_SIZE', '8'))
+FRONTIER_LEASE_SECONDS = int(os.getenv('FRONTIER_LEASE_SECONDS', '600'))
+FRONTIER_MAX_ATTEMPTS = int(os.getenv('FRONTIER_MAX_ATTEMPTS', '3'))
+# Largest page_size the product list API accepts
+PRODUCT_PAGE_MAX_SIZE = int(os.getenv('PRODUCT_PAGE_MAX_SIZE', '100'))
 
 
 # Password validation
@@ -180,5 +268,11 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': False,
         },
+        # httpx logs every request at INFO, which floods the log during concurrent scrapes
+        'httpx': {
+            'handlers': ['console', 'file'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
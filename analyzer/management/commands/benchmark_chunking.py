@@ -0,0 +1,72 @@
+import json
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analyzer.models import Product
+from analyzer.services.chunking import pack_payloads, payload_tokens
+from analyzer.services.fake_amazon import load_products
+from analyzer.services.groq_client import GroqClient
+from analyzer.services.llm_rate_limiter import estimate_tokens
+from analyzer.services.llm_service import SUMMARY_FORMAT, LLMService
+
+
+def fixed_chunks(payloads: list, chunk_size: int = 5) -> list:
+    """The previous chunking: groups of 5, or 3 when the remainder would have been 3"""
+    if len(payloads) % chunk_size == 3:
+        chunk_size = 3
+    return [payloads[i:i + chunk_size] for i in range(0, len(payloads), chunk_size)]
+
+
+class Command(BaseCommand):
+    help = "Compare LLM calls and tokens per 1,000 products between fixed-size chunks and token-budget packing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--search-key', type=str, default=None, help="Use these stored products instead of products_backup.json")
+        parser.add_argument('--products', type=int, default=1000, help="Products to pack, cycling through the source")
+
+    def handle(self, *args, **options):
+        if options['search_key']:
+            source = [LLMService._product_payload(p) for p in Product.objects.filter(search_key=options['search_key'])]
+        else:
+            source = [
+                {'uuid': p['uuid'], 'name': p['name'], 'description': p['description'],
+                 'price': float(p['price']), 'rating': p.get('rating')}
+                for p in load_products()
+            ]
+        if not source:
+            self.stderr.write("No products to pack")
+            return
+        payloads = list(islice(cycle(source), options['products']))
+
+        overhead = estimate_tokens(GroqClient.format_structured_prompt(LLMService._summary_prompt([]), SUMMARY_FORMAT))
+        budgets = (settings.LLM_INPUT_TOKEN_BUDGET, settings.LLM_OUTPUT_TOKEN_BUDGET, settings.LLM_SUMMARY_TOKENS)
+        self.stdout.write(
+            f"{len(payloads)} products, input budget {budgets[0]} tokens, output budget {budgets[1]} tokens "
+            f"({budgets[2]} per summary), prompt overhead {overhead} tokens"
+        )
+
+        # The old prompt serialized products with indent=2, which the packed prompt no longer does
+        indented = lambda chunk: estimate_tokens(json.dumps(chunk, indent=2))
+        compact = lambda chunk: sum(payload_tokens(p) for p in chunk)
+        self._report('fixed', fixed_chunks(payloads), overhead, indented, budgets, len(payloads))
+        self._report('packed', pack_payloads(payloads, *budgets, overhead_tokens=overhead), overhead, compact, budgets, len(payloads))
+
+    def _report(self, label: str, chunks: list, overhead: int, size, budgets, products: int):
+        input_budget, output_budget, per_summary = budgets
+        input_tokens = [overhead + size(chunk) for chunk in chunks]
+        output_tokens = [len(chunk) * per_summary for chunk in chunks]
+        # Requests over a budget are the ones that fail or truncate and fall into the recursive split
+        over_budget = sum(
+            1 for tokens_in, tokens_out in zip(input_tokens, output_tokens)
+            if tokens_in > input_budget or tokens_out > output_budget
+        )
+        scale = 1000 / products
+        fill = sum(tokens_out / output_budget for tokens_out in output_tokens) / len(chunks)
+        self.stdout.write(
+            f"{label:>7}: {len(chunks) * scale:6.1f} calls/1k products, "
+            f"{sum(input_tokens) * scale:8.0f} input + {sum(output_tokens) * scale:7.0f} output tokens/1k products, "
+            f"{sum(input_tokens) / len(chunks):5.0f} input tokens/call, output budget {fill:.0%} used, "
+            f"{over_budget} calls over budget"
+        )
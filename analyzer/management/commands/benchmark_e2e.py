@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analyzer.management.commands.run_scraper import AmazonScraper, AsyncAmazonScraper
+from analyzer.services.fake_amazon import FakeAmazonServer
+from analyzer.services.timings import Timings
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure end-to-end scraper throughput, request latency percentiles and parse cost "
+        "against the local fake Amazon, with optional latency, error and block injection"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scraper', choices=['async', 'sequential'], default='async')
+        parser.add_argument('--pages', type=int, default=2, help="Search pages to scrape")
+        parser.add_argument('--latency', type=float, default=0.2, help="Base response latency in seconds")
+        parser.add_argument('--jitter', type=float, default=0.1, help="Random extra latency, up to this many seconds")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests answered with 503")
+        parser.add_argument('--block-rate', type=float, default=0.0, help="Share of requests answered with the block page")
+        parser.add_argument('--multiplier', type=int, default=1, help="Synthetic variants served per backup product")
+        parser.add_argument('--page-kb', type=int, default=400, help="Approximate size of generated product pages")
+        parser.add_argument('--replay', type=str, default=None, help="Serve pages captured by record_amazon_pages")
+        parser.add_argument('--concurrency', type=int, default=None)
+        parser.add_argument('--rate', type=float, default=None, help="Per-host requests/second for the async scraper")
+        parser.add_argument('--delay', action='store_true', help="Keep the sequential scraper's politeness delay")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with FakeAmazonServer(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            error_rate=options['error_rate'],
+            block_rate=options['block_rate'],
+            multiplier=options['multiplier'],
+            padding_kb=options['page_kb'],
+            replay_dir=options['replay'],
+            seed=options['seed']
+        ) as server:
+            if options['scraper'] == 'async':
+                scraper = AsyncAmazonScraper(
+                    origin=server.origin,
+                    concurrency=options['concurrency'],
+                    rate=options['rate']
+                )
+            else:
+                scraper = AmazonScraper(origin=server.origin)
+                if not options['delay']:
+                    scraper.DELAY_RANGE = (0, 0)
+            scraper.cache = None
+            scraper.timings = Timings()
+
+            started = time.perf_counter()
+            products = self._scrape(scraper, options['pages'])
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{options['scraper']}: {products} products, {server.counters['requests']} requests in {elapsed:.1f}s "
+            f"({server.counters['requests'] / elapsed:.2f} requests/s, {products / elapsed:.2f} products/s)"
+        )
+        self.stdout.write(
+            f"injected: {server.counters['errors']} errors, {server.counters['blocks']} blocks "
+            f"of {server.counters['requests']} requests"
+        )
+        summary = scraper.timings.summary()
+        for kind in ('request', 'parse'):
+            if kind in summary:
+                stats = summary[kind]
+                self.stdout.write(
+                    f"{kind:>8}: p50 {stats['p50_ms']:.1f} ms, p90 {stats['p90_ms']:.1f} ms, "
+                    f"p99 {stats['p99_ms']:.1f} ms, max {stats['max_ms']:.1f} ms over {stats['count']}"
+                )
+        if 'parse' in summary:
+            self.stdout.write(f"parsing took {summary['parse']['total_s'] / elapsed:.1%} of the wall time")
+        if isinstance(scraper, AsyncAmazonScraper):
+            self.stdout.write(f"adaptive: {scraper.controller.stats()}")
+            self.stdout.write(f"streaming: {scraper.stream_stats()}")
+
+    def _scrape(self, scraper, max_pages: int) -> int:
+        if isinstance(scraper, AsyncAmazonScraper):
+            return sum(1 for _ in scraper.iter_products('laptops', max_pages))
+        links = scraper.get_product_links('laptops', max_pages)
+        return sum(1 for url in links if scraper.scrape_product(url, 'laptops'))
@@ -0,0 +1,122 @@
+import math
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from analyzer.models import Product
+from analyzer.services.fake_amazon import load_products, multiply_products
+from analyzer.services.fake_groq import FakeGroqServer
+from analyzer.services.llm_service import LLMService
+
+SEARCH_KEY = 'benchmark-llm'
+
+
+class Command(BaseCommand):
+    help = (
+        "Run process_products over a seeded catalogue against a local fake Groq server and report "
+        "summaries/second, tokens per summary and wasted calls, with optional latency, limits and faults"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500, help="Products to summarize")
+        parser.add_argument('--latency', type=float, default=0.3, help="Seconds before each response starts")
+        parser.add_argument('--jitter', type=float, default=0.1, help="Random extra latency, up to this many seconds")
+        parser.add_argument('--stall-rate', type=float, default=0.0, help="Share of responses stalled for --stall-seconds")
+        parser.add_argument('--stall-seconds', type=float, default=3.0, help="Extra latency of a stalled response")
+        parser.add_argument('--hedge', action='store_true', help="Send a second copy of requests slower than the hedging deadline")
+        parser.add_argument('--tokens-per-second', type=float, default=800, help="Generation speed of the fake model")
+        parser.add_argument('--rpm', type=int, default=None, help="Requests per minute the server allows")
+        parser.add_argument('--tpm', type=int, default=None, help="Tokens per minute the server allows")
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Share of requests answered with 429")
+        parser.add_argument('--malformed-rate', type=float, default=0.0, help="Share of responses with broken JSON")
+        parser.add_argument('--skip-rate', type=float, default=0.0, help="Share of products left out of responses")
+        parser.add_argument('--max-in-flight', type=int, default=None, help="Overrides LLM_MAX_IN_FLIGHT")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        source = load_products()
+        catalogue = multiply_products(source, math.ceil(options['products'] / len(source)), options['seed'])
+        catalogue = catalogue[:options['products']]
+
+        limits = {
+            # The client starts from the server's real limits, or effectively none when it has none
+            'LLM_REQUESTS_PER_MINUTE': options['rpm'] or 1000000,
+            'LLM_TOKENS_PER_MINUTE': options['tpm'] or 1000000000,
+            'LLM_SUMMARY_CACHE_ENABLED': False,
+            # The synthetic variants share their description, so near-duplicate sharing would skip them all
+            'NEAR_DUPLICATE_ENABLED': False,
+            'LLM_HEDGE_ENABLED': options['hedge'],
+        }
+        if options['max_in_flight']:
+            limits['LLM_MAX_IN_FLIGHT'] = options['max_in_flight']
+
+        with FakeGroqServer(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            stall_rate=options['stall_rate'],
+            stall_seconds=options['stall_seconds'],
+            tokens_per_second=options['tokens_per_second'],
+            requests_per_minute=options['rpm'],
+            tokens_per_minute=options['tpm'],
+            rate_limit_rate=options['rate_limit_rate'],
+            malformed_rate=options['malformed_rate'],
+            skip_rate=options['skip_rate'],
+            seed=options['seed']
+        ) as server, override_settings(**limits), transaction.atomic():
+            products = Product.objects.bulk_create([
+                Product(
+                    name=p['name'], price=p['price'], rating=p.get('rating'), description=p['description'],
+                    url=p['url'], asin=p['asin'], search_key=SEARCH_KEY
+                )
+                for p in catalogue
+            ])
+            service = LLMService(base_url=server.origin, api_key='fake-groq-key')
+
+            started = time.perf_counter()
+            trends = service.process_products(products)
+            elapsed = time.perf_counter() - started
+
+            summarized = Product.objects.filter(search_key=SEARCH_KEY, ai_summary__isnull=False).count()
+            # Nothing the benchmark wrote is kept
+            transaction.set_rollback(True)
+
+        counters = server.counters
+        stats = service.summary_stats()
+        tokens = counters['prompt_tokens'] + counters['completion_tokens']
+        wasted = counters['rate_limited'] + stats['empty_responses']
+        self.stdout.write(
+            f"{summarized} of {len(products)} products summarized in {elapsed:.1f}s "
+            f"({summarized / elapsed:.1f} summaries/s), trends {'ok' if trends else 'missing'}"
+        )
+        self.stdout.write(
+            f"requests: {counters['requests']} to the server, {stats['requests']} summary responses, "
+            f"{wasted} wasted ({counters['rate_limited']} rate limited, {stats['empty_responses']} without a usable summary), "
+            f"{stats['retried_products']} products retried"
+        )
+        if summarized:
+            self.stdout.write(
+                f"tokens: {tokens / summarized:.0f} per summary "
+                f"({counters['prompt_tokens'] / summarized:.0f} prompt + {counters['completion_tokens'] / summarized:.0f} completion), "
+                f"{counters['requests'] / summarized:.3f} requests per summary"
+            )
+        self.stdout.write(
+            f"injected: {counters['malformed']} malformed, {counters['truncated']} truncated, "
+            f"{counters['skipped_products']} products skipped, {counters['rate_limited']} rate limited, "
+            f"{counters['stalled']} stalled"
+        )
+        client = service.client.stats()
+        stream = client['timings'].get('stream')
+        if stream:
+            self.stdout.write(
+                f"chunk latency: p50 {stream['p50_ms']:.0f}ms, p90 {stream['p90_ms']:.0f}ms, "
+                f"p99 {stream['p99_ms']:.0f}ms, max {stream['max_ms']:.0f}ms over {stream['count']} requests"
+            )
+        self.stdout.write(
+            f"hedging: {'on' if options['hedge'] else 'off'}, {client['hedged']} requests hedged, "
+            f"{client['hedges_won']} won by the copy, {counters['abandoned_streams']} losing streams closed"
+        )
+        self.stdout.write(f"client rate limiter: {service.rate_limiter.stats()}")
+        for call_type, calls in service.metrics.summary().items():
+            self.stdout.write(f"{call_type} calls: {calls}")
@@ -0,0 +1,66 @@
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from analyzer.services.extractors import EXTRACTORS, available_extractors
+from analyzer.services.fake_amazon import load_products, render_product_page
+
+# Saved pages covering markup the generator does not produce: entities, comments, extra classes, unclosed tags
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / 'fixtures' / 'product_pages'
+
+
+class Command(BaseCommand):
+    help = "Report parse time (ms/page) and peak memory of each HTML extractor backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fixtures', type=str, default=None,
+            help=f"Directory of saved product page .html files, such as {FIXTURES_DIR}; pages are generated when omitted"
+        )
+        parser.add_argument('--pages', type=int, default=30, help="Generated pages to parse")
+        parser.add_argument('--page-kb', type=int, default=400, help="Approximate size of generated pages")
+
+    def handle(self, *args, **options):
+        pages = self._load_pages(options)
+        if not pages:
+            self.stderr.write("No product pages to parse")
+            return
+        average_kb = sum(len(page) for page in pages) / len(pages) / 1024
+        self.stdout.write(f"Parsing {len(pages)} product pages, {average_kb:.0f} KB on average")
+
+        baseline = [EXTRACTORS['soup']().extract_product(page) for page in pages]
+        for name in available_extractors():
+            extractor = EXTRACTORS[name]()
+
+            started = time.perf_counter()
+            results = [extractor.extract_product(page) for page in pages]
+            elapsed_ms = (time.perf_counter() - started) * 1000 / len(pages)
+
+            tracemalloc.start()
+            for page in pages:
+                extractor.extract_product(page)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            mismatches = sum(
+                1 for ours, theirs in zip(results, baseline)
+                if self._normalize(ours) != self._normalize(theirs)
+            )
+            self.stdout.write(
+                f"{name:>10}: {elapsed_ms:8.2f} ms/page, peak {peak / 1024 / 1024:6.1f} MB, "
+                f"{mismatches} pages differ from the full parse"
+            )
+        if 'lxml' in available_extractors():
+            self.stdout.write("Note: tracemalloc only sees Python allocations, so libxml2's own tree memory is not counted for lxml")
+
+    def _load_pages(self, options) -> list:
+        if options['fixtures']:
+            return [path.read_bytes() for path in sorted(Path(options['fixtures']).glob('*.html'))]
+        products = load_products()[:options['pages']]
+        return [render_product_page(p, padding_kb=options['page_kb']).encode('utf-8') for p in products]
+
+    @staticmethod
+    def _normalize(fields: dict) -> dict:
+        return {key: ' '.join(value.split()) if value else value for key, value in fields.items()}
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analyzer.management.commands.run_scraper import AmazonScraper, AsyncAmazonScraper
+from analyzer.services.fake_amazon import FakeAmazonServer
+
+
+class Command(BaseCommand):
+    help = "Compare pages per second of the sequential and concurrent scrapers against a local fake Amazon"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=1, help="Search pages to scrape")
+        parser.add_argument('--latency', type=float, default=0.5, help="Simulated response latency in seconds")
+        parser.add_argument('--concurrency', type=int, default=None)
+        parser.add_argument('--rate', type=float, default=None, help="Per-host requests/second for the async scraper")
+        parser.add_argument('--skip-sequential', action='store_true')
+        parser.add_argument(
+            '--cache', action='store_true',
+            help="Use the page cache and run the async scraper a second time to measure warm-cache throughput"
+        )
+
+    def handle(self, *args, **options):
+        with FakeAmazonServer(latency=options['latency']) as server:
+            if not options['skip_sequential']:
+                self._report('sequential', *self._run_sequential(server.origin, options['pages']))
+
+            for label in (['async', 'async-warm'] if options['cache'] else ['async']):
+                scraper = AsyncAmazonScraper(
+                    origin=server.origin,
+                    concurrency=options['concurrency'],
+                    rate=options['rate']
+                )
+                if not options['cache']:
+                    scraper.cache = None
+                started = time.perf_counter()
+                first_product = None
+                products = 0
+                for _ in scraper.iter_products('laptops', options['pages']):
+                    products += 1
+                    first_product = first_product or time.perf_counter() - started
+                self._report(label, products, scraper.pages_fetched, time.perf_counter() - started, first_product)
+                self.stdout.write(f"{'':>10}  adaptive: {scraper.controller.stats()}")
+                self.stdout.write(f"{'':>10}  streaming: {scraper.stream_stats()}")
+                if scraper.cache:
+                    self.stdout.write(f"{'':>10}  cache: {scraper.cache.stats()}")
+
+    def _run_sequential(self, origin: str, max_pages: int):
+        scraper = AmazonScraper(origin=origin)
+        scraper.cache = None
+        started = time.perf_counter()
+        links = scraper.get_product_links('laptops', max_pages)
+        first_product = None
+        products = 0
+        for url in links:
+            if scraper.scrape_product(url, 'laptops'):
+                products += 1
+                first_product = first_product or time.perf_counter() - started
+        return products, max_pages + len(links), time.perf_counter() - started, first_product
+
+    def _report(self, label: str, products: int, pages: int, elapsed: float, first_product: float = None):
+        first = f", first product after {first_product:.1f}s" if first_product else ""
+        self.stdout.write(
+            f"{label:>10}: {products} products, {pages} pages fetched in {elapsed:.1f}s "
+            f"({pages / elapsed:.2f} pages/s, {products / elapsed:.2f} products/s{first})"
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from analyzer.services.search_key_stats import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-search-key price and rating statistics from the stored products"
+
+    def add_arguments(self, parser):
+        parser.add_argument('search_keys', nargs='*', help="Search keys to rebuild (default: all)")
+
+    def handle(self, *args, **options):
+        count = rebuild_all(options['search_keys'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {count} search keys"))
@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from analyzer.management.commands.run_scraper import AmazonScraper, extract_asin
+
+
+class Command(BaseCommand):
+    help = "Capture real search and product pages for replay by the fake Amazon server (benchmark_e2e --replay)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('out', type=str, help="Directory to write the captured pages to")
+        parser.add_argument('--search-term', type=str, default='laptops')
+        parser.add_argument('--pages', type=int, default=1, help="Search pages to capture")
+        parser.add_argument('--products', type=int, default=None, help="Capture at most this many product pages")
+
+    def handle(self, *args, **options):
+        out = Path(options['out'])
+        out.mkdir(parents=True, exist_ok=True)
+        scraper = AmazonScraper()
+
+        links = []
+        for page in range(1, options['pages'] + 1):
+            try:
+                response = scraper._make_request(scraper.BASE_URL, params=scraper._search_params(options['search_term'], page))
+            except Exception as e:
+                self.stderr.write(f"Could not capture search page {page}: {str(e)}")
+                continue
+            (out / f'search-{page}.html').write_bytes(response.content)
+            links.extend(scraper._parse_product_links(response.content))
+
+        captured = 0
+        for url in list(dict.fromkeys(links))[:options['products']]:
+            asin = extract_asin(url)
+            if not asin:
+                continue
+            try:
+                response = scraper._make_request(url)
+            except Exception as e:
+                self.stderr.write(f"Could not capture {url}: {str(e)}")
+                continue
+            (out / f'{asin}.html').write_bytes(response.content)
+            captured += 1
+
+        self.stdout.write(f"Captured {options['pages']} search pages and {captured} product pages in {out}")
@@ -0,0 +1,69 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from analyzer.models import Product
+from analyzer.services.chunking import pack_payloads, payload_tokens
+from analyzer.services.fake_amazon import load_products
+from analyzer.services.groq_client import GroqClient
+from analyzer.services.llm_rate_limiter import estimate_tokens
+from analyzer.services.llm_service import SUMMARY_FORMAT, LLMService
+from analyzer.services.near_duplicates import flag_stored_products, group_near_duplicates, simhash
+
+
+class Command(BaseCommand):
+    help = (
+        "Group near-duplicate products by description SimHash and report the LLM summary calls "
+        "and tokens sharing one summary per group saves"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--search-key', type=str, default=None, help="Use these stored products instead of products_backup.json")
+        parser.add_argument(
+            '--flag', action='store_true',
+            help="Also store SimHashes and duplicate_of for the search key's products, e.g. after migrating"
+        )
+        parser.add_argument('--max-distance', type=int, default=None, help="Overrides NEAR_DUPLICATE_MAX_DISTANCE")
+        parser.add_argument('--groups', type=int, default=5, help="Largest groups to list")
+
+    def handle(self, *args, **options):
+        if options['search_key']:
+            if options['flag']:
+                flagged = flag_stored_products(options['search_key'])
+                self.stdout.write(self.style.SUCCESS(f"Flagged {flagged} stored products as near-duplicates"))
+            source = [LLMService._product_payload(p) for p in Product.objects.filter(search_key=options['search_key'])]
+        else:
+            source = [
+                {'uuid': p['uuid'], 'name': p['name'], 'description': p['description'],
+                 'price': float(p['price']), 'rating': p.get('rating')}
+                for p in load_products()
+            ]
+        if not source:
+            self.stderr.write("No products to compare")
+            return
+
+        max_distance = settings.NEAR_DUPLICATE_MAX_DISTANCE if options['max_distance'] is None else options['max_distance']
+        representatives = group_near_duplicates({p['uuid']: simhash(p['description']) for p in source}, max_distance)
+        groups = Counter(representatives.values())
+        sent = [p for p in source if representatives.get(p['uuid'], p['uuid']) == p['uuid']]
+        self.stdout.write(
+            f"{len(source)} products, {len(source) - len(representatives)} too short to hash, "
+            f"{sum(1 for n in groups.values() if n > 1)} near-duplicate groups at <= {max_distance} bits: "
+            f"{len(source) - len(sent)} products share a variant's summary"
+        )
+        names = {p['uuid']: p['name'] for p in source}
+        for representative, size in groups.most_common(options['groups']):
+            if size < 2:
+                break
+            self.stdout.write(f"  {size} x {names[representative][:100]}")
+
+        overhead = estimate_tokens(GroqClient.format_structured_prompt(LLMService._summary_prompt([]), SUMMARY_FORMAT))
+        budgets = (settings.LLM_INPUT_TOKEN_BUDGET, settings.LLM_OUTPUT_TOKEN_BUDGET, settings.LLM_SUMMARY_TOKENS)
+        before = pack_payloads(source, *budgets, overhead_tokens=overhead)
+        after = pack_payloads(sent, *budgets, overhead_tokens=overhead)
+        tokens = lambda chunks: sum(overhead + sum(payload_tokens(p) for p in chunk) + len(chunk) * budgets[2] for chunk in chunks)
+        self.stdout.write(
+            f"LLM summary calls: {len(before)} -> {len(after)} ({len(before) - len(after)} avoided), "
+            f"about {tokens(before)} -> {tokens(after)} tokens"
+        )
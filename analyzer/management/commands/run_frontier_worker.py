@@ -0,0 +1,48 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from analyzer.management.commands.run_scraper import AsyncAmazonScraper
+from analyzer.services.frontier import DatabaseRateLimiter, process_frontier_batch
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Lease product pages from the shared URL frontier and scrape them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Entries leased per batch")
+        parser.add_argument('--once', action='store_true', help="Exit once the frontier is empty")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        rate_limiter = DatabaseRateLimiter()
+        scraper = AsyncAmazonScraper(rate_limiter=rate_limiter)
+        logger.info(f"Frontier worker {worker} started")
+
+        try:
+            while not self.stopping:
+                close_old_connections()
+                batch = process_frontier_batch(worker, scraper, options['batch_size'])
+                if not batch['claimed']:
+                    if options['once']:
+                        break
+                    time.sleep(settings.JOB_POLL_SECONDS)
+        finally:
+            rate_limiter.close()
+
+        logger.info(f"Frontier worker {worker} stopped")
+
+    def _stop(self, signum, frame):
+        # Finish the leased batch, then exit
+        self.stopping = True
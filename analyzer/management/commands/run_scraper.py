@@ -1,14 +1,105 @@
+import asyncio
+import codecs
+import queue
+import re
+import threading
 import requests
-from bs4 import BeautifulSoup
+import httpx
 import time
 import logging
 import random
+from django.conf import settings
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
+from analyzer.services.extractors import ProductPageScanner, SoupExtractor, get_extractor
+from analyzer.services.http_cache import build_response_cache
+from analyzer.services.rate_limiter import AdaptiveController, HostRateLimiter
+
 logger = logging.getLogger(__name__)
 
+BLOCKED_MARKER = 'To discuss automated access to Amazon data please contact'
+BLOCKED_MARKER_BYTES = BLOCKED_MARKER.encode('utf-8')
+ASIN_PATTERN = re.compile(r'/(?:dp|gp/product)/([A-Z0-9]{10})')
+# Responses that mean "slow down" rather than "this page is broken"
+THROTTLE_STATUSES = {429, 503}
+
+_STREAM_DONE = object()
+
+
+def extract_asin(url: str) -> str:
+    """Return the ASIN embedded in a product URL, or None if there is none"""
+    match = ASIN_PATTERN.search(url or '')
+    return match.group(1) if match else None
+
+
+class ScraperBlockedError(Exception):
+    """Raised when Amazon serves its automated access page instead of content"""
+
+
+class ProductPageStream:
+    """
+    Consumes a product page chunk by chunk and says when the rest can be skipped.
+
+    On Amazon's layout the title, rating and price all come before the feature
+    bullets, so the page is needed only up to the end of the bullets block.
+    Chunks are searched as raw bytes for the block's opening tag. From there
+    on they are decoded incrementally and fed to a ProductPageScanner until
+    the block closes, so only a few KB go through the Python-level scanner.
+    Reading also stops as soon as the block page marker shows up. `body` holds
+    only the bytes actually read and is parsed by the configured extractor.
+    """
+
+    BULLETS_MARKER = b'id="feature-bullets"'
+    SCAN_SLICE = 4096
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._buffer = bytearray()
+        self._scanner = None
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.blocked = False
+        self.stopped_early = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """Take the next chunk and return True once nothing more needs to be read"""
+        # Search from a little before the new chunk so markers split across chunks are found
+        search_from = max(0, len(self._buffer) - len(BLOCKED_MARKER_BYTES))
+        self._buffer += chunk
+        if self._buffer.find(BLOCKED_MARKER_BYTES, search_from) != -1:
+            self.blocked = True
+            return True
+
+        if self._scanner is None:
+            marker = self._buffer.find(self.BULLETS_MARKER, max(0, search_from - len(self.BULLETS_MARKER)))
+            tag_start = self._buffer.rfind(b'<div', 0, marker) if marker != -1 else -1
+            if tag_start == -1:
+                return False
+            self._scanner = ProductPageScanner(fields=('description',))
+            pending = bytes(self._buffer[tag_start:])
+        else:
+            pending = chunk
+        # Feed in small slices: the bullets block is short and the filler after it is not worth scanning
+        for offset in range(0, len(pending), self.SCAN_SLICE):
+            self._scanner.feed(self._decoder.decode(pending[offset:offset + self.SCAN_SLICE]))
+            if self._scanner.complete:
+                self.stopped_early = True
+                return True
+        return False
+
+    @property
+    def bytes_read(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def body(self) -> bytes:
+        return bytes(self._buffer)
+
+
 class AmazonScraper:
-    BASE_URL = "https://www.amazon.in/s"
+    ORIGIN = "https://www.amazon.in"
+    BASE_URL = ORIGIN + "/s"
     HEADERS = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -17,8 +108,19 @@ class AmazonScraper:
         'Connection': 'keep-alive',
         'Upgrade-Insecure-Requests': '1',
     }
+    # Politeness delay before each request, in seconds
+    DELAY_RANGE = (1, 2)
 
-    def __init__(self):
+    def __init__(self, origin: str = None):
+        # Allow pointing the scraper at a local stand-in (used by the benchmarks)
+        if origin:
+            self.ORIGIN = origin.rstrip('/')
+            self.BASE_URL = self.ORIGIN + '/s'
+        self.cache = build_response_cache()
+        self.extractor = get_extractor(settings.SCRAPE_PARSER)
+        self.fallback_extractor = SoupExtractor()
+        # Set to a Timings instance to collect request and parse durations (used by the benchmarks)
+        self.timings = None
         self.session = requests.Session()
         self.session.headers.update(self.HEADERS)
         # Rotate between different user agents
@@ -35,45 +137,66 @@ class AmazonScraper:
     )
     def _make_request(self, url: str, params: dict = None) -> requests.Response:
         """Make a request with retry logic and random delays"""
+        cache_key, cached = self._cache_lookup(url, params)
+        if cached and cached.fresh:
+            # Cache hits skip both the network and the politeness delay
+            self.cache.record_hit(cached)
+            return cached.to_response(url)
+
         # Rotate user agent to avoid 503 or rate limit issues
         self.session.headers['User-Agent'] = random.choice(self.user_agents)
 
         # Add random delay
-        time.sleep(random.uniform(1, 2))
+        time.sleep(random.uniform(*self.DELAY_RANGE))
         
-        response = self.session.get(url, params=params, timeout=10)
+        started = time.monotonic()
+        response = self.session.get(url, params=params, timeout=10, headers=cached.validators if cached else None)
+        self._record_timing('request', started)
+        if cached and response.status_code == 304:
+            self.cache.revalidated(cached)
+            return cached.to_response(url)
         response.raise_for_status()
         
-        if 'To discuss automated access to Amazon data please contact' in response.text:
+        if BLOCKED_MARKER_BYTES in response.content:
             raise requests.exceptions.HTTPError('Amazon is blocking automated access')
             
+        self._cache_store(cache_key, url, response.content, response.headers, time.monotonic() - started)
         return response
 
+    def _record_timing(self, kind: str, started: float):
+        if self.timings is not None:
+            self.timings.record(kind, time.monotonic() - started)
+
+    def _cache_lookup(self, url: str, params: dict = None, partial: bool = False):
+        """
+        Return the cache key for product pages and any stored copy; search pages are never cached
+
+        With `partial`, the key and copy are those of a page prefix stored by a streamed read.
+        """
+        asin = extract_asin(url) if self.cache and not params else None
+        if not asin:
+            return None, None
+        cache_key = self.cache.key_for(url, asin=asin, partial=partial)
+        return cache_key, self.cache.get(cache_key)
+
+    def _cache_store(self, cache_key: str, url: str, content: bytes, headers, elapsed: float):
+        if not cache_key:
+            return
+        self.cache.record_miss()
+        self.cache.put(cache_key, url, content, headers, elapsed)
+
     def get_product_links(self, search_term: str = 'laptops', max_pages: int = 1) -> list:
         """Get product links from search results"""
         product_links = []
         
         for page in range(1, max_pages + 1):
             try:
-                params = {
-                    'k': search_term,
-                    'page': page,
-                    'ref': 'sr_pg_' + str(page)
-                }
-                
+                params = self._search_params(search_term, page)
                 response = self._make_request(self.BASE_URL, params=params)
-                soup = BeautifulSoup(response.content, 'html.parser')
+                links = self._parse_product_links(response.content)
+                product_links.extend(links)
                 
-                # Find all product links
-                products = soup.find_all('a', {'class': 'a-link-normal s-no-outline'})
-                
-                for product in products:
-                    href = product.get('href')
-                    if href and '/dp/' in href:
-                        full_url = 'https://www.amazon.in' + href if not href.startswith('http') else href
-                        product_links.append(full_url)
-                
-                logger.info(f"Found {len(products)} products on page {page}")
+                logger.info(f"Found {len(links)} products on page {page}")
                 
             except Exception as e:
                 logger.error(f"Error scraping page {page}: {str(e)}")
@@ -81,6 +204,25 @@ class AmazonScraper:
         
         return list(set(product_links))  # Remove duplicates
 
+    def _search_params(self, search_term: str, page: int) -> dict:
+        return {
+            'k': search_term,
+            'page': page,
+            'ref': 'sr_pg_' + str(page)
+        }
+
+    def _parse_product_links(self, content: bytes) -> list:
+        """Extract product page links from a search results page"""
+        hrefs = self.extractor.extract_links(content)
+        if not hrefs and self.extractor.name != self.fallback_extractor.name:
+            hrefs = self.fallback_extractor.extract_links(content)
+
+        links = []
+        for href in hrefs:
+            if href and '/dp/' in href:
+                links.append(self.ORIGIN + href if not href.startswith('http') else href)
+        return links
+
     @retry(
         retry=retry_if_exception_type(requests.exceptions.RequestException),
         stop=stop_after_attempt(3),
@@ -90,37 +232,360 @@ class AmazonScraper:
         """Scrape product details"""
         try:
             response = self._make_request(url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract product details
-            name = soup.find('span', {'id': 'productTitle'})
-            name = name.text.strip() if name else None
-            
-            price = soup.find('span', {'class': 'a-price-whole'})
-            price = float(price.text.replace(',', '').strip()) if price else None
-            
-            rating = soup.find('span', {'class': 'a-icon-alt'})
-            if rating and 'out of 5 stars' in rating.text:
-                rating = float(rating.text.split()[0])
-            else:
-                rating = None
-            
-            description = soup.find('div', {'id': 'feature-bullets'})
-            description = description.text.strip() if description else None
-            
-            if not all([name, price, description]):
-                logger.warning(f"Missing required fields for product: {url}")
-                return None
-            
-            return {
-                'name': name,
-                'price': price,
-                'rating': rating,
-                'description': description,
-                'url': url,
-                'search_key': search_term
-            }
+            return self._parse_product(response.content, url, search_term)
             
         except Exception as e:
             logger.error(f"Error scraping product {url}: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+    def _parse_product(self, content: bytes, url: str, search_term: str) -> dict:
+        """Extract product details from a product page"""
+        started = time.monotonic()
+        fields = self.extractor.extract_product(content)
+        if not all(fields[field] for field in ('name', 'price', 'description')) \
+                and self.extractor.name != self.fallback_extractor.name:
+            # The fast backends can trip over markup the full parser tolerates
+            logger.debug(f"{self.extractor.name} extractor missed fields for {url}, using full parse")
+            fields = self.fallback_extractor.extract_product(content)
+        self._record_timing('parse', started)
+
+        name = fields['name'].strip() if fields['name'] else None
+        price = float(fields['price'].replace(',', '').strip()) if fields['price'] else None
+        
+        rating = fields['rating']
+        if rating and 'out of 5 stars' in rating:
+            rating = float(rating.split()[0])
+        else:
+            rating = None
+        
+        description = fields['description'].strip() if fields['description'] else None
+        
+        if not all([name, price, description]):
+            logger.warning(f"Missing required fields for product: {url}")
+            return None
+        
+        return {
+            'name': name,
+            'price': price,
+            'rating': rating,
+            'description': description,
+            'url': url,
+            'asin': extract_asin(url),
+            'search_key': search_term
+        }
+
+
+class AsyncAmazonScraper(AmazonScraper):
+    """
+    Concurrent variant of AmazonScraper.
+
+    Keeps up to `concurrency` requests in flight and paces them with a per-host
+    token bucket instead of sleeping before every request, so slow responses
+    overlap without raising the request rate seen by Amazon. Both limits are
+    tuned at runtime by an AdaptiveController when SCRAPE_ADAPTIVE is on.
+    """
+
+    # Search pages are fetched by a couple of workers so product fetching can start immediately
+    SEARCH_WORKERS = 2
+
+    def __init__(
+        self,
+        origin: str = None,
+        concurrency: int = None,
+        rate: float = None,
+        burst: float = None,
+        rate_limiter=None
+    ):
+        super().__init__(origin)
+        rate = rate or settings.SCRAPE_RATE_LIMIT
+        # Any object with an async acquire(url), set_rate(rate) and a current `rate` can pace requests, e.g. the
+        # database-backed limiter
+        self.rate_limiter = rate_limiter or HostRateLimiter(rate, burst or settings.SCRAPE_BURST)
+        self.controller = AdaptiveController(
+            self.rate_limiter,
+            concurrency=concurrency or settings.SCRAPE_CONCURRENCY,
+            rate=rate,
+            max_concurrency=settings.SCRAPE_MAX_CONCURRENCY,
+            max_rate=settings.SCRAPE_MAX_RATE,
+            min_rate=settings.SCRAPE_MIN_RATE,
+            adaptive=settings.SCRAPE_ADAPTIVE
+        )
+        # Workers, queues and connections are sized for the most the controller may allow
+        self.concurrency = self.controller.max_concurrency
+        self.pages_fetched = 0
+        self.skipped_fresh = 0
+        self.stream_counters = {
+            'pages': 0,
+            'stopped_early': 0,
+            'bytes_downloaded': 0,
+            'bytes_saved': 0,
+            'pages_with_length': 0,
+        }
+
+    def _client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            headers=self.HEADERS,
+            timeout=10,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.concurrency)
+        )
+
+    @retry(
+        retry=retry_if_exception_type((httpx.HTTPError, ScraperBlockedError)),
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=2, max=8),
+        reraise=True
+    )
+    async def _fetch(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        params: dict = None,
+        stream: ProductPageStream = None
+    ) -> bytes:
+        """
+        Fetch a page once the host's rate limiter allows it, reading it through `stream` if given
+
+        A streamed read that stops early is cached as a partial page, which
+        only streamed reads use; they prefer a full page when one is cached.
+        """
+        cache_key, cached = self._cache_lookup(url, params)
+        partial_key = None
+        if stream is not None:
+            partial_key, partial = self._cache_lookup(url, params, partial=True)
+            cached = cached or partial
+        if cached and cached.fresh:
+            self.cache.record_hit(cached)
+            return cached.body
+
+        async with self.controller.slot() as epoch:
+            await self.rate_limiter.acquire(url)
+
+            headers = {'User-Agent': random.choice(self.user_agents)}
+            if cached:
+                headers.update(cached.validators)
+            started = time.monotonic()
+            try:
+                if stream is None:
+                    response = await client.get(url, params=params, headers=headers)
+                else:
+                    response = await self._get_streamed(client, url, headers, stream)
+                self._record_timing('request', started)
+            except httpx.TimeoutException:
+                self.controller.on_throttle(epoch, 'timeout')
+                raise
+        self.pages_fetched += 1
+        if response.status_code in THROTTLE_STATUSES:
+            self.controller.on_throttle(epoch, f'HTTP {response.status_code}')
+        if cached and response.status_code == 304:
+            self.controller.on_success()
+            self.cache.revalidated(cached)
+            return cached.body
+        response.raise_for_status()
+
+        content = stream.body if stream is not None else response.content
+        if BLOCKED_MARKER_BYTES in content:
+            self.controller.on_throttle(epoch, 'blocked')
+            raise ScraperBlockedError('Amazon is blocking automated access')
+
+        self.controller.on_success()
+        # A streamed page that stopped early is cached as the prefix that was read, which holds every field we parse
+        store_key = partial_key if stream is not None and stream.stopped_early else cache_key
+        self._cache_store(store_key, url, content, response.headers, time.monotonic() - started)
+        return content
+
+    async def _get_streamed(self, client: httpx.AsyncClient, url: str, headers: dict, stream: ProductPageStream):
+        """GET a product page, closing the connection as soon as `stream` has what it needs"""
+        stream.reset()
+        async with client.stream('GET', url, headers=headers) as response:
+            if response.status_code != 200:
+                return response
+            async for chunk in response.aiter_bytes():
+                if stream.feed(chunk):
+                    break
+            self._count_stream(url, stream, response)
+        return response
+
+    def _count_stream(self, url: str, stream: ProductPageStream, response: httpx.Response):
+        downloaded = response.num_bytes_downloaded
+        self.stream_counters['pages'] += 1
+        self.stream_counters['bytes_downloaded'] += downloaded
+        self.stream_counters['stopped_early'] += stream.stopped_early
+        total = response.headers.get('Content-Length')
+        if total and total.isdigit():
+            # Savings are only known when the server said how big the page was
+            self.stream_counters['bytes_saved'] += int(total) - downloaded
+            self.stream_counters['pages_with_length'] += 1
+            logger.debug(f"Read {downloaded} of {total} bytes of {url}")
+
+    def stream_stats(self) -> dict:
+        stats = dict(self.stream_counters)
+        sized = stats['pages_with_length']
+        stats['bytes_saved_per_page'] = stats['bytes_saved'] // sized if sized else None
+        stats['bytes_downloaded_per_page'] = stats['bytes_downloaded'] // stats['pages'] if stats['pages'] else 0
+        return stats
+
+    async def _fetch_product_links(self, client, semaphore, search_term: str, page: int) -> list:
+        try:
+            async with semaphore:
+                content = await self._fetch(client, self.BASE_URL, params=self._search_params(search_term, page))
+            links = self._parse_product_links(content)
+            logger.info(f"Found {len(links)} products on page {page}")
+            return links
+        except Exception as e:
+            logger.error(f"Error scraping page {page}: {str(e)}")
+            return []
+
+    async def _scrape_product(self, client, semaphore, url: str, search_term: str) -> dict:
+        try:
+            stream = ProductPageStream() if settings.SCRAPE_STREAM_PRODUCTS else None
+            async with semaphore:
+                content = await self._fetch(client, url, stream=stream)
+            return self._parse_product(content, url, search_term)
+        except Exception as e:
+            logger.error(f"Error scraping product {url}: {str(e)}")
+            return None
+
+    async def stream_products(self, search_term: str = 'laptops', max_pages: int = 1, skip_asins=None):
+        """
+        Yield scraped products as soon as they are parsed.
+
+        Search pages feed a bounded link queue that product workers drain while
+        discovery is still running, so the first products arrive after a couple
+        of requests rather than after every search page has been walked.
+        Products whose ASIN is in `skip_asins` are discovered but not fetched.
+        """
+        skip_asins = skip_asins or set()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        links = asyncio.Queue(maxsize=self.concurrency * 2)
+        results = asyncio.Queue(maxsize=self.concurrency * 2)
+        pages = iter(range(1, max_pages + 1))
+        seen_asins = set()
+
+        async with self._client() as client:
+            async def discover():
+                for page in pages:
+                    for url in await self._fetch_product_links(client, semaphore, search_term, page):
+                        key = extract_asin(url) or url
+                        if key in seen_asins:
+                            continue
+                        seen_asins.add(key)
+                        if key in skip_asins:
+                            self.skipped_fresh += 1
+                            continue
+                        await links.put(url)
+
+            async def fetch():
+                while True:
+                    url = await links.get()
+                    if url is None:
+                        return
+                    product = await self._scrape_product(client, semaphore, url, search_term)
+                    if product:
+                        await results.put(product)
+
+            async def run_stages():
+                fetchers = [asyncio.ensure_future(fetch()) for _ in range(self.concurrency)]
+                try:
+                    await asyncio.gather(*[discover() for _ in range(min(self.SEARCH_WORKERS, max_pages))])
+                    logger.info(f"Discovered {len(seen_asins)} unique product links")
+                    for _ in fetchers:
+                        await links.put(None)
+                    await asyncio.gather(*fetchers)
+                    await results.put(None)
+                finally:
+                    for fetcher in fetchers:
+                        fetcher.cancel()
+
+            pipeline = asyncio.ensure_future(run_stages())
+            try:
+                while True:
+                    product = await results.get()
+                    if product is None:
+                        break
+                    yield product
+                await pipeline
+            finally:
+                pipeline.cancel()
+                await asyncio.gather(pipeline, return_exceptions=True)
+
+    async def scrape_products(self, search_term: str = 'laptops', max_pages: int = 1, skip_asins=None) -> list:
+        """Scrape every product for a search term and return them as a list"""
+        return [product async for product in self.stream_products(search_term, max_pages, skip_asins)]
+
+    def run(self, search_term: str = 'laptops', max_pages: int = 1, skip_asins=None) -> list:
+        """Synchronous entry point for callers outside an event loop"""
+        return asyncio.run(self.scrape_products(search_term, max_pages, skip_asins))
+
+    async def discover_links(self, search_term: str = 'laptops', max_pages: int = 1) -> list:
+        """Walk the search pages concurrently and return the unique product links"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._client() as client:
+            pages = await asyncio.gather(*[
+                self._fetch_product_links(client, semaphore, search_term, page)
+                for page in range(1, max_pages + 1)
+            ])
+        links = {}
+        for url in (url for page in pages for url in page):
+            links.setdefault(extract_asin(url) or url, url)
+        return list(links.values())
+
+    async def scrape_urls(self, targets: list) -> list:
+        """Scrape (url, search_term) pairs concurrently, returning a product or None for each"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._client() as client:
+            return await asyncio.gather(*[
+                self._scrape_product(client, semaphore, url, search_term)
+                for url, search_term in targets
+            ])
+
+    def iter_products(self, search_term: str = 'laptops', max_pages: int = 1, skip_asins=None):
+        """
+        Synchronous generator over stream_products.
+
+        The event loop runs on a helper thread and hands products over through a
+        bounded queue, so the caller can write them to the database (which must
+        stay on the calling thread) while scraping continues.
+        """
+        output = queue.Queue(maxsize=self.concurrency * 2)
+        stop = threading.Event()
+
+        async def pump():
+            stream = self.stream_products(search_term, max_pages, skip_asins)
+            try:
+                async for product in stream:
+                    while True:
+                        if stop.is_set():
+                            return
+                        try:
+                            output.put_nowait(product)
+                            break
+                        except queue.Full:
+                            await asyncio.sleep(0.01)
+            finally:
+                await stream.aclose()
+
+        def run_loop():
+            try:
+                asyncio.run(pump())
+                output.put(_STREAM_DONE)
+            except Exception as e:
+                output.put(e)
+
+        thread = threading.Thread(target=run_loop, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = output.get()
+                if item is _STREAM_DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            while thread.is_alive():
+                try:
+                    output.get(timeout=0.1)
+                except queue.Empty:
+                    pass
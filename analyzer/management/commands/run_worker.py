@@ -0,0 +1,44 @@
+import logging
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from analyzer.services.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Work through queued scrape and process jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        logger.info(f"Worker {worker} started")
+
+        while not self.stopping:
+            close_old_connections()
+            requeue_stale_jobs()
+            job = claim_next_job(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(settings.JOB_POLL_SECONDS)
+                continue
+            run_job(job)
+
+        logger.info(f"Worker {worker} stopped")
+
+    def _stop(self, signum, frame):
+        # Finish the current job, then exit
+        self.stopping = True
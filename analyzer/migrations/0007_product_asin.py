@@ -0,0 +1,53 @@
+# Generated by Django 4.2.19 on 2026-10-17 09:12
+
+import re
+
+from django.db import migrations, models
+
+ASIN_PATTERN = re.compile(r'/(?:dp|gp/product)/([A-Z0-9]{10})')
+
+
+def backfill_asins(apps, schema_editor):
+    """Fill in ASINs from product URLs and drop the duplicate rows repeated scrapes created"""
+    Product = apps.get_model('analyzer', 'Product')
+
+    keep = {}
+    duplicates = []
+    # Newest first, but a row that already has an AI summary wins over one without
+    for product in Product.objects.order_by('-updated_at').iterator():
+        match = ASIN_PATTERN.search(product.url or '')
+        if not match:
+            continue
+        product.asin = match.group(1)
+        key = (product.asin, product.search_key)
+        kept = keep.get(key)
+        if kept is None:
+            keep[key] = product
+        elif product.ai_summary and not kept.ai_summary:
+            duplicates.append(kept.uuid)
+            keep[key] = product
+        else:
+            duplicates.append(product.uuid)
+
+    Product.objects.filter(uuid__in=duplicates).delete()
+    Product.objects.bulk_update(keep.values(), ['asin'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0006_remove_product_analyzer_pr_name_b0f7f0_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='asin',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.RunPython(backfill_asins, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('asin', 'search_key'), name='unique_product_asin_search_key'),
+        ),
+    ]
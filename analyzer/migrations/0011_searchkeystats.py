@@ -0,0 +1,41 @@
+# Generated by Django 4.2.19 on 2026-10-17 13:05
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0010_summarycache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchKeyStats',
+            fields=[
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('search_key', models.CharField(max_length=450, unique=True)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('rated_count', models.PositiveIntegerField(default=0)),
+                ('price_sum', models.FloatField(default=0)),
+                ('price_squares', models.FloatField(default=0)),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('rating_sum', models.FloatField(default=0)),
+                ('rating_squares', models.FloatField(default=0)),
+                ('rating_min', models.DecimalField(decimal_places=2, max_digits=3, null=True)),
+                ('rating_max', models.DecimalField(decimal_places=2, max_digits=3, null=True)),
+                ('rated_price_sum', models.FloatField(default=0)),
+                ('rated_price_squares', models.FloatField(default=0)),
+                ('price_rating_sum', models.FloatField(default=0)),
+                ('price_histogram', models.JSONField(default=dict)),
+                ('rating_histogram', models.JSONField(default=dict)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
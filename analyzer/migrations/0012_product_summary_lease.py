@@ -0,0 +1,27 @@
+# Generated by Django 4.2.19 on 2026-10-17 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0011_searchkeystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='summary_lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='summary_leased_by',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['search_key', 'summary_lease_expires_at'], name='analyzer_product_lease_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.19 on 2026-10-17 15:20
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0012_product_summary_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('call_type', models.CharField(max_length=50)),
+                ('search_key', models.CharField(blank=True, max_length=450, null=True)),
+                ('model', models.CharField(max_length=100)),
+                ('outcome', models.CharField(default='ok', max_length=20)),
+                ('latency_ms', models.FloatField()),
+                ('first_chunk_ms', models.FloatField(blank=True, null=True)),
+                ('prompt_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('completion_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('cost_usd', models.FloatField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=1)),
+                ('hedged', models.BooleanField(default=False)),
+                ('items', models.PositiveIntegerField(blank=True, null=True)),
+                ('malformed_items', models.PositiveIntegerField(default=0)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to='analyzer.job')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'call_type'], name='analyzer_llmcall_time_idx'), models.Index(fields=['search_key', 'created_at'], name='analyzer_llmcall_key_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.19 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0013_llmcall'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='duplicate_of',
+            field=models.CharField(blank=True, max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='simhash',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.19 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0014_product_simhash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'uuid'], name='analyzer_product_page_idx'),
+        ),
+    ]
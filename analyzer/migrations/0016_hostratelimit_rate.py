@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0015_product_page_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hostratelimit',
+            name='rate',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
+import math
 import uuid
+from decimal import Decimal
 from django.db import models
 from django.utils import timezone
 
@@ -18,16 +20,38 @@ class Product(BaseModel):
     url = models.URLField(max_length=4000)
     ai_summary = models.TextField(null=True, blank=True)
     search_key = models.CharField(max_length=450, default="laptops")
+    asin = models.CharField(max_length=10, null=True, blank=True)
+    # Set while a process job is summarizing the product
+    summary_leased_by = models.CharField(max_length=255, null=True, blank=True)
+    summary_lease_expires_at = models.DateTimeField(null=True, blank=True)
+    # SimHash of the description, and the ASIN of the earlier product under the search key it nearly duplicates
+    simhash = models.BigIntegerField(null=True, blank=True)
+    duplicate_of = models.CharField(max_length=10, null=True, blank=True)
+
+    # Fields refreshed when a product is scraped again; created_at and ai_summary are kept
+    UPSERT_FIELDS = ['name', 'price', 'rating', 'description', 'url', 'simhash', 'duplicate_of', 'updated_at']
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['asin', 'search_key'], name='unique_product_asin_search_key'),
+        ]
+        indexes = [
+            models.Index(fields=['search_key', 'summary_lease_expires_at'], name='analyzer_product_lease_idx'),
+            # Keyset pagination of the product list, newest first
+            models.Index(fields=['created_at', 'uuid'], name='analyzer_product_page_idx'),
+        ]
 
     def to_dict(self):
         return {
             'uuid': str(self.uuid),
+            'asin': self.asin,
             'name': self.name,
             'price': float(self.price),
             'rating': float(self.rating) if self.rating else None,
             'description': self.description,
             'url': self.url,
             'ai_summary': self.ai_summary,
+            'duplicate_of': self.duplicate_of,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
@@ -48,3 +72,270 @@ class ProductTrend(BaseModel):
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+
+class Job(BaseModel):
+    KIND_SCRAPE = 'scrape'
+    KIND_PROCESS = 'process'
+    KIND_CHOICES = [(KIND_SCRAPE, 'Scrape'), (KIND_PROCESS, 'Process')]
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    params = models.JSONField(default=dict)
+    progress = models.JSONField(default=dict)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    worker = models.CharField(max_length=255, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='analyzer_job_status_idx'),
+        ]
+
+    def to_dict(self):
+        processed = self.progress.get('processed', 0)
+        elapsed = None
+        if self.started_at:
+            elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return {
+            'uuid': str(self.uuid),
+            'kind': self.kind,
+            'status': self.status,
+            'params': self.params,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'elapsed_seconds': round(elapsed, 1) if elapsed is not None else None,
+            'throughput_per_second': round(processed / elapsed, 3) if elapsed else None,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'updated_at': self.updated_at.isoformat()
+        }
+
+class FrontierURL(BaseModel):
+    """A product page waiting to be scraped by one of the distributed scrape workers"""
+    STATUS_PENDING = 'pending'
+    STATUS_LEASED = 'leased'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_LEASED, 'Leased'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    url = models.URLField(max_length=4000)
+    asin = models.CharField(max_length=10, null=True, blank=True)
+    search_key = models.CharField(max_length=450, default="laptops")
+    job = models.ForeignKey(Job, null=True, blank=True, on_delete=models.SET_NULL, related_name='frontier_urls')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    leased_by = models.CharField(max_length=255, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['asin', 'search_key'], name='unique_frontier_asin_search_key'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at'], name='analyzer_frontier_status_idx'),
+        ]
+
+class HostRateLimit(BaseModel):
+    """Token bucket shared by every scrape worker so the per-host request rate is global"""
+    host = models.CharField(max_length=255, unique=True)
+    tokens = models.FloatField(default=0)
+    refilled_at = models.DateTimeField(default=timezone.now)
+    # Requests per second, as last set by any worker's adaptive controller; null until one does
+    rate = models.FloatField(null=True, blank=True)
+
+class SummaryCache(BaseModel):
+    """LLM summary stored under a hash of the model, prompt version and normalized product content"""
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    prompt_version = models.CharField(max_length=20)
+    summary = models.TextField()
+    hits = models.PositiveIntegerField(default=0)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+class SearchKeyStats(BaseModel):
+    """Running totals over a search key's products, updated with every product write"""
+    search_key = models.CharField(max_length=450, unique=True)
+    product_count = models.PositiveIntegerField(default=0)
+    rated_count = models.PositiveIntegerField(default=0)
+    price_sum = models.FloatField(default=0)
+    price_squares = models.FloatField(default=0)
+    price_min = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    price_max = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    rating_sum = models.FloatField(default=0)
+    rating_squares = models.FloatField(default=0)
+    rating_min = models.DecimalField(max_digits=3, decimal_places=2, null=True)
+    rating_max = models.DecimalField(max_digits=3, decimal_places=2, null=True)
+    # Price totals over rated products only; with price_rating_sum they give the price/rating correlation
+    rated_price_sum = models.FloatField(default=0)
+    rated_price_squares = models.FloatField(default=0)
+    price_rating_sum = models.FloatField(default=0)
+    # Product counts by bucket: prices in log-spaced buckets (see price_bucket), ratings by half star
+    price_histogram = models.JSONField(default=dict)
+    rating_histogram = models.JSONField(default=dict)
+
+    # Each price bucket spans a factor of sqrt(2), which suits any currency and price range
+    PRICE_BUCKETS_PER_DOUBLING = 2
+
+    @classmethod
+    def price_bucket(cls, price: float) -> str:
+        return str(math.floor(cls.PRICE_BUCKETS_PER_DOUBLING * math.log2(max(price, 0.01))))
+
+    @staticmethod
+    def rating_bucket(rating: float) -> str:
+        return f"{math.floor(rating * 2) / 2:.1f}"
+
+    @staticmethod
+    def _count(histogram, bucket, sign):
+        histogram[bucket] = histogram.get(bucket, 0) + sign
+        if histogram[bucket] <= 0:
+            del histogram[bucket]
+
+    def add(self, price, rating, sign: int = 1) -> bool:
+        """
+        Add a product's price and rating to the totals, or take them out with sign=-1
+
+        Returns True when a removed value was the current minimum or maximum,
+        which can only be recomputed from the products themselves.
+        """
+        price = float(price)
+        self.product_count += sign
+        self.price_sum += sign * price
+        self.price_squares += sign * price * price
+        self._count(self.price_histogram, self.price_bucket(price), sign)
+        extremes = [(price, 'price_min', 'price_max')]
+        if rating:
+            rating = float(rating)
+            self.rated_count += sign
+            self.rating_sum += sign * rating
+            self.rating_squares += sign * rating * rating
+            self.rated_price_sum += sign * price
+            self.rated_price_squares += sign * price * price
+            self.price_rating_sum += sign * price * rating
+            self._count(self.rating_histogram, self.rating_bucket(rating), sign)
+            extremes.append((rating, 'rating_min', 'rating_max'))
+
+        stale = False
+        for value, low, high in extremes:
+            current_low, current_high = getattr(self, low), getattr(self, high)
+            if sign > 0:
+                value = Decimal(str(value))
+                if current_low is None or value < current_low:
+                    setattr(self, low, value)
+                if current_high is None or value > current_high:
+                    setattr(self, high, value)
+            elif current_low is None or value <= float(current_low) or value >= float(current_high):
+                stale = True
+        return stale
+
+    def reset(self):
+        for field in ('product_count', 'rated_count', 'price_sum', 'price_squares', 'rating_sum',
+                      'rating_squares', 'rated_price_sum', 'rated_price_squares', 'price_rating_sum'):
+            setattr(self, field, 0)
+        self.price_min = self.price_max = self.rating_min = self.rating_max = None
+        self.price_histogram = {}
+        self.rating_histogram = {}
+
+    @staticmethod
+    def _spread(count, total, squares):
+        if not count:
+            return None, None
+        mean = total / count
+        return mean, math.sqrt(max(0.0, squares / count - mean * mean))
+
+    def to_dict(self):
+        price_mean, price_stddev = self._spread(self.product_count, self.price_sum, self.price_squares)
+        rating_mean, rating_stddev = self._spread(self.rated_count, self.rating_sum, self.rating_squares)
+
+        n = self.rated_count
+        covariance = n * self.price_rating_sum - self.rated_price_sum * self.rating_sum
+        spread = (n * self.rated_price_squares - self.rated_price_sum ** 2) * (n * self.rating_squares - self.rating_sum ** 2)
+        correlation = covariance / math.sqrt(spread) if n > 2 and spread > 0 else None
+
+        step = self.PRICE_BUCKETS_PER_DOUBLING
+        return {
+            'search_key': self.search_key,
+            'product_count': self.product_count,
+            'rated_count': self.rated_count,
+            'price': {
+                'min': float(self.price_min) if self.price_min is not None else None,
+                'max': float(self.price_max) if self.price_max is not None else None,
+                'mean': round(price_mean, 2) if price_mean is not None else None,
+                'stddev': round(price_stddev, 2) if price_stddev is not None else None,
+                'histogram': [
+                    {
+                        'price_from': round(2 ** (bucket / step), 2),
+                        'price_to': round(2 ** ((bucket + 1) / step), 2),
+                        'products': count
+                    }
+                    for bucket, count in sorted((int(b), c) for b, c in self.price_histogram.items())
+                ],
+            },
+            'rating': {
+                'min': float(self.rating_min) if self.rating_min is not None else None,
+                'max': float(self.rating_max) if self.rating_max is not None else None,
+                'mean': round(rating_mean, 2) if rating_mean is not None else None,
+                'stddev': round(rating_stddev, 2) if rating_stddev is not None else None,
+                'histogram': [
+                    {'rating_from': float(bucket), 'products': count}
+                    for bucket, count in sorted(self.rating_histogram.items(), key=lambda item: float(item[0]))
+                ],
+            },
+            'price_rating_correlation': round(max(-1.0, min(1.0, correlation)), 3) if correlation is not None else None,
+            'updated_at': self.updated_at.isoformat()
+        }
+
+class LLMCall(BaseModel):
+    """One LLM call as its caller saw it: retries and a hedged copy included, with its latency, token usage and outcome"""
+    OUTCOME_OK = 'ok'
+    # The response was not clean JSON: salvaged by the tolerant parser, cut off, or not parseable at all
+    OUTCOME_SALVAGED = 'salvaged'
+    OUTCOME_TRUNCATED = 'truncated'
+    OUTCOME_PARSE_FAILED = 'parse_failed'
+    OUTCOME_ERROR = 'error'
+    JSON_FAILURES = (OUTCOME_SALVAGED, OUTCOME_TRUNCATED, OUTCOME_PARSE_FAILED)
+
+    call_type = models.CharField(max_length=50)
+    search_key = models.CharField(max_length=450, null=True, blank=True)
+    job = models.ForeignKey(Job, null=True, blank=True, on_delete=models.SET_NULL, related_name='llm_calls')
+    model = models.CharField(max_length=100)
+    outcome = models.CharField(max_length=20, default=OUTCOME_OK)
+    latency_ms = models.FloatField()
+    first_chunk_ms = models.FloatField(null=True, blank=True)
+    prompt_tokens = models.PositiveIntegerField(null=True, blank=True)
+    completion_tokens = models.PositiveIntegerField(null=True, blank=True)
+    cost_usd = models.FloatField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=1)
+    hedged = models.BooleanField(default=False)
+    # Elements parsed out of a streamed JSON array, and those dropped as malformed
+    items = models.PositiveIntegerField(null=True, blank=True)
+    malformed_items = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'call_type'], name='analyzer_llmcall_time_idx'),
+            models.Index(fields=['search_key', 'created_at'], name='analyzer_llmcall_key_idx'),
+        ]
@@ -0,0 +1,61 @@
+import json
+from typing import Dict, List
+
+from .llm_rate_limiter import estimate_tokens
+
+
+def payload_json(payloads) -> str:
+    """Compact JSON used for product payloads in prompts; indentation would only add tokens"""
+    return json.dumps(payloads, separators=(',', ':'), ensure_ascii=False)
+
+
+def payload_tokens(payload: Dict) -> int:
+    # +1 for the comma separating it from its neighbour in the array
+    return estimate_tokens(payload_json(payload)) + 1
+
+
+def trim_description(payload: Dict, max_tokens: int) -> Dict:
+    """Shorten the description so the whole payload fits in `max_tokens`"""
+    excess = payload_tokens(payload) - max_tokens
+    if excess <= 0 or not payload.get('description'):
+        return payload
+    description = payload['description']
+    keep = max(0, len(description) - excess * 4)
+    return dict(payload, description=description[:keep].rsplit(' ', 1)[0])
+
+
+def pack_payloads(
+    payloads: List[Dict],
+    input_budget: int,
+    output_budget: int,
+    output_tokens_per_item: int,
+    overhead_tokens: int = 0
+) -> List[List[Dict]]:
+    """
+    Pack product payloads into as few requests as the token budgets allow.
+
+    Each request holds at most `output_budget // output_tokens_per_item`
+    products (the summaries must fit in max_tokens) and at most
+    `input_budget - overhead_tokens` tokens of product JSON. First-fit
+    decreasing places the largest payloads first, each into the first request
+    with room left, which keeps requests close to full on both budgets. A
+    payload too big for any request on its own has its description trimmed.
+    """
+    if not payloads:
+        return []
+    per_request = max(1, output_budget // output_tokens_per_item)
+    capacity = max(1, input_budget - overhead_tokens)
+
+    sized = [(payload_tokens(p), p) for p in (trim_description(p, capacity) for p in payloads)]
+    sized.sort(key=lambda item: item[0], reverse=True)
+
+    bins = []  # [free input tokens, payloads]
+    for tokens, payload in sized:
+        for request in bins:
+            if request[0] >= tokens and len(request[1]) < per_request:
+                request[0] -= tokens
+                request[1].append(payload)
+                break
+        else:
+            bins.append([capacity - tokens, [payload]])
+    return [request[1] for request in bins]
@@ -0,0 +1,249 @@
+import logging
+from abc import ABC, abstractmethod
+from html.parser import HTMLParser
+from typing import Dict, List
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:  # lxml is optional, the targeted parser covers its absence
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_FIELDS = ('name', 'price', 'rating', 'description')
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+
+
+def _classes(attrs: Dict) -> set:
+    return set((attrs.get('class') or '').split())
+
+
+def _is_product_link(attrs: Dict) -> bool:
+    return {'a-link-normal', 's-no-outline'} <= _classes(attrs)
+
+
+class BaseExtractor(ABC):
+    """
+    Pulls the handful of fields the scraper needs out of Amazon pages.
+
+    `extract_product` returns the raw text of the title, price, rating and
+    feature bullets (None for anything missing) and `extract_links` returns the
+    product hrefs of a search page. Cleaning and type conversion stay in the
+    scraper so every backend produces identical products.
+    """
+
+    name = None
+
+    @abstractmethod
+    def extract_product(self, content: bytes) -> Dict:
+        ...
+
+    @abstractmethod
+    def extract_links(self, content: bytes) -> List[str]:
+        ...
+
+
+class SoupExtractor(BaseExtractor):
+    """Full BeautifulSoup parse, the original and most forgiving backend"""
+
+    name = 'soup'
+
+    def extract_product(self, content: bytes) -> Dict:
+        soup = BeautifulSoup(content, 'html.parser')
+        name = soup.find('span', {'id': 'productTitle'})
+        price = soup.find('span', {'class': 'a-price-whole'})
+        rating = soup.find('span', {'class': 'a-icon-alt'})
+        description = soup.find('div', {'id': 'feature-bullets'})
+        return {
+            'name': name.text if name else None,
+            'price': price.text if price else None,
+            'rating': rating.text if rating else None,
+            'description': description.text if description else None,
+        }
+
+    def extract_links(self, content: bytes) -> List[str]:
+        soup = BeautifulSoup(content, 'html.parser')
+        return [a.get('href') for a in soup.find_all('a', {'class': 'a-link-normal s-no-outline'})]
+
+
+class ProductPageScanner(HTMLParser):
+    """
+    Event-based scanner that keeps only the text of the elements we need.
+
+    No tree is built: text is collected while inside a target element and the
+    element is complete once its closing tag balances the opening one. Because
+    HTMLParser accepts input in pieces, `feed` can be called chunk by chunk and
+    `complete` tells the caller when every field has been seen.
+    """
+
+    def __init__(self, fields=PRODUCT_FIELDS):
+        super().__init__(convert_charrefs=True)
+        self.fields = fields
+        self.values = {}
+        self._active = []  # [field, depth, text parts]
+
+    @staticmethod
+    def _target(tag: str, attrs: Dict) -> str:
+        if tag == 'span':
+            if attrs.get('id') == 'productTitle':
+                return 'name'
+            classes = _classes(attrs)
+            if 'a-price-whole' in classes:
+                return 'price'
+            if 'a-icon-alt' in classes:
+                return 'rating'
+        elif tag == 'div' and attrs.get('id') == 'feature-bullets':
+            return 'description'
+        return None
+
+    @property
+    def complete(self) -> bool:
+        return all(field in self.values for field in self.fields) and not self._active
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+        for capture in self._active:
+            capture[1] += 1
+
+        field = self._target(tag, dict(attrs))
+        if field in self.fields and field not in self.values and not any(c[0] == field for c in self._active):
+            self._active.append([field, 1, []])
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        for capture in list(self._active):
+            capture[1] -= 1
+            if capture[1] == 0:
+                self._active.remove(capture)
+                self.values[capture[0]] = ''.join(capture[2])
+
+    def handle_data(self, data):
+        for capture in self._active:
+            capture[2].append(data)
+
+    def close(self):
+        super().close()
+        # Elements left open by sloppy markup keep whatever text they collected
+        for field, _, parts in self._active:
+            self.values.setdefault(field, ''.join(parts))
+        self._active = []
+
+    def result(self) -> Dict:
+        return {field: self.values.get(field) for field in PRODUCT_FIELDS}
+
+
+class SearchPageScanner(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            attrs = dict(attrs)
+            if _is_product_link(attrs):
+                self.links.append(attrs.get('href'))
+
+
+class TargetedExtractor(BaseExtractor):
+    """Single pass over the markup with no tree construction, using only the standard library"""
+
+    name = 'targeted'
+
+    def extract_product(self, content: bytes) -> Dict:
+        scanner = ProductPageScanner()
+        scanner.feed(content.decode('utf-8', errors='replace'))
+        scanner.close()
+        return scanner.result()
+
+    def extract_links(self, content: bytes) -> List[str]:
+        scanner = SearchPageScanner()
+        scanner.feed(content.decode('utf-8', errors='replace'))
+        scanner.close()
+        return scanner.links
+
+
+class LxmlExtractor(BaseExtractor):
+    """
+    libxml2 parse of the product block; only available when lxml is installed
+
+    A product page is fed to a pull parser starting at the first tag that
+    mentions one of the fields, and parsing stops once every field's element
+    has closed, so the navigation and carousel markup around the product block
+    never becomes a tree. Search pages are small and parsed whole.
+    """
+
+    name = 'lxml'
+    FIELD_MARKERS = (b'productTitle', b'a-price-whole', b'a-icon-alt', b'feature-bullets')
+    CHUNK_SIZE = 16 * 1024
+
+    @staticmethod
+    def _has_class(name: str) -> str:
+        return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+    @staticmethod
+    def _parse(content: bytes):
+        # Without an explicit encoding libxml2 assumes latin-1 for pages lacking a meta charset
+        return lxml.html.fromstring(content, parser=lxml.html.HTMLParser(encoding='utf-8'))
+
+    def _fragment_start(self, content: bytes) -> int:
+        """Offset of the tag holding the first field marker, or 0 when no marker is found"""
+        found = [offset for offset in map(content.find, self.FIELD_MARKERS) if offset >= 0]
+        return max(content.rfind(b'<', 0, min(found)), 0) if found else 0
+
+    def extract_product(self, content: bytes) -> Dict:
+        parser = lxml.etree.HTMLPullParser(events=('end',), encoding='utf-8')
+        parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+        values = {}
+
+        def collect():
+            for _, element in parser.read_events():
+                field = ProductPageScanner._target(element.tag, element.attrib)
+                if field and field not in values:
+                    values[field] = element.text_content()
+
+        for offset in range(self._fragment_start(content), len(content), self.CHUNK_SIZE):
+            parser.feed(content[offset:offset + self.CHUNK_SIZE])
+            collect()
+            if len(values) == len(PRODUCT_FIELDS):
+                break
+        else:
+            # Elements left open at the end of the page close here
+            parser.close()
+            collect()
+        return {field: values.get(field) for field in PRODUCT_FIELDS}
+
+    def extract_links(self, content: bytes) -> List[str]:
+        doc = self._parse(content)
+        return doc.xpath(
+            f'//a[{self._has_class("a-link-normal")} and {self._has_class("s-no-outline")}]/@href'
+        )
+
+
+EXTRACTORS = {
+    extractor.name: extractor
+    for extractor in (SoupExtractor, TargetedExtractor, LxmlExtractor)
+}
+
+
+def available_extractors() -> List[str]:
+    return [name for name in EXTRACTORS if name != 'lxml' or lxml is not None]
+
+
+def get_extractor(name: str = 'auto') -> BaseExtractor:
+    """Return the named backend, with 'auto' picking the fastest one installed"""
+    if name == 'auto':
+        name = 'lxml' if lxml is not None else 'targeted'
+    if name == 'lxml' and lxml is None:
+        logger.warning("lxml is not installed, falling back to the targeted parser")
+        name = 'targeted'
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown HTML extractor: {name}")
+    return EXTRACTORS[name]()
@@ -0,0 +1,258 @@
+import html
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+from ..management.commands.run_scraper import BLOCKED_MARKER
+
+BACKUP_PATH = Path(__file__).resolve().parents[2] / 'products_backup.json'
+RESULTS_PER_PAGE = 20
+BASE36_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+VARIANT_ASIN_PREFIX = 'BX'
+
+
+def load_products(path: Path = BACKUP_PATH) -> List[Dict]:
+    """Load the products_backup.json dump, giving each product a unique ASIN"""
+    with open(path, 'r') as f:
+        products = json.load(f)
+
+    seen = set()
+    for index, product in enumerate(products):
+        match = re.search(r'/dp/([A-Z0-9]{10})', product.get('url', ''))
+        asin = match.group(1) if match else None
+        if not asin or asin in seen:
+            asin = f'B0FAKE{index:04d}'
+        seen.add(asin)
+        product['asin'] = asin
+    return products
+
+
+def variant_asin(number: int) -> str:
+    """A 10-character ASIN for the numbered synthetic variant, the number written in base 36"""
+    width = 10 - len(VARIANT_ASIN_PREFIX)
+    if not 0 <= number < 36 ** width:
+        raise ValueError(f"Variant number {number} does not fit in an ASIN")
+    digits = ''
+    for _ in range(width):
+        number, digit = divmod(number, 36)
+        digits = BASE36_DIGITS[digit] + digits
+    return VARIANT_ASIN_PREFIX + digits
+
+
+def multiply_products(products: List[Dict], multiplier: int, seed: int = 0) -> List[Dict]:
+    """Grow the catalogue with synthetic variants of each product, each with its own ASIN"""
+    rng = random.Random(seed)
+    catalogue = list(products)
+    for copy in range(1, multiplier):
+        for index, product in enumerate(products):
+            catalogue.append(dict(
+                product,
+                asin=variant_asin(copy * len(products) + index),
+                name=f'{product["name"]} (Variant {copy})',
+                price=round(product['price'] * rng.uniform(0.8, 1.2)),
+                rating=product.get('rating') and round(min(5.0, max(1.0, product['rating'] + rng.uniform(-0.5, 0.5))), 1)
+            ))
+    return catalogue
+
+
+def render_search_page(products: List[Dict]) -> str:
+    results = ''.join(
+        f'<div class="s-result-item" data-asin="{p["asin"]}">'
+        f'<a class="a-link-normal s-no-outline" href="/{p["asin"]}/dp/{p["asin"]}/ref=sr_1_{i}">'
+        f'<img alt="{html.escape(p["name"][:60])}"></a></div>'
+        for i, p in enumerate(products, 1)
+    )
+    return f'<html><head><title>Amazon.in</title></head><body><div class="s-main-slot">{results}</div></body></html>'
+
+
+def render_filler(size_kb: int, seed: int = 0) -> str:
+    """Navigation, carousel and script markup that pads a page towards the size of a real Amazon page"""
+    block = (
+        '<div class="a-section a-spacing-none"><div class="a-row"><ul class="a-unordered-list">'
+        + ''.join(
+            f'<li class="a-carousel-card"><a class="a-link-normal" href="/gp/item/{seed}-{i}">'
+            f'<span class="a-truncate">Recommended item {seed}-{i} with a long descriptive name</span>'
+            f'</a><span class="a-size-small">&#8377;{1000 + i * 37:,}</span></li>'
+            for i in range(12)
+        )
+        + '</ul></div></div>'
+        f'<script type="text/javascript">P.when("A").execute(function(A){{var s{seed}={{"w":{seed}}};}});</script>'
+    )
+    return block * max(1, (size_kb * 1024) // len(block)) if size_kb else ''
+
+
+def render_product_page(product: Dict, padding_kb: int = 0) -> str:
+    rating = (
+        f'<span class="a-icon-alt">{product["rating"]} out of 5 stars</span>'
+        if product.get('rating') else ''
+    )
+    # Real pages carry most of their weight around the product block, so split the padding
+    return (
+        '<html><head><title>Amazon.in</title></head><body>'
+        f'{render_filler(padding_kb // 3, 1)}'
+        f'<div id="centerCol"><h1><span id="productTitle">{html.escape(product["name"])}</span></h1>'
+        f'<div id="averageCustomerReviews">{rating}</div>'
+        f'<span class="a-price"><span class="a-price-whole">{product["price"]:,.0f}</span></span>'
+        f'<div id="feature-bullets"><ul><li><span>{html.escape(product["description"])}</span></li></ul></div>'
+        '</div>'
+        f'{render_filler(padding_kb - padding_kb // 3, 2)}'
+        '</body></html>'
+    )
+
+
+def render_blocked_page() -> str:
+    return (
+        '<html><head><title>Amazon.in</title></head><body>'
+        f'<p>{BLOCKED_MARKER} api-services-support@amazon.com.</p>'
+        '</body></html>'
+    )
+
+
+class FakeAmazonHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        delay = server.latency + (server.rng_uniform(0, server.jitter) if server.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        server.count('requests')
+
+        fault = server.pick_fault()
+        if fault == 'error':
+            self.send_error(503)
+            return
+        if fault == 'block':
+            self._send_body(render_blocked_page())
+            return
+
+        parts = urlsplit(self.path)
+        if server.replay_dir:
+            self._replay(parts)
+            return
+        if parts.path == '/s':
+            page = int(parse_qs(parts.query).get('page', ['1'])[0])
+            start = (page - 1) * RESULTS_PER_PAGE
+            self._send_body(render_search_page(server.products[start:start + RESULTS_PER_PAGE]))
+            return
+
+        match = re.search(r'/dp/([A-Z0-9]{10})', parts.path)
+        product = server.products_by_asin.get(match.group(1)) if match else None
+        if not product:
+            self.send_error(404)
+            return
+        etag = f'"{product["asin"]}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self._send_body(render_product_page(product, padding_kb=server.padding_kb), etag)
+
+    def _replay(self, parts):
+        """Serve pages captured by record_amazon_pages: search-<page>.html and <ASIN>.html"""
+        if parts.path == '/s':
+            name = f"search-{parse_qs(parts.query).get('page', ['1'])[0]}.html"
+        else:
+            match = re.search(r'/(?:dp|gp/product)/([A-Z0-9]{10})', parts.path)
+            name = f'{match.group(1)}.html' if match else None
+        path = self.server.replay_dir / name if name else None
+        if not path or not path.is_file():
+            self.send_error(404)
+            return
+        self._send_body(path.read_bytes())
+
+    def _send_body(self, body, etag: str = None):
+        payload = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(200)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAmazonServer(ThreadingHTTPServer):
+    """
+    Local stand-in for amazon.in that serves search and product pages from products_backup.json
+
+    Args:
+        products: Catalogue to serve; defaults to products_backup.json
+        latency: Seconds added to every response, plus up to `jitter` seconds at random
+        error_rate: Share of requests answered with 503
+        block_rate: Share of requests answered with Amazon's automated access page
+        multiplier: Serve this many synthetic variants of each product
+        padding_kb: Pad product pages towards the size of real ones
+        replay_dir: Serve pages captured by record_amazon_pages instead of generated ones
+        seed: Seed for the jitter, fault and variant randomness
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        products: List[Dict] = None,
+        latency: float = 0.0,
+        port: int = 0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        block_rate: float = 0.0,
+        multiplier: int = 1,
+        padding_kb: int = 0,
+        replay_dir: str = None,
+        seed: int = None
+    ):
+        super().__init__(('127.0.0.1', port), FakeAmazonHandler)
+        products = products if products is not None else load_products()
+        self.products = multiply_products(products, multiplier, seed or 0) if multiplier > 1 else products
+        self.products_by_asin = {p['asin']: p for p in self.products}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.block_rate = block_rate
+        self.padding_kb = padding_kb
+        self.replay_dir = Path(replay_dir) if replay_dir else None
+        self.counters = {'requests': 0, 'errors': 0, 'blocks': 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def rng_uniform(self, low: float, high: float) -> float:
+        with self._lock:
+            return self._rng.uniform(low, high)
+
+    def count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def pick_fault(self) -> str:
+        """Decide whether this request gets an injected 503 ('error') or block page ('block')"""
+        with self._lock:
+            roll = self._rng.random()
+            if roll < self.error_rate:
+                self.counters['errors'] += 1
+                return 'error'
+            if roll < self.error_rate + self.block_rate:
+                self.counters['blocks'] += 1
+                return 'block'
+        return None
+
+    @property
+    def origin(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,331 @@
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from .llm_rate_limiter import estimate_tokens
+
+COMPLETION_PATHS = ('/openai/v1/chat/completions', '/v1/chat/completions')
+PRODUCTS_MARKER = 'Products:'
+DIGEST_MARKER = 'Digest:'
+STREAM_PIECE_CHARS = 16
+MALFORMATIONS = ('fence', 'prose', 'trailing_comma', 'truncate')
+
+
+def _embedded_json(prompt: str, marker: str):
+    """The JSON value that follows `marker` in a prompt, or None"""
+    index = prompt.find(marker)
+    if index < 0:
+        return None
+    start = min((i for i in (prompt.find('[', index), prompt.find('{', index)) if i >= 0), default=-1)
+    if start < 0:
+        return None
+    try:
+        return json.JSONDecoder().raw_decode(prompt, start)[0]
+    except json.JSONDecodeError:
+        return None
+
+
+def _route(path: str) -> str:
+    return path.split('?', 1)[0].rstrip('/')
+
+
+def fake_summary(product: Dict) -> str:
+    """A deterministic summary of about the length the real prompt asks for"""
+    rating = f", rated {product['rating']} out of 5" if product.get('rating') else ''
+    words = (product.get('description') or '').split()[:45]
+    return f"{product.get('name', 'This product')[:80]} sells for {product.get('price', 0):,.0f}{rating}. {' '.join(words)}"
+
+
+def fake_trends(digest: Dict) -> Dict:
+    bands = digest.get('price_bands') or []
+    return {
+        'trends': [
+            {
+                'title': f'Price band {i + 1}',
+                'description': f"{band.get('products', 0)} products between {band.get('price_from')} and {band.get('price_to')}",
+                'supporting_data': f"Mean rating {band.get('mean_rating')}",
+            }
+            for i, band in enumerate(bands[:3])
+        ],
+        'summary': f"{digest.get('product_count', 0)} products analyzed",
+    }
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients can reuse pooled connections the way they do against Groq
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        if _route(self.path) not in COMPLETION_PATHS:
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = ''.join(m.get('content') or '' for m in body.get('messages', []))
+        max_tokens = body.get('max_tokens') or 1024
+        prompt_tokens = estimate_tokens(prompt)
+
+        time.sleep(server.response_delay())
+        headers, retry_after = server.admit(prompt_tokens + max_tokens)
+        if retry_after is not None:
+            self._send_json(429, {'error': {
+                'message': 'Rate limit reached, please try again later',
+                'type': 'tokens',
+                'code': 'rate_limit_exceeded',
+            }}, dict(headers, **{'retry-after': f'{retry_after:.2f}'}))
+            return
+
+        content, finish_reason = server.complete(prompt, max_tokens)
+        completion_tokens = estimate_tokens(content)
+        server.record(prompt_tokens, completion_tokens)
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+
+        if body.get('stream'):
+            try:
+                self._stream(completion_id, body.get('model'), content, finish_reason, usage, headers)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client hung up, e.g. on the losing copy of a hedged request
+                server.count('abandoned_streams')
+            return
+        if server.tokens_per_second:
+            time.sleep(completion_tokens / server.tokens_per_second)
+        self._send_json(200, {
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': finish_reason,
+            }],
+            'usage': usage,
+        }, headers)
+
+    def _stream(self, completion_id: str, model: str, content: str, finish_reason: str, usage: Dict, headers: Dict):
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        # The stream has no Content-Length, so its end is marked by closing the connection
+        self.send_header('Connection', 'close')
+        self.close_connection = True
+        self.end_headers()
+
+        def event(delta: Dict, finish: str = None, **extra):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}],
+                **extra,
+            }
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+
+        pause = (STREAM_PIECE_CHARS / 4) / self.server.tokens_per_second if self.server.tokens_per_second else 0
+        event({'role': 'assistant', 'content': ''})
+        for start in range(0, len(content), STREAM_PIECE_CHARS):
+            if pause:
+                time.sleep(pause)
+            event({'content': content[start:start + STREAM_PIECE_CHARS]})
+        # Groq reports usage on the final chunk under x_groq
+        event({}, finish_reason, x_groq={'id': completion_id, 'usage': usage})
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict = None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    """
+    Local Groq/OpenAI-compatible chat completions server for load-testing the LLM pipeline
+
+    Summary prompts are answered with a deterministic summary for every
+    product in them, trend prompts with trends built from the digest, both as
+    valid JSON in the format the prompt asks for. Streaming follows Groq's
+    server-sent events, including usage under x_groq on the last chunk.
+
+    Args:
+        latency: Seconds before a response starts, plus up to `jitter` seconds at random
+        stall_rate: Share of responses held back a further `stall_seconds`, for a heavy latency tail
+        tokens_per_second: Generation speed; 0 answers instantly
+        requests_per_minute: Request limit, reported in x-ratelimit-* headers and enforced with 429s
+        tokens_per_minute: Token limit (prompt + max_tokens), reported and enforced the same way
+        rate_limit_rate: Share of requests answered with 429 regardless of the limits
+        malformed_rate: Share of responses broken in one of `malformations`
+        malformations: The kinds of breakage to pick from, by default all of MALFORMATIONS
+        skip_rate: Share of products left out of summary responses
+        seed: Seed for the jitter and fault randomness
+    """
+
+    daemon_threads = True
+    # Idle keep-alive connections must not hold up shutdown
+    block_on_close = False
+    WINDOW_SECONDS = 60
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        port: int = 0,
+        jitter: float = 0.0,
+        stall_rate: float = 0.0,
+        stall_seconds: float = 0.0,
+        tokens_per_second: float = 0.0,
+        requests_per_minute: int = None,
+        tokens_per_minute: int = None,
+        rate_limit_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        malformations=MALFORMATIONS,
+        skip_rate: float = 0.0,
+        seed: int = None
+    ):
+        super().__init__(('127.0.0.1', port), FakeGroqHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.tokens_per_second = tokens_per_second
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.malformations = tuple(malformations)
+        self.skip_rate = skip_rate
+        self.counters = {
+            'requests': 0,
+            'rate_limited': 0,
+            'stalled': 0,
+            'abandoned_streams': 0,
+            'malformed': 0,
+            'truncated': 0,
+            'skipped_products': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+        }
+        self._window = deque()  # [admitted_at, tokens]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def response_delay(self) -> float:
+        with self._lock:
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0)
+            if self.stall_rate and self._rng.random() < self.stall_rate:
+                self.counters['stalled'] += 1
+                delay += self.stall_seconds
+        return delay
+
+    def admit(self, tokens: int):
+        """Count a request against the limits; returns its x-ratelimit-* headers and a retry-after, or None"""
+        with self._lock:
+            self.counters['requests'] += 1
+            now = time.monotonic()
+            while self._window and now - self._window[0][0] >= self.WINDOW_SECONDS:
+                self._window.popleft()
+            used_tokens = sum(entry[1] for entry in self._window)
+            reset = self._window[0][0] + self.WINDOW_SECONDS - now if self._window else 0.0
+
+            retry_after = None
+            if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+                retry_after = reset
+            elif self.tokens_per_minute and used_tokens + tokens > self.tokens_per_minute:
+                retry_after = reset
+            elif self._rng.random() < self.rate_limit_rate:
+                retry_after = 1.0
+            if retry_after is None:
+                self._window.append([now, tokens])
+                used_tokens += tokens
+            else:
+                self.counters['rate_limited'] += 1
+
+            headers = {}
+            if self.requests_per_minute:
+                headers['x-ratelimit-limit-requests'] = str(self.requests_per_minute)
+                headers['x-ratelimit-remaining-requests'] = str(max(0, self.requests_per_minute - len(self._window)))
+                headers['x-ratelimit-reset-requests'] = f'{reset:.2f}s'
+            if self.tokens_per_minute:
+                headers['x-ratelimit-limit-tokens'] = str(self.tokens_per_minute)
+                headers['x-ratelimit-remaining-tokens'] = str(max(0, self.tokens_per_minute - used_tokens))
+                headers['x-ratelimit-reset-tokens'] = f'{reset:.2f}s'
+            return headers, retry_after
+
+    def record(self, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            self.counters['prompt_tokens'] += prompt_tokens
+            self.counters['completion_tokens'] += completion_tokens
+
+    def complete(self, prompt: str, max_tokens: int):
+        """The completion text for a prompt and its finish_reason"""
+        products = _embedded_json(prompt, PRODUCTS_MARKER)
+        if isinstance(products, list):
+            with self._lock:
+                kept = [p for p in products if self._rng.random() >= self.skip_rate]
+                self.counters['skipped_products'] += len(products) - len(kept)
+            answer = [{'uuid': p.get('uuid'), 'summary': fake_summary(p)} for p in kept]
+        else:
+            answer = fake_trends(_embedded_json(prompt, DIGEST_MARKER) or {})
+        content = self._malform(json.dumps(answer, indent=2, ensure_ascii=False))
+
+        # Like a real model, stop mid-answer once max_tokens are used up
+        if estimate_tokens(content) > max_tokens:
+            with self._lock:
+                self.counters['truncated'] += 1
+            return content[:max_tokens * 4], 'length'
+        return content, 'stop'
+
+    def _malform(self, content: str) -> str:
+        with self._lock:
+            if self._rng.random() >= self.malformed_rate:
+                return content
+            self.counters['malformed'] += 1
+            kind = self._rng.choice(self.malformations)
+            cut = self._rng.uniform(0.3, 0.9)
+        if kind == 'fence':
+            return f'Here are the summaries:\n```json\n{content}\n```'
+        if kind == 'prose':
+            return f'{content}\n\nLet me know if you need anything else.'
+        if kind == 'trailing_comma':
+            return re.sub(r'"\n(\s*)}', '",\n\\1}', content)
+        return content[:int(len(content) * cut)]
+
+    @property
+    def origin(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from ..models import FrontierURL, HostRateLimit, Job
+from ..management.commands.run_scraper import AsyncAmazonScraper, extract_asin
+from .product_writer import ProductWriter
+from .scraping import fresh_asins
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_urls(urls: Iterable[str], search_key: str, job: Job = None) -> int:
+    """
+    Add product URLs to the frontier, putting finished entries for the same ASIN back in play
+
+    Done and failed entries, and pending ones no queued or running job is
+    waiting on, are reassigned to `job`. Entries another active job queued
+    stay with it, so its progress counts are not taken away mid-run.
+    """
+    entries = {}
+    for url in urls:
+        asin = extract_asin(url)
+        entries.setdefault(asin or url, FrontierURL(url=url, asin=asin, search_key=search_key, job=job))
+    if not entries:
+        return 0
+
+    FrontierURL.objects.bulk_create(entries.values(), ignore_conflicts=True)
+    asins = [entry.asin for entry in entries.values() if entry.asin]
+    # Leased rows are left to the worker holding them
+    active_jobs = Job.objects.filter(status__in=[Job.STATUS_QUEUED, Job.STATUS_RUNNING])
+    if job is not None:
+        active_jobs = active_jobs.exclude(pk=job.pk)
+    FrontierURL.objects.filter(asin__in=asins, search_key=search_key).filter(
+        Q(status__in=[FrontierURL.STATUS_DONE, FrontierURL.STATUS_FAILED]) |
+        Q(status=FrontierURL.STATUS_PENDING) & ~Q(job__in=active_jobs)
+    ).update(status=FrontierURL.STATUS_PENDING, attempts=0, last_error=None, job=job, updated_at=timezone.now())
+    logger.info(f"Queued {len(entries)} product pages for '{search_key}' in the frontier")
+    return len(entries)
+
+
+def claim_batch(worker: str, size: int = None, lease_seconds: int = None) -> List[FrontierURL]:
+    """
+    Lease up to `size` frontier entries to `worker`.
+
+    Like claim_next_job, SELECT ... FOR UPDATE SKIP LOCKED lets every worker
+    claim from the same table without waiting on each other. Entries whose
+    lease ran out (the worker died mid-batch) are claimable again until they
+    reach FRONTIER_MAX_ATTEMPTS, after which they are marked failed.
+    """
+    size = size or settings.FRONTIER_BATCH_SIZE
+    lease_seconds = lease_seconds or settings.FRONTIER_LEASE_SECONDS
+    now = timezone.now()
+
+    FrontierURL.objects.filter(
+        status=FrontierURL.STATUS_LEASED,
+        lease_expires_at__lt=now,
+        attempts__gte=settings.FRONTIER_MAX_ATTEMPTS
+    ).update(status=FrontierURL.STATUS_FAILED, last_error='Lease expired', leased_by=None, updated_at=now)
+
+    with transaction.atomic():
+        entries = list(
+            FrontierURL.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=FrontierURL.STATUS_PENDING) |
+                Q(status=FrontierURL.STATUS_LEASED, lease_expires_at__lt=now),
+                attempts__lt=settings.FRONTIER_MAX_ATTEMPTS
+            )
+            .order_by('created_at')[:size]
+        )
+        if not entries:
+            return []
+        lease_expires_at = now + timedelta(seconds=lease_seconds)
+        FrontierURL.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+            status=FrontierURL.STATUS_LEASED,
+            leased_by=worker,
+            lease_expires_at=lease_expires_at,
+            attempts=F('attempts') + 1,
+            updated_at=now
+        )
+    for entry in entries:
+        entry.status = FrontierURL.STATUS_LEASED
+        entry.leased_by = worker
+        entry.lease_expires_at = lease_expires_at
+        entry.attempts += 1
+    return entries
+
+
+def _held(worker: str, entries: List[FrontierURL]):
+    """Lock the entries `worker` still holds a lease on; call inside a transaction"""
+    return FrontierURL.objects.select_for_update().filter(
+        pk__in=[entry.pk for entry in entries],
+        status=FrontierURL.STATUS_LEASED,
+        leased_by=worker
+    )
+
+
+def complete(worker: str, entries: List[FrontierURL]) -> List[FrontierURL]:
+    """
+    Mark entries leased to `worker` done; returns the ones it still held
+
+    An entry whose lease expired may have been claimed by another worker
+    since, and is left to that worker.
+    """
+    with transaction.atomic():
+        held = set(_held(worker, entries).values_list('pk', flat=True))
+        FrontierURL.objects.filter(pk__in=held, status=FrontierURL.STATUS_LEASED, leased_by=worker).update(
+            status=FrontierURL.STATUS_DONE,
+            leased_by=None,
+            lease_expires_at=None,
+            last_error=None,
+            updated_at=timezone.now()
+        )
+    return [entry for entry in entries if entry.pk in held]
+
+
+def fail(worker: str, entries: List[FrontierURL], error: str) -> List[FrontierURL]:
+    """
+    Release failed entries leased to `worker` for another attempt, or mark them failed once attempts run out
+
+    Returns the entries it still held, like complete().
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        held = set(_held(worker, entries).values_list('pk', flat=True))
+        rows = FrontierURL.objects.filter(pk__in=held, status=FrontierURL.STATUS_LEASED, leased_by=worker)
+        rows.filter(attempts__lt=settings.FRONTIER_MAX_ATTEMPTS).update(
+            status=FrontierURL.STATUS_PENDING, leased_by=None, lease_expires_at=None, last_error=error, updated_at=now
+        )
+        rows.filter(attempts__gte=settings.FRONTIER_MAX_ATTEMPTS).update(
+            status=FrontierURL.STATUS_FAILED, leased_by=None, lease_expires_at=None, last_error=error, updated_at=now
+        )
+    return [entry for entry in entries if entry.pk in held]
+
+
+class DatabaseRateLimiter:
+    """
+    Per-host token bucket kept in the HostRateLimit table.
+
+    Every worker reserves its tokens from the same row under a row lock, so the
+    request rate against a host holds across all frontier workers instead of
+    multiplying with their number. Reservations work like TokenBucket.reserve:
+    the row may go negative and the caller sleeps off the returned wait. The
+    rate is kept in the row as well: set_rate() stores it for every host this
+    limiter has used, and each reservation reads it back into `rate`, so an
+    adaptive cut made by one worker slows all of them. The ORM cannot run on
+    the event loop thread, so the async side hands the reservation to a
+    single dedicated thread, and set_rate() queues its write there too.
+    """
+
+    def __init__(self, rate: float = None, capacity: float = None):
+        self.rate = rate or settings.SCRAPE_RATE_LIMIT
+        self.capacity = capacity or settings.SCRAPE_BURST
+        self._hosts = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rate-limit')
+
+    @staticmethod
+    def _refill(bucket: HostRateLimit, rate: float, capacity: float, now):
+        elapsed = (now - bucket.refilled_at).total_seconds()
+        bucket.tokens = min(capacity, bucket.tokens + elapsed * rate)
+        bucket.refilled_at = now
+
+    def reserve(self, url: str) -> float:
+        """Take one token for the URL's host and return how long to wait before using it"""
+        host = urlsplit(url).netloc.lower()
+        with transaction.atomic():
+            HostRateLimit.objects.get_or_create(host=host, defaults={'tokens': self.capacity, 'rate': self.rate})
+            bucket = HostRateLimit.objects.select_for_update().get(host=host)
+            rate = bucket.rate or self.rate
+            self._refill(bucket, rate, self.capacity, timezone.now())
+            bucket.tokens -= 1
+            bucket.save(update_fields=['tokens', 'refilled_at', 'updated_at'])
+        self._hosts.add(host)
+        self.rate = rate
+        return max(0.0, -bucket.tokens / rate)
+
+    def set_rate(self, rate: float) -> Future:
+        """Change the rate for every worker; the returned future is done once it is stored"""
+        self.rate = rate
+        return self._executor.submit(self._store_rate, rate)
+
+    def _store_rate(self, rate: float):
+        for host in sorted(self._hosts):
+            with transaction.atomic():
+                bucket = HostRateLimit.objects.select_for_update().filter(host=host).first()
+                if bucket is None:
+                    continue
+                # Settle the tokens earned at the old rate before switching
+                self._refill(bucket, bucket.rate or rate, self.capacity, timezone.now())
+                bucket.rate = rate
+                bucket.save(update_fields=['tokens', 'refilled_at', 'rate', 'updated_at'])
+
+    def wait(self, url: str):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire(self, url: str):
+        delay = await asyncio.get_running_loop().run_in_executor(self._executor, self.reserve, url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def close(self):
+        self._executor.submit(connections.close_all).result()
+        self._executor.shutdown()
+
+
+def process_frontier_batch(worker: str, scraper: AsyncAmazonScraper, size: int = None) -> Dict:
+    """Lease a batch from the frontier, scrape it and upsert the products found"""
+    entries = claim_batch(worker, size)
+    if not entries:
+        return {'claimed': 0, 'done': 0, 'failed': 0, 'lost': 0, 'near_duplicates': 0}
+
+    products = asyncio.run(scraper.scrape_urls([(entry.url, entry.search_key) for entry in entries]))
+    scraped = {entry.pk: product_data for entry, product_data in zip(entries, products) if product_data is not None}
+    # Entries whose lease ran out meanwhile belong to whoever reclaimed them, so their pages are not written here
+    done = complete(worker, [entry for entry in entries if entry.pk in scraped])
+    failed = fail(worker, [entry for entry in entries if entry.pk not in scraped], 'Product page could not be scraped')
+    lost = len(entries) - len(done) - len(failed)
+    if lost:
+        logger.warning(f"Worker {worker} lost the lease on {lost} product pages before finishing them")
+    with ProductWriter() as writer:
+        for entry in done:
+            writer.add(scraped[entry.pk])
+    logger.info(f"Worker {worker} scraped {len(done)} of {len(entries)} leased product pages")
+    return {
+        'claimed': len(entries),
+        'done': len(done),
+        'failed': len(failed),
+        'lost': lost,
+        'near_duplicates': writer.near_duplicates
+    }
+
+
+def frontier_counts(job: Job) -> Dict:
+    counts = dict(job.frontier_urls.values_list('status').annotate(count=Count('pk')))
+    return {status: counts.get(status, 0) for status, _ in FrontierURL.STATUS_CHOICES}
+
+
+def scrape_search_term_distributed(
+    job: Job,
+    search_term: str,
+    max_pages: int = 1,
+    incremental: bool = True,
+    progress: Callable = None
+) -> Dict:
+    """
+    Discover a search term's product pages into the frontier and help work it off
+
+    Frontier workers started with run_frontier_worker pick up the same entries,
+    so the product pages are spread over every worker running. Returns once no
+    entry queued by this job is pending or leased.
+    """
+    rate_limiter = DatabaseRateLimiter()
+    scraper = AsyncAmazonScraper(rate_limiter=rate_limiter)
+    try:
+        links = asyncio.run(scraper.discover_links(search_term, max_pages))
+        skip_asins = fresh_asins(search_term) if incremental else set()
+        targets = [url for url in links if extract_asin(url) not in skip_asins]
+        enqueue_urls(targets, search_term, job=job)
+
+        while True:
+            counts = frontier_counts(job)
+            if progress:
+                progress(counts[FrontierURL.STATUS_DONE], len(targets), failed=counts[FrontierURL.STATUS_FAILED])
+            if not counts[FrontierURL.STATUS_PENDING] and not counts[FrontierURL.STATUS_LEASED]:
+                break
+            if not process_frontier_batch(job.worker or str(job.uuid), scraper)['claimed']:
+                # The rest is leased by other workers; wait for them to finish or their leases to expire
+                time.sleep(settings.JOB_POLL_SECONDS)
+    finally:
+        rate_limiter.close()
+
+    return {
+        'products_scraped': counts[FrontierURL.STATUS_DONE],
+        'products_failed': counts[FrontierURL.STATUS_FAILED],
+        'products_skipped': len(links) - len(targets),
+        'pages_fetched': scraper.pages_fetched,
+        'cache': scraper.cache.stats() if scraper.cache else None,
+        'adaptive': scraper.controller.stats(),
+        'streaming': scraper.stream_stats()
+    }
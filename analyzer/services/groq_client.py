@@ -1,29 +1,227 @@
 import logging
-from typing import Dict, Any, List
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Dict, Any, Iterator, List
 import groq
+import httpx
 from django.conf import settings
 import json
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, retry_if_exception
+
+from .hedging import LatencyTracker, run_hedged, Superseded
+from .json_stream import JsonArrayStream, salvage_json
+from .llm_metrics import CallMetrics
+from .llm_rate_limiter import RateLimitTracker, estimate_tokens, parse_duration
+from .timings import Timings
+from ..models import LLMCall
 
 logger = logging.getLogger(__name__)
 
+# Status codes worth sending again; anything else in 4xx will fail the same way every time
+RETRYABLE_STATUS = {408, 409, 429}
+
+# Shared by every GroqClient in this process: one connection-pooled SDK client per backend, the
+# recent latencies hedging deadlines are taken from, and the threads hedged attempts run on
+_sdk_clients = {}
+_latency_trackers = {}
+_hedge_executor = None
+_shared_lock = threading.Lock()
+
+
+def shared_sdk_client(api_key: str, base_url: str = None) -> groq.Groq:
+    """The process-wide groq.Groq for a backend, so connections are reused across jobs and requests"""
+    key = (api_key, base_url)
+    with _shared_lock:
+        client = _sdk_clients.get(key)
+        if client is None:
+            pool = httpx.Limits(
+                max_connections=settings.LLM_HTTP_POOL_SIZE,
+                max_keepalive_connections=settings.LLM_HTTP_POOL_SIZE
+            )
+            client = groq.Groq(
+                api_key=api_key,
+                base_url=base_url,
+                # Retries are done by GroqClient, where the rate limiter sees every 429
+                max_retries=0,
+                http_client=groq.DefaultHttpxClient(limits=pool)
+            )
+            _sdk_clients[key] = client
+        return client
+
+
+def _latency_tracker(key: tuple) -> LatencyTracker:
+    with _shared_lock:
+        tracker = _latency_trackers.get(key)
+        if tracker is None:
+            tracker = _latency_trackers[key] = LatencyTracker(min_samples=settings.LLM_HEDGE_MIN_SAMPLES)
+        return tracker
+
+
+def _hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _shared_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(
+                max_workers=settings.LLM_HTTP_POOL_SIZE,
+                thread_name_prefix='llm-hedge'
+            )
+        return _hedge_executor
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, groq.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return isinstance(error, groq.APIConnectionError)
+
+
+def retry_after(error: BaseException) -> float:
+    """Seconds the provider asked us to wait in a retry-after(-ms) header, or None"""
+    if not isinstance(error, groq.APIStatusError):
+        return None
+    headers = error.response.headers
+    milliseconds = parse_duration(headers.get('retry-after-ms'))
+    if milliseconds is not None:
+        return milliseconds / 1000
+    return parse_duration(headers.get('retry-after'))
+
+
+def backoff_wait(retry_state) -> float:
+    """
+    Seconds to wait before the next attempt
+
+    The provider's retry-after when it sent one, plus a little jitter so
+    waiting threads do not all come back at once; otherwise "full jitter"
+    exponential backoff, a random wait of up to LLM_RETRY_BASE_SECONDS
+    doubled per attempt.
+    """
+    base = settings.LLM_RETRY_BASE_SECONDS
+    delay = retry_after(retry_state.outcome.exception())
+    if delay is not None:
+        return min(delay, settings.LLM_RETRY_MAX_SECONDS) + random.uniform(0, base)
+    return random.uniform(0, min(settings.LLM_RETRY_MAX_SECONDS, base * 2 ** (retry_state.attempt_number - 1)))
+
+
+def _stop_retrying(retry_state) -> bool:
+    return retry_state.attempt_number >= settings.LLM_RETRY_ATTEMPTS
+
+
+def _log_retry(retry_state):
+    logger.warning(
+        f"Retrying LLM request in {retry_state.next_action.sleep:.2f}s "
+        f"(attempt {retry_state.attempt_number}): {retry_state.outcome.exception()}"
+    )
+
+
+RETRY_POLICY = dict(
+    retry=retry_if_exception(is_retryable),
+    stop=_stop_retrying,
+    wait=backoff_wait,
+    before_sleep=_log_retry,
+    reraise=True
+)
+
+
 class GroqClient:
-    """Generic client for interacting with Groq's LLM API with retry logic and error handling"""
+    """
+    Generic client for interacting with Groq's LLM API with retry logic and error handling
+
+    The backend is any Groq/OpenAI-compatible chat completions endpoint:
+    Groq itself by default, or whatever `base_url` (LLM_BASE_URL) points at,
+    such as the FakeGroqServer used for benchmarks. The underlying SDK client
+    and its connection pool are shared by every GroqClient in the process.
+
+    With LLM_HEDGE_ENABLED, a request that has not answered within the
+    LLM_HEDGE_PERCENTILE latency of recent ones, capped at
+    LLM_HEDGE_MAX_MEDIAN_MULTIPLE times their median, is sent a second time
+    and the first answer is used. For streams the answer is the first chunk.
+    The copy only goes out if the rate limiter has a hedge slot and budget
+    to spare for it.
+
+    The call methods take an optional CallMetrics, which they fill in with
+    the call's attempts, token usage, time to first chunk and, for the
+    structured calls, how well the response parsed.
+    """
     
-    def __init__(self):
-        self.client = groq.Groq(api_key=settings.GROQ_API_KEY)
-        self.model = "llama-3.2-3b-preview"
-        
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        reraise=True
-    )
+    def __init__(
+        self,
+        rate_limiter: RateLimitTracker = None,
+        base_url: str = None,
+        model: str = None,
+        api_key: str = None
+    ):
+        base_url = base_url or settings.LLM_BASE_URL
+        self.client = shared_sdk_client(api_key or settings.GROQ_API_KEY, base_url)
+        self.model = model or settings.LLM_MODEL
+        # Shared by every thread using this client so they pace against the same provider limits
+        self.rate_limiter = rate_limiter
+        self.timings = Timings()
+        self.counters = {'hedged': 0, 'hedges_won': 0}
+        self._counters_lock = threading.Lock()
+        self._latencies = {
+            kind: _latency_tracker((base_url, self.model, kind))
+            for kind in ('completion', 'first_chunk')
+        }
+
+    def _acquire(self, prompt: str, max_tokens: int, attempt):
+        """
+        Wait for the rate limiter, then mark the attempt sent
+
+        Raises Superseded if its hedge race is over, or if it is a hedge copy
+        the rate limiter has no room for.
+        """
+        tokens = estimate_tokens(prompt) + max_tokens
+        if attempt is not None and attempt.backup and self.rate_limiter:
+            ticket = self.rate_limiter.try_acquire_hedge(tokens)
+            if ticket is None:
+                raise Superseded()
+        else:
+            ticket = self.rate_limiter.acquire(tokens) if self.rate_limiter else None
+        if attempt is not None:
+            attempt.ticket = ticket
+            if attempt.settled.is_set():
+                if ticket:
+                    self.rate_limiter.release(ticket)
+                raise Superseded()
+            attempt.sent.set()
+        return ticket
+
+    def _hedged(self, kind: str, call, discard=None, metrics: CallMetrics = None):
+        """Run call(attempt), hedged once hedging is on and there are enough latencies of `kind` to set a deadline"""
+        deadline = self._latencies[kind].deadline(
+            settings.LLM_HEDGE_PERCENTILE, settings.LLM_HEDGE_MAX_MEDIAN_MULTIPLE
+        ) if settings.LLM_HEDGE_ENABLED else None
+        if deadline is None:
+            return call(None)
+        result, winner = run_hedged(call, deadline, _hedge_pool(), discard, self._abandon)
+        if winner:
+            if metrics:
+                metrics.hedged = True
+            with self._counters_lock:
+                self.counters['hedged'] += 1
+                self.counters['hedges_won'] += winner == 'backup'
+        return result
+
+    def _abandon(self, attempt):
+        """Free the rate limiter slot of a request that lost its hedge race without waiting for it to finish"""
+        if attempt.ticket:
+            self.rate_limiter.release(attempt.ticket)
+
+    def stats(self) -> Dict:
+        with self._counters_lock:
+            stats = dict(self.counters)
+        stats['timings'] = self.timings.summary()
+        return stats
+
+    @retry(**RETRY_POLICY)
     def generate_completion(
         self, 
         prompt: str,
         temperature: float = 0.3,
         max_tokens: int = 1000,
+        metrics: CallMetrics = None,
         **kwargs
     ) -> str:
         """
@@ -33,32 +231,150 @@ class GroqClient:
             prompt: The prompt to send to the LLM
             temperature: Controls randomness (0-1)
             max_tokens: Maximum tokens in response
+            metrics: Filled in with the attempts and token usage of the call
             **kwargs: Additional arguments to pass to the API
         """
+        if metrics:
+            metrics.attempts += 1
+        started = time.monotonic()
+        content, usage = self._hedged(
+            'completion',
+            lambda attempt: self._complete(prompt, temperature, max_tokens, attempt, **kwargs),
+            metrics=metrics
+        )
+        self.timings.record('completion', time.monotonic() - started)
+        if metrics:
+            metrics.set_usage(usage)
+        return content
+
+    def _complete(self, prompt: str, temperature: float, max_tokens: int, attempt=None, **kwargs):
+        """Send one completion request; returns the completion text and its token usage"""
+        ticket = self._acquire(prompt, max_tokens, attempt)
+        headers, used_tokens, rate_limited = None, None, False
+        started = time.monotonic()
         try:
-            response = self.client.chat.completions.create(
+            # The raw response exposes the x-ratelimit-* headers the rate limiter learns from
+            raw_response = self.client.chat.completions.with_raw_response.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=temperature,
                 max_tokens=max_tokens,
                 **kwargs
             )
-            return response.choices[0].message.content
+            headers = raw_response.headers
+            response = raw_response.parse()
+            used_tokens = response.usage.total_tokens if response.usage else None
+            self._latencies['completion'].record(time.monotonic() - started)
+            return response.choices[0].message.content, response.usage
+        except groq.APIStatusError as e:
+            headers = e.response.headers
+            rate_limited = e.status_code == 429
+            logger.error(f"Error making request to Groq: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Error making request to Groq: {str(e)}")
             raise
+        finally:
+            if ticket:
+                self.rate_limiter.release(ticket, used_tokens, headers, rate_limited)
 
-    def generate_structured_completion(
-        self, 
-        prompt: str, 
-        expected_format: Dict,
-        temperature: float = 0.1,
-        max_tokens: int = 1000
-    ) -> Dict:
+    @retry(**RETRY_POLICY)
+    def _open_stream(self, prompt: str, temperature: float, max_tokens: int, metrics: CallMetrics = None, **kwargs):
+        """Start a streamed completion; returns the chunk stream, its chunks, rate limit ticket and response headers"""
+        if metrics:
+            metrics.attempts += 1
+        return self._hedged(
+            'first_chunk',
+            lambda attempt: self._start_stream(prompt, temperature, max_tokens, attempt, **kwargs),
+            discard=self._discard_stream,
+            metrics=metrics
+        )
+
+    def _start_stream(self, prompt: str, temperature: float, max_tokens: int, attempt=None, **kwargs):
+        """Send one streamed completion request and wait for its first chunk"""
+        ticket = self._acquire(prompt, max_tokens, attempt)
+        stream = None
+        started = time.monotonic()
+        try:
+            raw_response = self.client.chat.completions.with_raw_response.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                **kwargs
+            )
+            stream = raw_response.parse()
+            chunks = iter(stream)
+            first = next(chunks, None)
+            self._latencies['first_chunk'].record(time.monotonic() - started)
+            if first is not None:
+                chunks = chain([first], chunks)
+            return stream, chunks, ticket, raw_response.headers
+        except groq.APIStatusError as e:
+            logger.error(f"Error making request to Groq: {str(e)}")
+            if ticket:
+                self.rate_limiter.release(ticket, None, e.response.headers, e.status_code == 429)
+            raise
+        except Exception as e:
+            logger.error(f"Error making request to Groq: {str(e)}")
+            if stream is not None:
+                stream.close()
+            if ticket:
+                self.rate_limiter.release(ticket)
+            raise
+
+    def _discard_stream(self, opened):
+        """Close a stream that lost its hedge race"""
+        stream, _, ticket, headers = opened
+        stream.close()
+        if ticket:
+            self.rate_limiter.release(ticket, None, headers)
+
+    def stream_completion(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 1000,
+        metrics: CallMetrics = None,
+        **kwargs
+    ) -> Iterator[str]:
         """
-        Generate a structured JSON response from the LLM
+        Generate a completion from the LLM, yielding the text as it is produced
+
+        Only opening the stream is retried; an error part way through is raised
+        to the caller after the text received so far has been yielded.
         """
-        formatted_prompt = f"""
+        started = time.monotonic()
+        stream, chunks, ticket, headers = self._open_stream(prompt, temperature, max_tokens, metrics, **kwargs)
+        used_tokens = None
+        try:
+            for chunk in chunks:
+                # Groq reports usage on the last chunk under x_groq
+                usage = chunk.usage or (chunk.x_groq.usage if chunk.x_groq else None)
+                if usage:
+                    used_tokens = usage.total_tokens
+                    if metrics:
+                        metrics.set_usage(usage)
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.delta.content:
+                    if metrics:
+                        metrics.mark_first_chunk()
+                    yield choice.delta.content
+                if choice.finish_reason == 'length':
+                    logger.warning(f"Completion cut off at max_tokens={max_tokens}")
+        finally:
+            stream.close()
+            if ticket:
+                self.rate_limiter.release(ticket, used_tokens, headers)
+            self.timings.record('stream', time.monotonic() - started)
+
+    @staticmethod
+    def format_structured_prompt(prompt: str, expected_format: Dict) -> str:
+        """Wrap a prompt with the instructions that make the LLM answer in `expected_format`"""
+        return f"""
         {prompt}
         
         You must respond with valid JSON in exactly this format. Do not include any additional text or explanation:
@@ -66,19 +382,83 @@ class GroqClient:
         
         Ensure your response is valid JSON and matches the exact format above.
         """
+
+    def generate_structured_completion(
+        self, 
+        prompt: str, 
+        expected_format: Dict,
+        temperature: float = 0.1,
+        max_tokens: int = 1000,
+        metrics: CallMetrics = None
+    ) -> Dict:
+        """
+        Generate a structured JSON response from the LLM
+        """
+        formatted_prompt = self.format_structured_prompt(prompt, expected_format)
+        outcome = LLMCall.OUTCOME_OK
         
         try:
             result = self.generate_completion(
                 prompt=formatted_prompt,
                 temperature=temperature,
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                metrics=metrics
             )
             return json.loads(result)
         except json.JSONDecodeError as e:
             logger.debug(f"Raw response: {result}")
-            logger.error(f"Error parsing JSON response: {str(e)}")
-            return None
-                
+            salvaged = salvage_json(result)
+            if salvaged is None:
+                outcome = LLMCall.OUTCOME_PARSE_FAILED
+                logger.error(f"Error parsing JSON response: {str(e)}")
+                return None
+            outcome = LLMCall.OUTCOME_SALVAGED
+            logger.warning(f"Recovered JSON from malformed response: {str(e)}")
+            return salvaged
+
         except Exception as e:
+            outcome = LLMCall.OUTCOME_ERROR
             logger.error(f"Error generating response: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+        finally:
+            if metrics:
+                metrics.outcome = outcome
+
+    def generate_structured_items(
+        self,
+        prompt: str,
+        expected_format: List,
+        temperature: float = 0.1,
+        max_tokens: int = 1000,
+        metrics: CallMetrics = None
+    ) -> Iterator[Any]:
+        """
+        Stream a JSON array response from the LLM, yielding each element as soon as it is complete
+
+        A response that is cut off or breaks off with an error still yields
+        the elements completed before that point.
+        """
+        parser = JsonArrayStream()
+        outcome = LLMCall.OUTCOME_OK
+        try:
+            for text in self.stream_completion(
+                prompt=self.format_structured_prompt(prompt, expected_format),
+                temperature=temperature,
+                max_tokens=max_tokens,
+                metrics=metrics
+            ):
+                yield from parser.feed(text)
+        except Exception as e:
+            outcome = LLMCall.OUTCOME_ERROR
+            logger.error(f"Error streaming response after {parser.items} items: {str(e)}")
+        if not parser.complete:
+            if outcome == LLMCall.OUTCOME_OK:
+                outcome = LLMCall.OUTCOME_TRUNCATED if parser.items else LLMCall.OUTCOME_PARSE_FAILED
+            logger.warning(f"Streamed response ended before its JSON array closed; kept {parser.items} complete items")
+        elif parser.salvaged and outcome == LLMCall.OUTCOME_OK:
+            # Counted the way generate_structured_completion counts what json.loads alone would reject
+            outcome = LLMCall.OUTCOME_SALVAGED
+        if metrics:
+            metrics.outcome = outcome
+            metrics.items = parser.items
+            metrics.malformed_items = parser.skipped
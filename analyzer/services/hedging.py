@@ -0,0 +1,137 @@
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Any, Callable, Optional, Tuple
+
+from .timings import percentile
+
+
+class Superseded(Exception):
+    """
+    Raised by a backup attempt that gave up before sending
+
+    Either the race was already decided, or there was no rate limit capacity
+    to spare for a second copy.
+    """
+
+
+class Attempt:
+    """
+    One of the requests racing in a hedge
+
+    The call sets `sent` once its request has gone out, so the deadline does
+    not count time spent waiting for the rate limiter, and checks `settled`
+    just before sending, so a backup that only got its turn after the primary
+    answered is never sent. `backup` tells the call it is the second copy.
+    `ticket` is the call's rate limiter ticket, which the losing attempt hands
+    back as soon as the race is decided.
+    """
+
+    def __init__(self, settled: threading.Event, backup: bool = False):
+        self.sent = threading.Event()
+        self.settled = settled
+        self.backup = backup
+        self.ticket = None
+
+
+class LatencyTracker:
+    """Recent latencies of one kind of request, from which the hedging deadline is taken"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def deadline(self, fraction: float, max_multiple: float = None) -> Optional[float]:
+        """
+        The `fraction` percentile of recent latencies, or None until there are min_samples of them
+
+        With `max_multiple`, the deadline is at most that many times the median.
+        Stalled requests are exactly what hedging is for, but they also push
+        up the high percentiles until the deadline is as slow as the stalls.
+        The median hardly moves, so the cap keeps the deadline near healthy
+        latencies.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        deadline = percentile(samples, fraction)
+        if max_multiple:
+            deadline = min(deadline, percentile(samples, 0.5) * max_multiple)
+        return deadline
+
+
+def run_hedged(
+    call: Callable[[Attempt], Any],
+    deadline: float,
+    executor: Executor,
+    discard: Callable[[Any], None] = None,
+    abandon: Callable[[Attempt], None] = None
+) -> Tuple[Any, Optional[str]]:
+    """
+    Run call(attempt), racing a second call against it if it has not returned `deadline` seconds after sending
+
+    Args:
+        call: Sends one request and returns its result; see Attempt
+        deadline: Seconds to wait for the first request before sending the backup
+        executor: Runs both attempts, so the caller can stop waiting for either
+        discard: Given the result of the attempt that lost, whenever it arrives
+        abandon: Called with the losing Attempt as soon as the race is decided
+
+    Returns the first successful result and which attempt it came from:
+    None when no backup was sent, otherwise 'primary' or 'backup'. When both
+    attempts fail the first error is raised. A backup that raises Superseded
+    was never sent and the primary is simply waited for.
+    """
+    settled = threading.Event()
+
+    def attempt_call(attempt: Attempt):
+        try:
+            return call(attempt)
+        finally:
+            attempt.sent.set()
+
+    primary_attempt = Attempt(settled)
+    primary = executor.submit(attempt_call, primary_attempt)
+    primary_attempt.sent.wait()
+    if primary.done() or wait([primary], timeout=deadline).done:
+        settled.set()
+        return primary.result(), None
+
+    backup_attempt = Attempt(settled, backup=True)
+    backup = executor.submit(attempt_call, backup_attempt)
+    attempts = {primary: primary_attempt, backup: backup_attempt}
+    racing = {primary: 'primary', backup: 'backup'}
+    winner, result, error, backup_sent = None, None, None, True
+    while racing and winner is None:
+        done, _ = wait(racing, return_when=FIRST_COMPLETED)
+        for future in sorted(done, key=lambda f: racing[f] != 'primary'):
+            name = racing.pop(future)
+            if isinstance(future.exception(), Superseded):
+                backup_sent = False
+            elif future.exception() is not None:
+                error = error or future.exception()
+            elif winner is None:
+                winner, result = name, future.result()
+            elif discard:
+                discard(future.result())
+    settled.set()
+    if winner is None:
+        raise error
+    if not backup_sent:
+        return result, None
+
+    def discard_loser(future):
+        if future.exception() is None and discard:
+            discard(future.result())
+
+    for future in racing:
+        if abandon:
+            abandon(attempts[future])
+        future.add_done_callback(discard_loser)
+    return result, winner
@@ -0,0 +1,189 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from django.conf import settings
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# Query parameters Amazon adds for tracking; they change per search but not the page served
+TRACKING_PARAMS = {'ref', 'dib', 'dib_tag', 'qid', 'sr', 'keywords', 'sprefix', 'crid', 'th', 'psc'}
+
+
+class CachedPage:
+    def __init__(self, key: str, body: bytes, headers: Dict, stored_at: float, ttl: float, fetch_seconds: float):
+        self.key = key
+        self.body = body
+        self.headers = headers
+        self.stored_at = stored_at
+        self.ttl = ttl
+        self.fetch_seconds = fetch_seconds
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.stored_at < self.ttl
+
+    @property
+    def validators(self) -> Dict:
+        """Headers for a conditional request that lets the server answer 304 Not Modified"""
+        validators = {}
+        if self.headers.get('ETag'):
+            validators['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = self.headers['Last-Modified']
+        return validators
+
+    def to_response(self, url: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = 'utf-8'
+        response._content = self.body
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """
+    On-disk cache of scraped pages, stored zlib-compressed in a SQLite file.
+
+    Entries are served without touching the network while younger than `ttl`.
+    Older entries are revalidated with If-None-Match/If-Modified-Since when
+    the origin sent validators. Once the compressed size passes `max_bytes`,
+    the least recently used entries are evicted. SQLite in WAL mode lets the
+    web and worker processes share one file.
+    """
+
+    def __init__(self, path: str, ttl: float, max_bytes: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'revalidated': 0,
+            'stored': 0,
+            'evicted': 0,
+            'bytes_saved': 0,
+            'seconds_saved': 0.0,
+        }
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS pages ('
+                'key TEXT PRIMARY KEY, url TEXT, body BLOB, headers TEXT, '
+                'size INTEGER, fetch_seconds REAL, stored_at REAL, accessed_at REAL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)')
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def key_for(url: str, params: Dict = None, asin: str = None, partial: bool = False) -> str:
+        """
+        Product pages are keyed by host and ASIN, anything else by its normalized URL
+
+        A `partial` page is the prefix a streamed read stopped at. It has a key
+        of its own, which readers that need the full page never look up.
+        """
+        parts = urlsplit(url)
+        host = parts.netloc.lower()
+        if asin:
+            return f'{host}/dp/{asin}' + ('#partial' if partial else '')
+        query = [(k, v) for k, v in parse_qsl(parts.query) if k not in TRACKING_PARAMS]
+        query += [(k, str(v)) for k, v in (params or {}).items() if k not in TRACKING_PARAMS]
+        return urlunsplit((parts.scheme.lower(), host, parts.path.rstrip('/'), urlencode(sorted(query)), ''))
+
+    def _count(self, counter: str, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def get(self, key: str) -> Optional[CachedPage]:
+        row = self._db.execute(
+            'SELECT body, headers, stored_at, fetch_seconds FROM pages WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute('UPDATE pages SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return CachedPage(key, zlib.decompress(row[0]), json.loads(row[1]), row[2], self.ttl, row[3] or 0.0)
+
+    def record_hit(self, page: CachedPage):
+        """Count a page served from the cache, including the fetch time it saved"""
+        self._count('hits')
+        self._count('bytes_saved', len(page.body))
+        self._count('seconds_saved', page.fetch_seconds)
+
+    def record_miss(self):
+        self._count('misses')
+
+    def revalidated(self, page: CachedPage):
+        """The origin answered 304, so the stored body is good for another ttl"""
+        self._count('revalidated')
+        self._count('bytes_saved', len(page.body))
+        self._db.execute('UPDATE pages SET stored_at = ? WHERE key = ?', (time.time(), page.key))
+
+    def put(self, key: str, url: str, body: bytes, headers: Dict, fetch_seconds: float = 0.0):
+        compressed = zlib.compress(body, 6)
+        kept_headers = {
+            name: headers[name] for name in ('Content-Type', 'ETag', 'Last-Modified')
+            if headers.get(name)
+        }
+        now = time.time()
+        self._db.execute(
+            'INSERT OR REPLACE INTO pages (key, url, body, headers, size, fetch_seconds, stored_at, accessed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, url, compressed, json.dumps(kept_headers), len(compressed), fetch_seconds, now, now)
+        )
+        self._count('stored')
+        self._evict()
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM pages').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% so eviction does not run again on the very next insert
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        evicted = []
+        for key, size in self._db.execute('SELECT key, size FROM pages ORDER BY accessed_at'):
+            evicted.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self._db.executemany('DELETE FROM pages WHERE key = ?', evicted)
+        self._count('evicted', len(evicted))
+        logger.info(f"Evicted {len(evicted)} cached pages ({freed / 1024:.0f} KB)")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['seconds_saved'] = round(stats['seconds_saved'], 2)
+        return stats
+
+
+def build_response_cache() -> Optional[ResponseCache]:
+    """Return a page cache backed by the shared cache file, or None when caching is disabled"""
+    if not settings.SCRAPE_CACHE_ENABLED:
+        return None
+    return ResponseCache(
+        settings.SCRAPE_CACHE_PATH,
+        ttl=settings.SCRAPE_CACHE_TTL,
+        max_bytes=settings.SCRAPE_CACHE_MAX_MB * 1024 * 1024
+    )
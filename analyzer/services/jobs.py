@@ -0,0 +1,180 @@
+import logging
+import threading
+from datetime import timedelta
+from typing import Dict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import Job
+from .frontier import scrape_search_term_distributed
+from .llm_service import LLMService
+from .scraping import scrape_search_term
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(kind: str, params: Dict) -> Job:
+    job = Job.objects.create(kind=kind, params=params)
+    logger.info(f"Queued {kind} job {job.uuid} with {params}")
+    return job
+
+
+def requeue_stale_jobs() -> int:
+    """Put running jobs whose worker stopped sending heartbeats back on the queue"""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    requeued = Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        heartbeat_at__lt=cutoff,
+        attempts__lt=settings.JOB_MAX_ATTEMPTS
+    ).update(status=Job.STATUS_QUEUED, worker=None)
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale jobs")
+    Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        heartbeat_at__lt=cutoff,
+        attempts__gte=settings.JOB_MAX_ATTEMPTS
+    ).update(status=Job.STATUS_FAILED, error='Worker stopped responding', finished_at=timezone.now())
+    return requeued
+
+
+def claim_next_job(worker: str) -> Job:
+    """
+    Claim the oldest queued job.
+
+    SELECT ... FOR UPDATE SKIP LOCKED lets any number of workers poll the same
+    table: a row locked by one worker is skipped by the others instead of
+    making them wait, and the claim commits immediately.
+    """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.STATUS_QUEUED)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        job.status = Job.STATUS_RUNNING
+        job.worker = worker
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.progress = {}
+        job.save(update_fields=['status', 'worker', 'attempts', 'started_at', 'heartbeat_at', 'progress', 'updated_at'])
+        return job
+
+
+def current_attempt(job: Job):
+    """
+    The job's row, as long as it is still the attempt `job` was claimed for
+
+    Once a stale job is requeued and claimed again, the worker still running
+    the old attempt must not overwrite what the new one writes.
+    """
+    return Job.objects.filter(pk=job.pk, worker=job.worker, attempts=job.attempts)
+
+
+class JobProgress:
+    """
+    Publishes a running job's progress and heartbeat.
+
+    Handlers call the instance with their counters; a background thread writes
+    the latest values every JOB_HEARTBEAT_SECONDS over its own database
+    connection, so progress stays visible even while the handler holds a
+    transaction open and quiet phases still count as alive. It stops once
+    the job has been handed to another attempt.
+    """
+
+    def __init__(self, job: Job):
+        self.job = job
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._publish, daemon=True)
+
+    def __call__(self, processed: int, total: int = None, **extra):
+        self.job.progress = {'processed': processed, 'total': total, **extra}
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _publish(self):
+        try:
+            while not self._stop.wait(settings.JOB_HEARTBEAT_SECONDS):
+                updated = current_attempt(self.job).update(
+                    progress=self.job.progress,
+                    heartbeat_at=timezone.now()
+                )
+                if not updated:
+                    logger.warning(f"Job {self.job.uuid} was taken over by another attempt, stopping its heartbeat")
+                    return
+        finally:
+            connection.close()
+
+
+def _run_scrape(job: Job, progress: JobProgress) -> Dict:
+    if job.params.get('distributed', settings.SCRAPE_DISTRIBUTED):
+        return scrape_search_term_distributed(
+            job,
+            search_term=job.params.get('search_term', 'laptops'),
+            max_pages=job.params.get('max_pages', 1),
+            incremental=job.params.get('incremental', True),
+            progress=progress
+        )
+    return scrape_search_term(
+        search_term=job.params.get('search_term', 'laptops'),
+        max_pages=job.params.get('max_pages', 1),
+        incremental=job.params.get('incremental', True),
+        progress=lambda saved, pages, **limits: progress(saved, pages_fetched=pages, **limits)
+    )
+
+
+def _run_process(job: Job, progress: JobProgress) -> Dict:
+    search_key = job.params.get('search_key', 'laptops')
+    service = LLMService(job=job)
+    # Leases are held in the job's name, so a requeued attempt takes over the products it had claimed
+    trends = service.process_search_key(search_key, owner=str(job.uuid), progress=progress)
+    return {
+        'trends': trends,
+        'summaries': service.summary_stats(),
+        'summary_cache': service.summary_cache.stats(),
+        'llm_calls': service.metrics.summary(),
+    }
+
+
+HANDLERS = {
+    Job.KIND_SCRAPE: _run_scrape,
+    Job.KIND_PROCESS: _run_process,
+}
+
+
+def run_job(job: Job):
+    """Run a claimed job and record its outcome"""
+    logger.info(f"Running {job.kind} job {job.uuid} (attempt {job.attempts})")
+    try:
+        with JobProgress(job) as progress:
+            job.result = HANDLERS[job.kind](job, progress)
+        job.status = Job.STATUS_SUCCEEDED
+    except Exception as e:
+        logger.error(f"Job {job.uuid} failed: {str(e)}")
+        job.status = Job.STATUS_FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    updated = current_attempt(job).update(
+        status=job.status,
+        result=job.result,
+        error=job.error,
+        progress=job.progress,
+        finished_at=job.finished_at,
+        updated_at=job.finished_at
+    )
+    if not updated:
+        logger.warning(f"Job {job.uuid} was taken over by another attempt, discarding attempt {job.attempts}")
+        return
+    logger.info(f"Finished {job.kind} job {job.uuid}: {job.status}")
@@ -0,0 +1,215 @@
+import json
+import logging
+import re
+from typing import Any, List
+
+logger = logging.getLogger(__name__)
+
+TRAILING_COMMA = re.compile(r',(\s*[\]}])')
+
+
+def loads_lenient(text: str) -> Any:
+    """json.loads that also accepts the trailing commas LLMs like to leave before ] and }"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        repaired = TRAILING_COMMA.sub(r'\1', text)
+        if repaired == text:
+            raise
+        return json.loads(repaired)
+
+
+def salvage_json(text: str) -> Any:
+    """
+    Recover a JSON value from near-JSON LLM output, or None if nothing usable is left
+
+    Handles a preamble or code fence before the value, text after it,
+    trailing commas, and an array cut off part way: of a truncated array the
+    elements completed before the cut are returned.
+    """
+    if not text:
+        return None
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    try:
+        return json.JSONDecoder().raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        pass
+    end = max(text.rfind('}'), text.rfind(']')) + 1
+    try:
+        return loads_lenient(text[start:end])
+    except json.JSONDecodeError:
+        pass
+    if text[start] != '[':
+        return None
+    items = JsonArrayStream().feed(text[start:])
+    return items or None
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for the items of a JSON array arriving in pieces.
+
+    feed() takes the next piece of text and returns every element of the
+    first top-level array that has been completed by it, so a caller can act
+    on each item while the rest of the response is still being generated.
+    Text before the array (a ```json fence, a preamble) is skipped, and when
+    the model wraps the array in an object the first array inside it is used.
+    Only an array of objects (or an empty one) is taken, so a bracket in a
+    preamble such as "see [below]" is skipped too.
+    Only the element being built is kept in memory. Trailing commas inside an
+    element are tolerated; elements that are still not valid JSON are dropped
+    and counted in `skipped`.
+
+    Whatever json.loads would have rejected in the whole response is noted:
+    `repaired` counts elements that parsed only once trailing commas were
+    dropped, plus a trailing comma after the last element, and `extra_text`
+    is set when there is text around the JSON value, such as a fence or
+    prose. `salvaged` is true when any of that, or a skipped element, was
+    needed to get the items out.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0          # nesting level of the scanner
+        self._array_depth = None  # level of the array whose elements are returned
+        self._item_start = None
+        self._in_string = False
+        self._escaped = False
+        self._after_comma = False
+        self.items = 0
+        self.skipped = 0
+        self.repaired = 0
+        self.extra_text = False
+        self.complete = False
+
+    @property
+    def salvaged(self) -> bool:
+        return bool(self.skipped or self.repaired or self.extra_text)
+
+    def feed(self, text: str) -> List[Any]:
+        if self.complete:
+            self._scan_tail(text)
+            return []
+        self._buffer += text
+        found = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._array_depth is None and self._depth == 0 and char not in '[{' and not char.isspace():
+                # Before the JSON value starts, e.g. a ```json fence or a preamble
+                self.extra_text = True
+            elif char == '"':
+                self._in_string = True
+                if self._depth == self._array_depth and self._item_start is None:
+                    self._item_start = i
+            elif char in '[{':
+                if self._array_depth is None and char == '[':
+                    opens = self._opens_array(buffer, i)
+                    if opens is None:
+                        break  # Wait for the text that decides it
+                    if opens:
+                        self._array_depth = self._depth + 1
+                    elif self._depth == 0:
+                        self.extra_text = True
+                        i += 1
+                        continue
+                elif self._depth == self._array_depth and self._item_start is None:
+                    self._item_start = i
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if self._depth == self._array_depth and self._item_start is not None:
+                    self._emit(buffer[self._item_start:i + 1], found)
+                elif self._array_depth is not None and self._depth < self._array_depth:
+                    # The array itself closed; anything after it is not ours
+                    if self._item_start is None and self._after_comma:
+                        self.repaired += 1
+                    self._emit_scalar(buffer[self._item_start:i] if self._item_start is not None else '', found)
+                    self.complete = True
+                    self._scan_tail(buffer[i + 1:])
+                    break
+            elif char == ',' and self._depth == self._array_depth:
+                self._emit_scalar(buffer[self._item_start:i] if self._item_start is not None else '', found)
+                self._after_comma = True
+                i += 1
+                continue
+            elif self._depth == self._array_depth and self._item_start is None and not char.isspace():
+                self._item_start = i
+            if self._depth >= (self._array_depth or 0) and not char.isspace():
+                self._after_comma = False
+            i += 1
+
+        # Drop what has been consumed so a long response is not rescanned or held in full
+        keep = self._item_start if self._item_start is not None else i
+        self._buffer = buffer[keep:]
+        self._pos = i - keep
+        if self._item_start is not None:
+            self._item_start = 0
+        return found
+
+    @staticmethod
+    def _opens_array(buffer: str, i: int):
+        """Whether the '[' at `i` starts an array of objects, or None until its next non-space character arrives"""
+        for char in buffer[i + 1:]:
+            if not char.isspace():
+                return char in '{]'
+        return None
+
+    def _scan_tail(self, text: str):
+        """Look through the text after the array for anything outside the JSON value it belongs to"""
+        for char in text:
+            if self.extra_text:
+                return
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth <= 0 and not char.isspace():
+                self.extra_text = True
+            elif char == '"':
+                self._in_string = True
+            elif char in '[{':
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+
+    def _emit(self, text: str, found: List):
+        self._item_start = None
+        try:
+            found.append(json.loads(text))
+            self.items += 1
+            return
+        except json.JSONDecodeError:
+            pass
+        try:
+            found.append(loads_lenient(text))
+            self.items += 1
+            self.repaired += 1
+        except json.JSONDecodeError:
+            self.skipped += 1
+            logger.warning(f"Skipping malformed item in streamed JSON array: {text[:200]}")
+
+    def _emit_scalar(self, text: str, found: List):
+        """Elements that are not objects or arrays (numbers, strings, literals) end at a comma or ']'"""
+        if self._item_start is None:
+            return
+        text = text.strip()
+        if not text:
+            self._item_start = None
+            return
+        self._emit(text, found)
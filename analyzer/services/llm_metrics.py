@@ -0,0 +1,273 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Dict, Iterator, List, Sequence
+
+from django.conf import settings
+from django.db.models import Avg, Count, Max, Min, Q, QuerySet, Sum
+from django.utils import timezone
+
+from ..models import Job, LLMCall
+from .timings import percentile
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; every histogram also has a last, unbounded bucket
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+TOKEN_BUCKETS = (125, 250, 500, 1000, 2000, 4000, 8000)
+COST_BUCKETS_USD = (0.00001, 0.00002, 0.00005, 0.0001, 0.0002, 0.0005, 0.001)
+HISTOGRAMS = {
+    'latency_ms': LATENCY_BUCKETS_MS,
+    'first_chunk_ms': LATENCY_BUCKETS_MS,
+    'prompt_tokens': TOKEN_BUCKETS,
+    'completion_tokens': TOKEN_BUCKETS,
+    'cost_usd': COST_BUCKETS_USD,
+}
+
+
+def token_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """US dollars for a call at the configured per-million-token prices"""
+    if prompt_tokens is None and completion_tokens is None:
+        return None
+    return (
+        (prompt_tokens or 0) * settings.LLM_PROMPT_COST_PER_MILLION
+        + (completion_tokens or 0) * settings.LLM_COMPLETION_COST_PER_MILLION
+    ) / 1_000_000
+
+
+class CallMetrics:
+    """
+    Measurements of one LLM call, filled in by GroqClient as the call runs
+
+    The caller labels it with a call type and search key and sets the
+    outcome; see LLMMetrics.call().
+    """
+
+    def __init__(self, call_type: str, search_key: str = None):
+        self.call_type = call_type
+        self.search_key = search_key
+        self.started = time.monotonic()
+        self.latency = None
+        self.first_chunk = None
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.attempts = 0
+        self.hedged = False
+        self.outcome = LLMCall.OUTCOME_OK
+        self.items = None
+        self.malformed_items = 0
+
+    def set_usage(self, usage):
+        if usage:
+            self.prompt_tokens = usage.prompt_tokens
+            self.completion_tokens = usage.completion_tokens
+
+    def mark_first_chunk(self):
+        if self.first_chunk is None:
+            self.first_chunk = time.monotonic() - self.started
+
+    @property
+    def cost(self) -> float:
+        return token_cost(self.prompt_tokens, self.completion_tokens)
+
+
+class LLMMetrics:
+    """
+    Records the LLM calls of one LLMService as LLMCall rows
+
+    Calls are recorded from any thread; flush() writes them out and must be
+    called from the thread that owns the database work. summary() describes
+    every call recorded so far, for a job's result.
+    """
+
+    def __init__(self, model: str, job: Job = None):
+        self.model = model
+        self.job = job
+        self._calls: List[CallMetrics] = []
+        self._pending: List[CallMetrics] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def call(self, call_type: str, search_key: str = None) -> Iterator[CallMetrics]:
+        """Measure one call; an exception escaping the block marks it as an error"""
+        metrics = CallMetrics(call_type, search_key)
+        try:
+            yield metrics
+        except Exception:
+            metrics.outcome = LLMCall.OUTCOME_ERROR
+            raise
+        finally:
+            metrics.latency = time.monotonic() - metrics.started
+            with self._lock:
+                self._calls.append(metrics)
+                self._pending.append(metrics)
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        LLMCall.objects.bulk_create([
+            LLMCall(
+                call_type=call.call_type,
+                search_key=call.search_key,
+                job=self.job,
+                model=self.model,
+                outcome=call.outcome,
+                latency_ms=round(call.latency * 1000, 1),
+                first_chunk_ms=round(call.first_chunk * 1000, 1) if call.first_chunk is not None else None,
+                prompt_tokens=call.prompt_tokens,
+                completion_tokens=call.completion_tokens,
+                cost_usd=call.cost,
+                attempts=max(call.attempts, 1),
+                hedged=call.hedged,
+                items=call.items,
+                malformed_items=call.malformed_items
+            )
+            for call in pending
+        ])
+        return len(pending)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Totals and latency percentiles of the calls recorded so far, by call type"""
+        with self._lock:
+            calls = list(self._calls)
+        by_type = {}
+        for call in calls:
+            by_type.setdefault(call.call_type, []).append(call)
+
+        summary = {}
+        for call_type, group in by_type.items():
+            latencies = sorted(call.latency for call in group)
+            prompt_tokens = sum(call.prompt_tokens or 0 for call in group)
+            completion_tokens = sum(call.completion_tokens or 0 for call in group)
+            outcomes = {}
+            for call in group:
+                outcomes[call.outcome] = outcomes.get(call.outcome, 0) + 1
+            summary[call_type] = {
+                'calls': len(group),
+                'outcomes': outcomes,
+                'json_failure_rate': round(sum(outcomes.get(o, 0) for o in LLMCall.JSON_FAILURES) / len(group), 3),
+                'retries': sum(max(call.attempts - 1, 0) for call in group),
+                'hedged': sum(call.hedged for call in group),
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'prompt_tokens_per_call': round(prompt_tokens / len(group)),
+                'cost_usd': round(token_cost(prompt_tokens, completion_tokens), 6),
+                'latency_p50_ms': round(percentile(latencies, 0.50) * 1000),
+                'latency_p90_ms': round(percentile(latencies, 0.90) * 1000),
+                'latency_p99_ms': round(percentile(latencies, 0.99) * 1000),
+            }
+        return summary
+
+
+def evict_calls() -> int:
+    """Delete call records older than LLM_METRICS_RETENTION_DAYS"""
+    cutoff = timezone.now() - timedelta(days=settings.LLM_METRICS_RETENTION_DAYS)
+    deleted, _ = LLMCall.objects.filter(created_at__lt=cutoff).delete()
+    if deleted:
+        logger.info(f"Deleted {deleted} LLM call records")
+    return deleted
+
+
+def _histogram_annotations(field: str, buckets: Sequence[float]) -> Dict:
+    annotations = {}
+    lower = None
+    for i, upper in enumerate(list(buckets) + [None]):
+        bucket = Q(**{f'{field}__isnull': False})
+        if lower is not None:
+            bucket &= Q(**{f'{field}__gt': lower})
+        if upper is not None:
+            bucket &= Q(**{f'{field}__lte': upper})
+        annotations[f'{field}_bucket_{i}'] = Count('pk', filter=bucket)
+        lower = upper
+    return annotations
+
+
+def _quantile(histogram: List[Dict], fraction: float, low: float, high: float) -> float:
+    """
+    Estimate a quantile from bucket counts, interpolating linearly inside the bucket it falls in
+
+    `low` and `high` are the smallest and largest values seen; they bound
+    the first and last buckets and the estimate.
+    """
+    total = sum(bucket['count'] for bucket in histogram)
+    if not total:
+        return None
+    rank = fraction * total
+    seen, lower = 0, low
+    for bucket in histogram:
+        upper = high if bucket['le'] is None else min(bucket['le'], high)
+        if bucket['count'] and seen + bucket['count'] >= rank:
+            lower = max(lower, low)
+            return round(lower + (upper - lower) * (rank - seen) / bucket['count'], 1)
+        seen += bucket['count']
+        if bucket['le'] is not None:
+            lower = bucket['le']
+    return round(high, 1)
+
+
+def aggregate_calls(calls: QuerySet) -> List[Dict]:
+    """
+    Metrics of the calls in `calls` by call type and search key, computed in the database
+
+    Each group has call, retry, hedge and outcome counts, the JSON failure
+    rate, token and cost totals, and histograms of latency, time to first
+    chunk, prompt and completion tokens and cost, with p50/p90/p99 latency
+    estimated from its histogram.
+    """
+    annotations = {
+        'calls': Count('pk'),
+        'attempts': Sum('attempts'),
+        'hedged_calls': Count('pk', filter=Q(hedged=True)),
+        'prompt_tokens_total': Sum('prompt_tokens'),
+        'completion_tokens_total': Sum('completion_tokens'),
+        'cost_usd_total': Sum('cost_usd'),
+        'latency_ms_mean': Avg('latency_ms'),
+        'latency_ms_min': Min('latency_ms'),
+        'latency_ms_max': Max('latency_ms'),
+        'malformed_items_total': Sum('malformed_items'),
+    }
+    outcomes = (LLMCall.OUTCOME_OK, LLMCall.OUTCOME_ERROR) + LLMCall.JSON_FAILURES
+    for outcome in outcomes:
+        annotations[f'outcome_{outcome}'] = Count('pk', filter=Q(outcome=outcome))
+    for field, buckets in HISTOGRAMS.items():
+        annotations.update(_histogram_annotations(field, buckets))
+
+    groups = calls.values('call_type', 'search_key').annotate(**annotations).order_by('call_type', 'search_key')
+    results = []
+    for row in groups:
+        histograms = {
+            field: [
+                {'le': upper, 'count': row[f'{field}_bucket_{i}']}
+                for i, upper in enumerate(list(buckets) + [None])
+            ]
+            for field, buckets in HISTOGRAMS.items()
+        }
+        json_failures = sum(row[f'outcome_{outcome}'] for outcome in LLMCall.JSON_FAILURES)
+        latency = histograms['latency_ms']
+        results.append({
+            'call_type': row['call_type'],
+            'search_key': row['search_key'],
+            'calls': row['calls'],
+            'retries': (row['attempts'] or 0) - row['calls'],
+            'hedged': row['hedged_calls'],
+            'outcomes': {outcome: row[f'outcome_{outcome}'] for outcome in outcomes},
+            'json_failure_rate': round(json_failures / row['calls'], 3),
+            'malformed_items': row['malformed_items_total'] or 0,
+            'prompt_tokens': row['prompt_tokens_total'] or 0,
+            'completion_tokens': row['completion_tokens_total'] or 0,
+            'cost_usd': round(row['cost_usd_total'] or 0, 6),
+            'latency_ms': {
+                'mean': round(row['latency_ms_mean'], 1),
+                'p50': _quantile(latency, 0.50, row['latency_ms_min'], row['latency_ms_max']),
+                'p90': _quantile(latency, 0.90, row['latency_ms_min'], row['latency_ms_max']),
+                'p99': _quantile(latency, 0.99, row['latency_ms_min'], row['latency_ms_max']),
+                'max': row['latency_ms_max'],
+            },
+            'histograms': histograms,
+        })
+    return results
+
@@ -0,0 +1,213 @@
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value: str) -> float:
+    """Seconds in a rate limit reset header such as '7.66s', '2m59.56s' or '120ms'"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt, about four characters per token for English text"""
+    return len(text) // 4 + 1
+
+
+class RateLimitTracker:
+    """
+    Paces LLM requests against the provider's request and token limits.
+
+    Two sources of limits are combined. The configured requests/tokens per
+    minute are enforced over a sliding 60 second window from the start, and
+    once responses arrive the provider's x-ratelimit-remaining-* and
+    x-ratelimit-reset-* headers (and retry-after on a 429) take over as the
+    authoritative view. Tokens of requests still in flight count as spent, so
+    concurrent callers do not all go out on the same remaining budget. Callers
+    block in acquire() until their request fits, with at most `max_in_flight`
+    requests outstanding.
+
+    Hedge copies of slow requests have `hedge_slots` in-flight slots of their
+    own, so they never take one a regular request is waiting for, but they
+    count against the same per-minute budgets. try_acquire_hedge() never
+    waits: a hedge goes out only if the budget has room for it right now
+    and no regular request is queued.
+    """
+
+    WINDOW_SECONDS = 60
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        requests_per_minute: int = None,
+        tokens_per_minute: int = None,
+        hedge_slots: int = 0
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.hedge_slots = hedge_slots
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._cond = threading.Condition()
+        self._window = deque()  # [sent_at, tokens] of requests in the last minute
+        self._in_flight = 0
+        self._hedges_in_flight = 0
+        self._waiting = 0
+        self._reserved_tokens = 0
+        self._remaining_requests = None
+        self._requests_reset_at = 0.0
+        self._remaining_tokens = None
+        self._tokens_reset_at = 0.0
+        self._blocked_until = 0.0
+        self.counters = {
+            'requests': 0,
+            'tokens': 0,
+            'rate_limited': 0,
+            'hedges': 0,
+            'hedges_refused': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+        }
+
+    def acquire(self, tokens: int) -> List:
+        """Block until a request of about `tokens` tokens may be sent; pass the result to release()"""
+        started = time.monotonic()
+        with self._cond:
+            waited = False
+            while True:
+                now = time.monotonic()
+                delay = self._delay(tokens, now)
+                if delay <= 0:
+                    break
+                if not waited:
+                    waited = True
+                    self._waiting += 1
+                self._cond.wait(timeout=delay)
+            ticket = self._reserve(tokens, now, hedge=False)
+            if waited:
+                self._waiting -= 1
+                self.counters['waits'] += 1
+                self.counters['wait_seconds'] += now - started
+        return ticket
+
+    def try_acquire_hedge(self, tokens: int) -> Optional[List]:
+        """A ticket for a hedge copy if one may be sent right now, otherwise None"""
+        with self._cond:
+            now = time.monotonic()
+            if self._hedges_in_flight >= self.hedge_slots or self._waiting or self._budget_delay(tokens, now) > 0:
+                self.counters['hedges_refused'] += 1
+                return None
+            self.counters['hedges'] += 1
+            return self._reserve(tokens, now, hedge=True)
+
+    def _reserve(self, tokens: int, now: float, hedge: bool) -> List:
+        ticket = [now, tokens, False, hedge]  # sent_at, tokens, released, hedge
+        self._window.append(ticket)
+        if hedge:
+            self._hedges_in_flight += 1
+        else:
+            self._in_flight += 1
+        self._reserved_tokens += tokens
+        return ticket
+
+    def release(self, ticket: List, used_tokens: int = None, headers: Dict = None, rate_limited: bool = False):
+        """
+        Account for a finished request and learn the provider's current limits from its headers
+
+        Releasing a ticket again is ignored, so a request can give up its
+        slot before it has actually finished.
+        """
+        with self._cond:
+            if ticket[2]:
+                return
+            ticket[2] = True
+            if ticket[3]:
+                self._hedges_in_flight -= 1
+            else:
+                self._in_flight -= 1
+            self._reserved_tokens -= ticket[1]
+            if used_tokens is not None:
+                ticket[1] = used_tokens
+            self.counters['requests'] += 1
+            self.counters['tokens'] += ticket[1]
+            if headers:
+                self._update(headers, rate_limited)
+            self._cond.notify_all()
+
+    def _delay(self, tokens: int, now: float) -> float:
+        if self._in_flight >= self.max_in_flight:
+            # Woken by release(); the timeout only guards against a lost notification
+            return 1.0
+        return self._budget_delay(tokens, now)
+
+    def _budget_delay(self, tokens: int, now: float) -> float:
+        """Seconds until the per-minute budgets have room for a request of `tokens` tokens"""
+        if now < self._blocked_until:
+            return self._blocked_until - now
+
+        while self._window and now - self._window[0][0] >= self.WINDOW_SECONDS:
+            self._window.popleft()
+        if self._window:
+            window_free_at = self._window[0][0] + self.WINDOW_SECONDS - now
+            if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+                return window_free_at
+            window_tokens = sum(entry[1] for entry in self._window)
+            if self.tokens_per_minute and window_tokens + tokens > self.tokens_per_minute:
+                return window_free_at
+
+        if self._remaining_requests is not None and now < self._requests_reset_at \
+                and self._remaining_requests - self._in_flight - self._hedges_in_flight <= 0:
+            return self._requests_reset_at - now
+        if self._remaining_tokens is not None and now < self._tokens_reset_at \
+                and self._remaining_tokens - self._reserved_tokens < tokens:
+            return self._tokens_reset_at - now
+        return 0.0
+
+    def _update(self, headers: Dict, rate_limited: bool):
+        now = time.monotonic()
+        remaining_requests = headers.get('x-ratelimit-remaining-requests')
+        if remaining_requests is not None and remaining_requests.isdigit():
+            self._remaining_requests = int(remaining_requests)
+            self._requests_reset_at = now + (parse_duration(headers.get('x-ratelimit-reset-requests')) or 0)
+        remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+        if remaining_tokens is not None and remaining_tokens.isdigit():
+            self._remaining_tokens = int(remaining_tokens)
+            self._tokens_reset_at = now + (parse_duration(headers.get('x-ratelimit-reset-tokens')) or 0)
+
+        limit_requests = headers.get('x-ratelimit-limit-requests')
+        limit_tokens = headers.get('x-ratelimit-limit-tokens')
+        if limit_tokens and limit_tokens.isdigit():
+            # Groq reports tokens per minute here, which replaces the configured guess
+            self.tokens_per_minute = int(limit_tokens)
+        if limit_requests and limit_requests.isdigit() and self._remaining_requests is None:
+            self._remaining_requests = int(limit_requests)
+
+        if rate_limited:
+            self.counters['rate_limited'] += 1
+            retry_after = parse_duration(headers.get('retry-after')) or 1.0
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            logger.warning(f"LLM provider rate limit hit, pausing requests for {retry_after:.1f}s")
+
+    def stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self.counters)
+            stats['remaining_requests'] = self._remaining_requests
+            stats['remaining_tokens'] = self._remaining_tokens
+            stats['tokens_per_minute'] = self.tokens_per_minute
+        stats['wait_seconds'] = round(stats['wait_seconds'], 2)
+        return stats
@@ -1,66 +1,246 @@
 import logging
-from typing import List, Dict
-from django.db import transaction
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Tuple
+from django.conf import settings
+from .chunking import pack_payloads, payload_json
 from .groq_client import GroqClient
-from ..models import Product, ProductTrend
+from .llm_metrics import LLMMetrics, evict_calls
+from .llm_rate_limiter import RateLimitTracker, estimate_tokens
+from .near_duplicates import simhash, stored_index
+from .summary_cache import SummaryStore
+from .summary_leases import claim_products, claimable_count, release_products
+from .summary_writer import SummaryWriter
+from .trend_digest import build_trend_digest
+from ..models import Job, Product, ProductTrend, SearchKeyStats
 import json
 
 logger = logging.getLogger(__name__)
 
+# Bump whenever the summary prompt changes so cached summaries from the old prompt are not reused
+SUMMARY_PROMPT_VERSION = '1'
+SUMMARY_FORMAT = [
+    {
+        "uuid": "product-uuid",
+        "summary": "Product summary text"
+    }
+]
+
 class LLMService:
-    def __init__(self):
-        self.client = GroqClient()
+    # Where a near-duplicate's representative comes from, see _group_near_duplicates
+    STORED = 'stored'
+    IN_BATCH = 'batch'
 
-    def _chunk_products(self, products: List[Product], chunk_size: int = 5) -> List[List[Product]]:
-        """Split products into smaller chunks for efficient processing"""
-        if not products:
-            return []
-            
-        # For the last chunk, reduce size if it's too close to the full chunk size
-        if len(products) % chunk_size == 3:  # If last chunk would be size 3
-            chunk_size = 3  # Reduce chunk size to avoid context limit
-            
-        return [products[i:i + chunk_size] for i in range(0, len(products), chunk_size)]
-
-    def _generate_product_summaries(self, products_data: List[Dict]) -> List[Dict]:
-        """Generate summaries for a batch of products"""
-        expected_format = [
-            {
-                "uuid": "product-uuid",
-                "summary": "Product summary text"
-            }
-        ]
-        
+    def __init__(self, base_url: str = None, model: str = None, api_key: str = None, job: Job = None):
+        self.rate_limiter = RateLimitTracker(
+            max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            hedge_slots=settings.LLM_HEDGE_MAX_IN_FLIGHT if settings.LLM_HEDGE_ENABLED else 0
+        )
+        self.client = GroqClient(rate_limiter=self.rate_limiter, base_url=base_url, model=model, api_key=api_key)
+        self.summary_cache = SummaryStore(self.client.model, SUMMARY_PROMPT_VERSION)
+        # Every LLM call is recorded as an LLMCall row, linked to the job running this service if any
+        self.metrics = LLMMetrics(self.client.model, job)
+        self.counters = {
+            'requests': 0,
+            'summaries': 0,
+            'retried_products': 0,
+            'empty_responses': 0,
+            'failed_requests': 0,
+            'near_duplicates': 0,
+        }
+        self._counters_lock = threading.Lock()
+
+    @staticmethod
+    def _product_payload(product: Product) -> Dict:
+        return {
+            'uuid': str(product.uuid),
+            'name': product.name,
+            'description': product.description,
+            'price': float(product.price),
+            'rating': float(product.rating) if product.rating else None
+        }
+
+    @staticmethod
+    def _summary_prompt(products_data: List[Dict]) -> str:
         # Simplified prompt to reduce token count
-        prompt = f"""
+        return f"""
         Generate concise summaries (max 75 words each) for these products, highlighting key features and value:
 
         Products:
-        {json.dumps(products_data, indent=2)}
+        {payload_json(products_data)}
         """
-        
-        try:
-            return self.client.generate_structured_completion(
-                prompt=prompt,
-                expected_format=expected_format,
+
+    def _chunk_products(self, products_data: List[Dict]) -> List[List[Dict]]:
+        """Pack product payloads into requests that fill the input and output token budgets"""
+        overhead = estimate_tokens(self.client.format_structured_prompt(self._summary_prompt([]), SUMMARY_FORMAT))
+        return pack_payloads(
+            products_data,
+            input_budget=settings.LLM_INPUT_TOKEN_BUDGET,
+            output_budget=settings.LLM_OUTPUT_TOKEN_BUDGET,
+            output_tokens_per_item=settings.LLM_SUMMARY_TOKENS,
+            overhead_tokens=overhead
+        )
+
+    def _group_near_duplicates(
+        self,
+        payloads: List[Dict],
+        search_key: str
+    ) -> Tuple[List[Dict], Dict[str, List[str]], Dict[str, str]]:
+        """
+        Split payloads into the ones to summarize and near-duplicate variants that can share a summary
+
+        Returns the payloads to send, the UUIDs of the variants that follow
+        each of them, and summaries by UUID for variants of a product under
+        the search key that already has one.
+        """
+        # Index entries are tagged with where they came from: a summarized product or one earlier in this batch
+        index = stored_index(
+            Product.objects.filter(search_key=search_key, ai_summary__isnull=False), 'uuid', tag=self.STORED
+        )
+        to_send, variants, reuse_from = [], {}, {}
+        for payload in payloads:
+            value = simhash(payload['description'])
+            nearest = index.nearest(value) if value is not None else None
+            if nearest is None:
+                if value is not None:
+                    index.add(value, (self.IN_BATCH, payload['uuid']))
+                to_send.append(payload)
+                continue
+            source, key = nearest
+            if source == self.IN_BATCH:
+                # Sent in this payload's place
+                variants.setdefault(key, []).append(payload['uuid'])
+            else:
+                reuse_from[payload['uuid']] = key
+
+        stored = dict(Product.objects.filter(uuid__in=set(reuse_from.values())).values_list('uuid', 'ai_summary'))
+        reused = {}
+        for payload in payloads:
+            source = reuse_from.get(payload['uuid'])
+            if source is None:
+                continue
+            if stored.get(source):
+                reused[payload['uuid']] = stored[source]
+            else:
+                # Its summary went away since the index was read
+                to_send.append(payload)
+        return to_send, variants, reused
+
+    def _generate_product_summaries(
+        self,
+        products_data: List[Dict],
+        on_summary: Callable = None,
+        search_key: str = None
+    ) -> List[Dict]:
+        """
+        Generate summaries for a batch of products
+
+        The response is streamed and each summary is passed to `on_summary` as
+        soon as it is complete. A response cut off part way keeps the summaries
+        completed before the cut. Summaries for UUIDs that were not asked for
+        are dropped.
+        """
+        wanted = {payload['uuid'] for payload in products_data}
+        summaries = []
+        with self.metrics.call('summary', search_key) as call:
+            for summary in self.client.generate_structured_items(
+                prompt=self._summary_prompt(products_data),
+                expected_format=SUMMARY_FORMAT,
                 temperature=0.3,
-                max_tokens=800  # Adjust based on your needs
-            )
-        except Exception as e:
-            logger.error(f"Error generating summaries for chunk: {str(e)}")
-            # Handle the last chunk specially if it fails
-            if len(products_data) > 2:
-                logger.info("Retrying with smaller chunk size")
-                # Split the chunk and try again
-                mid = len(products_data) // 2
-                first_half = self._generate_product_summaries(products_data[:mid])
-                second_half = self._generate_product_summaries(products_data[mid:])
-                if first_half and second_half:
-                    return first_half + second_half
-            return None
+                max_tokens=settings.LLM_OUTPUT_TOKEN_BUDGET,
+                metrics=call
+            ):
+                if not isinstance(summary, dict) or summary.get('uuid') not in wanted or not summary.get('summary'):
+                    continue
+                wanted.discard(summary['uuid'])
+                summaries.append(summary)
+                if on_summary:
+                    on_summary(summary)
+
+        with self._counters_lock:
+            self.counters['requests'] += 1
+            self.counters['summaries'] += len(summaries)
+            self.counters['empty_responses'] += 0 if summaries else 1
+        if len(summaries) < len(products_data):
+            logger.warning(f"Response covered {len(summaries)} of {len(products_data)} products")
+        return summaries
+
+    def _summarize_chunks(
+        self,
+        chunks: List[List[Dict]],
+        on_summary: Callable,
+        on_chunk_done: Callable = None,
+        search_key: str = None,
+        payloads: Dict[str, Dict] = None
+    ) -> set:
+        """
+        Summarize chunks concurrently, calling `on_summary` on this thread for each summary as it arrives
+
+        `on_chunk_done` is called on this thread whenever a chunk's request
+        has finished. A chunk that fails is logged and counted, and the others
+        carry on. Returns the UUIDs that got a summary.
 
-    def _analyze_product_trends(self, products_data: List[Dict]) -> Dict:
-        """Analyze trends in product data"""
+        Summaries are cached under the products' `payloads` by UUID, as
+        looked up before packing, rather than the chunk's copies, whose
+        descriptions packing may have trimmed.
+        """
+        # Worker threads stream summaries into this queue so the DB writes all happen on this thread.
+        # (chunk, summary) is one finished summary; (chunk, None) means that chunk is done
+        arrivals = queue.Queue()
+        summarized = set()
+
+        def summarize(i, chunk):
+            try:
+                return self._generate_product_summaries(chunk, lambda summary: arrivals.put((i, summary)), search_key)
+            finally:
+                arrivals.put((i, None))
+
+        with ThreadPoolExecutor(max_workers=settings.LLM_MAX_IN_FLIGHT, thread_name_prefix='llm') as executor:
+            futures = {
+                i: executor.submit(summarize, i, chunk)
+                for i, chunk in enumerate(chunks, 1)
+            }
+
+            pending = len(chunks)
+            while pending:
+                i, summary = arrivals.get()
+                if summary is not None:
+                    summarized.add(summary['uuid'])
+                    on_summary(summary)
+                    continue
+
+                pending -= 1
+                try:
+                    summaries = futures[i].result()
+                except Exception as e:
+                    # The chunk's products are not in `summarized`, so the next round retries them with the leftovers
+                    logger.error(f"Chunk {i} of {len(chunks)} failed: {str(e)}")
+                    self._count('failed_requests')
+                    summaries = []
+                if summaries:
+                    cached = [payloads.get(p['uuid'], p) for p in chunks[i - 1]] if payloads else chunks[i - 1]
+                    self.summary_cache.put_many(cached, {s['uuid']: s['summary'] for s in summaries})
+                if on_chunk_done:
+                    on_chunk_done()
+                logger.info(f"Processed chunk {i} of {len(chunks)}")
+        return summarized
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._counters_lock:
+            self.counters[counter] += amount
+
+    def summary_stats(self) -> Dict:
+        with self._counters_lock:
+            stats = dict(self.counters)
+        stats['requests_per_summary'] = round(stats['requests'] / stats['summaries'], 3) if stats['summaries'] else None
+        return stats
+
+    def _analyze_product_trends(self, digest: Dict, search_key: str = None) -> Dict:
+        """Analyze trends in a statistical digest of the product data"""
         expected_format = {
             "trends": [
                 {
@@ -73,81 +253,185 @@ class LLMService:
         }
         
         prompt = f"""
-        Analyze the following product dataset and identify the top 3 trends based on pricing and ratings.
+        Analyze the following statistical digest of a product dataset and identify the top 3 trends based on pricing and ratings.
+        Prices are quantile price bands with their rating statistics and most common feature keywords.
+        When present, "catalogue" holds price and rating statistics and histograms for every product under the search key.
         Focus on:
         1. Price ranges and clusters
         2. Price-to-rating relationships
         3. Common features across price points
         
-        Products:
-        {json.dumps(products_data, indent=2)}
+        Digest:
+        {json.dumps(digest, separators=(',', ':'))}
         Respond with a valid JSON object containing exactly three trends and a summary.
         Each trend must have a title, description, and supporting_data as strings.
         """
         
-        return self.client.generate_structured_completion(
-            prompt=prompt,
-            expected_format=expected_format,
-            temperature=0.2
-        )
+        with self.metrics.call('trends', search_key) as call:
+            return self.client.generate_structured_completion(
+                prompt=prompt,
+                expected_format=expected_format,
+                temperature=0.2,
+                metrics=call
+            )
 
-    @transaction.atomic
-    def process_products(self, products: List[Product] = None) -> Dict:
+    def process_products(self, products: List[Product] = None, progress: Callable = None) -> Dict:
         """
         Process products and generate summaries and trends
         
         Args:
             products: List of products to process. If None, processes all products without summaries.
+            progress: Optional callable receiving (products processed, total products) as summaries arrive
         """
         if not products:
             logger.info("No products to process")
             return None
+        products = list(products)
+        self.summarize_products(products, progress)
+        return self.analyze_trends(products)
 
-        # Generate summaries in batches
-        all_summaries = []
-        chunks = self._chunk_products(products)
-        total_chunks = len(chunks)
-        
-        for i, chunk in enumerate(chunks, 1):
-            logger.info(f"Processing chunk {i} of {total_chunks}")
-            products_data = [{
-                'uuid': str(p.uuid),
-                'name': p.name,
-                'description': p.description,
-                'price': float(p.price),
-                'rating': float(p.rating) if p.rating else None
-            } for p in chunk]
-
-            summaries = self._generate_product_summaries(products_data)
-            if summaries:
-                all_summaries.extend(summaries)
-            else:
-                logger.warning(f"Failed to process chunk {i}")
+    def process_search_key(self, search_key: str, owner: str, progress: Callable = None) -> Dict:
+        """
+        Summarize a search key's unsummarized products batch by batch, then analyze trends
 
-        # Update product summaries
-        successful_updates = 0
-        for summary in all_summaries:
-            try:
-                Product.objects.filter(uuid=summary['uuid']).update(
-                    ai_summary=summary['summary']
-                )
-                successful_updates += 1
-            except Exception as e:
-                logger.error(f"Error updating product {summary['uuid']}: {str(e)}")
+        Products are leased to `owner` a batch at a time, so concurrent process
+        jobs split the work instead of summarizing the same products. Every
+        summary commits as it arrives, so a run that is interrupted resumes
+        from the products still without one: a requeued job (same owner) first
+        drops its old leases, and other jobs pick them up once they expire.
+        """
+        release_products(owner)
+        total = claimable_count(search_key)
+        processed = []
+        try:
+            while True:
+                batch = claim_products(search_key, owner)
+                if not batch:
+                    break
+                done_before = len(processed)
+                batch_progress = (
+                    lambda done, _: progress(done_before + done, max(total, done_before + len(batch)))
+                ) if progress else None
+                self.summarize_products(batch, batch_progress)
+                processed.extend(batch)
+        finally:
+            # Products that got no summary are left to the next run
+            release_products(owner)
+            self.metrics.flush()
+
+        if not processed:
+            logger.info("No products to process")
+            return None
+        return self.analyze_trends(processed)
+
+    def summarize_products(self, products: List[Product], progress: Callable = None) -> int:
+        """Generate and save summaries for `products`; returns how many products were updated"""
+        # Generate summaries in batches, several chunks in flight at once within the provider's limits
+        payloads = [self._product_payload(p) for p in products]
+        total_products = len(products)
+        search_key = products[0].search_key if products else None
+
+        # Summaries are written back in batches, each at the latest when its request finishes
+        writer = SummaryWriter(allowed_uuids=[payload['uuid'] for payload in payloads])
+
+        # Products whose content was summarized before (under any search key) need no LLM call
+        cached = self.summary_cache.get_many(payloads)
+        for uuid, summary in cached.items():
+            writer.add({'uuid': uuid, 'summary': summary})
+        writer.flush()
+        payloads = [payload for payload in payloads if payload['uuid'] not in cached]
+        processed = len(cached)
+        if cached:
+            logger.info(f"Reused {len(cached)} cached summaries")
+            if progress:
+                progress(processed, total_products)
+
+        # Variants of one product (colour, RAM, storage) share a summary: one a variant under the search key
+        # already has, or the one generated for the first of them here. Each keeps its own price and rating
+        variants = {}
+        if settings.NEAR_DUPLICATE_ENABLED and payloads:
+            payloads, variants, reused = self._group_near_duplicates(payloads, search_key)
+            for uuid, summary in reused.items():
+                writer.add({'uuid': uuid, 'summary': summary})
+            writer.flush()
+            following = sum(len(uuids) for uuids in variants.values())
+            if reused or following:
+                logger.info(f"{len(reused) + following} near-duplicate products share the summary of a variant")
+            if reused:
+                self._count('near_duplicates', len(reused))
+                processed += len(reused)
+                if progress:
+                    progress(processed, total_products)
+
+        started = time.monotonic()
+        first_summary_seconds = None
+
+        def on_chunk_done():
+            writer.flush()
+            self.metrics.flush()
+
+        def on_summary(summary):
+            nonlocal first_summary_seconds, processed
+            if first_summary_seconds is None:
+                first_summary_seconds = time.monotonic() - started
+                logger.info(f"First summary arrived after {first_summary_seconds:.2f}s")
+            if not writer.add(summary):
+                return
+            processed += 1
+            for uuid in variants.get(summary['uuid'], ()):
+                if writer.add({'uuid': uuid, 'summary': summary['summary']}):
+                    self._count('near_duplicates')
+                    processed += 1
+            if progress:
+                progress(processed, total_products)
+
+        # Products a response left out (cut off, malformed or skipped by the model) are repacked
+        # with the other leftovers of the round, so a retry costs a share of a full request
+        remaining = payloads
+        by_uuid = {payload['uuid']: payload for payload in payloads}
+        for attempt in range(settings.LLM_SUMMARY_RETRIES + 1):
+            if not remaining:
+                break
+            chunks = self._chunk_products(remaining)
+            if attempt:
+                with self._counters_lock:
+                    self.counters['retried_products'] += len(remaining)
+                logger.info(f"Retrying {len(remaining)} products missing from earlier responses")
+            logger.info(f"Packed {len(remaining)} products into {len(chunks)} requests")
+            # Flushing as each request finishes commits its summaries, so a later failure loses none of them
+            summarized = self._summarize_chunks(chunks, on_summary, on_chunk_done, search_key, by_uuid)
+            remaining = [payload for payload in remaining if payload['uuid'] not in summarized]
+
+        if remaining:
+            logger.warning(f"{len(remaining)} products are still without a summary")
+            # Products left without a summary still count as processed, and so do their variants
+            processed += len(remaining) + sum(len(variants.get(payload['uuid'], ())) for payload in remaining)
+            if progress:
+                progress(processed, total_products)
 
-        logger.info(f"Successfully updated {successful_updates} product summaries")
+        logger.info(f"LLM rate limits: {self.rate_limiter.stats()}")
+        logger.info(f"Summary requests: {self.summary_stats()}")
+        self.summary_cache.evict()
+        logger.info(f"Summary cache: {self.summary_cache.stats()}")
+        evict_calls()
+        writer.flush()
+        logger.info(f"Successfully updated {writer.written} product summaries")
+        return writer.written
 
-        # Generate trends analysis using minimal data for efficiency
-        trends_data = [{
-            'name': p.name[:20], # take only first 20 characters of name for efficiency
-            'price': float(p.price),
-            'rating': float(p.rating) if p.rating else None
-        } for p in products]  # Only send necessary fields for trend analysis
+    def analyze_trends(self, products: List[Product]) -> Dict:
+        """Analyze trends of `products` and their search key's catalogue and store them as a ProductTrend"""
+        # Trends are analyzed from a fixed-size local digest, so the prompt does not grow with the catalogue
+        digest = build_trend_digest([self._product_payload(p) for p in products])
+        search_key = products[0].search_key if products else "laptops"
+        # Running totals for every product under the search key, not only the batch processed now
+        catalogue = SearchKeyStats.objects.filter(search_key=search_key).first()
+        if catalogue:
+            digest['catalogue'] = catalogue.to_dict()
 
-        trends_analysis = self._analyze_product_trends(trends_data)
+        trends_analysis = self._analyze_product_trends(digest, search_key)
+        self.metrics.flush()
 
         if trends_analysis:
-            search_key = products[0].search_key if products else "laptops"
             trend = ProductTrend.objects.create(
                 trend_analysis=trends_analysis,
                 search_key=search_key
@@ -0,0 +1,139 @@
+import hashlib
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import QuerySet
+
+from ..models import Product
+
+WORD_PATTERN = re.compile(r'[a-z0-9]+(?:[.\-][a-z0-9]+)*')
+SIMHASH_BITS = 64
+SHINGLE_WORDS = 3
+# Descriptions shorter than this are too little to tell variants from different products
+MIN_WORDS = 12
+
+
+def shingles(text: str) -> List[str]:
+    """Overlapping word n-grams of a lowercased description with punctuation and spacing dropped"""
+    words = WORD_PATTERN.findall((text or '').lower())
+    if len(words) < MIN_WORDS:
+        return []
+    return [' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+
+
+def simhash(text: str) -> Optional[int]:
+    """
+    64-bit SimHash of a description's shingles, or None when it is too short
+
+    Each distinct shingle votes on every bit with its hash, so descriptions
+    that share most of their shingles, like the colour or RAM variants of one
+    laptop, end up a few bits apart. Returned as a signed integer so it fits
+    a BigIntegerField.
+    """
+    unique = set(shingles(text))
+    if not unique:
+        return None
+    digests = b''.join(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest() for s in unique)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(unique), 8), axis=1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(unique)
+    value = int(np.packbits(votes > 0).view('>u8')[0])
+    return value - (1 << SIMHASH_BITS) if value >= 1 << (SIMHASH_BITS - 1) else value
+
+
+def distance(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << SIMHASH_BITS) - 1)).count('1')
+
+
+class SimHashIndex:
+    """
+    Finds stored SimHashes within `max_distance` bits of a query
+
+    The hash is split into max_distance + 1 bands, so two hashes that differ
+    in at most max_distance bits agree on at least one whole band; only
+    entries sharing a band with the query are compared bit by bit.
+    """
+
+    def __init__(self, max_distance: int = None):
+        self.max_distance = settings.NEAR_DUPLICATE_MAX_DISTANCE if max_distance is None else max_distance
+        bands = self.max_distance + 1
+        width = SIMHASH_BITS // bands
+        self._bands = [(i * width, width if i < bands - 1 else SIMHASH_BITS - i * width) for i in range(bands)]
+        self._buckets: List[Dict[int, List[Tuple[int, object]]]] = [{} for _ in self._bands]
+        self.size = 0
+
+    def _keys(self, value: int) -> Iterable[int]:
+        value &= (1 << SIMHASH_BITS) - 1
+        for shift, width in self._bands:
+            yield (value >> shift) & ((1 << width) - 1)
+
+    def add(self, value: int, key):
+        for buckets, band in zip(self._buckets, self._keys(value)):
+            buckets.setdefault(band, []).append((value, key))
+        self.size += 1
+
+    def nearest(self, value: int):
+        """Key of the closest entry within max_distance bits, or None"""
+        best, best_distance = None, self.max_distance + 1
+        for buckets, band in zip(self._buckets, self._keys(value)):
+            for candidate, key in buckets.get(band, ()):
+                d = distance(value, candidate)
+                if d < best_distance:
+                    best, best_distance = key, d
+        return best
+
+
+def group_near_duplicates(hashes: Dict[str, Optional[int]], max_distance: int = None) -> Dict[str, str]:
+    """
+    Map each key to the representative of its near-duplicate group
+
+    Keys are taken in order; each becomes its own representative unless it
+    is within `max_distance` of an earlier representative. Keys without a
+    hash are left out.
+    """
+    index = SimHashIndex(max_distance)
+    representatives = {}
+    for key, value in hashes.items():
+        if value is None:
+            continue
+        representative = index.nearest(value)
+        if representative is None:
+            index.add(value, key)
+            representative = key
+        representatives[key] = representative
+    return representatives
+
+
+def stored_index(products: QuerySet, key_field: str, tag: str = None) -> SimHashIndex:
+    """
+    A SimHashIndex over the stored SimHashes of `products`, keyed by `key_field`
+
+    With a `tag` the keys are (tag, value) pairs, so a caller that adds
+    other entries to the index can tell them apart from the stored ones.
+    """
+    index = SimHashIndex()
+    for value, key in products.filter(simhash__isnull=False).values_list('simhash', key_field).iterator():
+        index.add(value, (tag, key) if tag else key)
+    return index
+
+
+def flag_stored_products(search_key: str) -> int:
+    """
+    Recompute SimHashes and duplicate_of for the stored products of a search key, oldest first
+
+    For rows scraped before near-duplicate detection, or after changing
+    NEAR_DUPLICATE_MAX_DISTANCE. Returns how many products are flagged.
+    """
+    products = list(Product.objects.filter(search_key=search_key).order_by('created_at').only('uuid', 'asin', 'description'))
+    for product in products:
+        product.simhash = simhash(product.description)
+    representatives = group_near_duplicates({p.uuid: p.simhash for p in products if p.asin})
+    asins = {p.uuid: p.asin for p in products}
+    flagged = 0
+    for product in products:
+        representative = representatives.get(product.uuid, product.uuid)
+        product.duplicate_of = asins[representative] if representative != product.uuid else None
+        flagged += product.duplicate_of is not None
+    Product.objects.bulk_update(products, ['simhash', 'duplicate_of'], batch_size=500)
+    return flagged
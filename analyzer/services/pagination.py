@@ -0,0 +1,132 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+from django.db import connection
+from django.db.models import BooleanField, DateTimeField, F, Func, Model, QuerySet, UUIDField, Value
+
+AFTER = 'a'
+BEFORE = 'b'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class RowComparison(Func):
+    """
+    `(a, b) < (x, y)` (or another operator) as a single row-value comparison
+
+    Unlike the equivalent `a < x OR (a = x AND b < y)`, the database can run
+    it as a range scan on an index over (a, b).
+    """
+    output_field = BooleanField()
+
+    def __init__(self, lhs, operator: str, rhs):
+        super().__init__(*lhs, *rhs)
+        self.operator = operator
+
+    def as_sql(self, compiler, connection, **extra_context):
+        parts, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            parts.append(sql)
+            params.extend(expression_params)
+        half = len(parts) // 2
+        return f"({', '.join(parts[:half])}) {self.operator} ({', '.join(parts[half:])})", params
+
+
+def seek(created_at: datetime, pk: uuid.UUID, operator: str) -> RowComparison:
+    """Rows whose (created_at, uuid) compares to the cursor's with `operator`"""
+    return RowComparison(
+        [F('created_at'), F('uuid')],
+        operator,
+        [Value(created_at, output_field=DateTimeField()), Value(pk, output_field=UUIDField())]
+    )
+
+
+def encode_cursor(row: Model, direction: str) -> str:
+    """Opaque cursor for the rows after (or before) `row` in newest-first order"""
+    raw = json.dumps({'t': row.created_at.isoformat(), 'u': str(row.uuid), 'd': direction}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """The (created_at, uuid, direction) a cursor points at"""
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direction = raw['d']
+        if direction not in (AFTER, BEFORE):
+            raise ValueError(direction)
+        return datetime.fromisoformat(raw['t']), uuid.UUID(raw['u']), direction
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_page(queryset: QuerySet, page_size: int, cursor: str = None) -> Dict:
+    """
+    One page of `queryset`, newest first, ordered by (created_at, uuid)
+
+    The page is found by seeking past the row in the cursor rather than
+    by OFFSET, so with an index on (created_at, uuid) every page costs the
+    same however deep it is. Returns the rows and the `next` and `prev`
+    cursors, which are None at either end.
+    """
+    if cursor is None:
+        created_at, pk, direction = None, None, AFTER
+    else:
+        created_at, pk, direction = decode_cursor(cursor)
+
+    if direction == AFTER:
+        rows = queryset.order_by('-created_at', '-uuid')
+        if cursor is not None:
+            rows = rows.filter(seek(created_at, pk, '<'))
+    else:
+        rows = queryset.order_by('created_at', 'uuid').filter(seek(created_at, pk, '>'))
+    rows = list(rows[:page_size + 1])
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if direction == BEFORE:
+        rows.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, cursor is not None
+    return {
+        'results': rows,
+        'next': encode_cursor(rows[-1], AFTER) if rows and has_next else None,
+        'prev': encode_cursor(rows[0], BEFORE) if rows and has_prev else None,
+    }
+
+
+def estimated_count(queryset: QuerySet) -> Optional[int]:
+    """
+    Row count of an unfiltered queryset's table from the planner statistics, or None when there are none
+
+    Only PostgreSQL keeps them (pg_class.reltuples, refreshed by ANALYZE and
+    autovacuum); it is -1 for a table that has never been analyzed.
+    """
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def count_rows(queryset: QuerySet, mode: str) -> Dict:
+    """
+    The total for a page listing: 'exact' runs COUNT(*), 'estimate' uses the planner
+    statistics where available and counts otherwise, and 'none' skips it
+    """
+    if mode == 'none':
+        return {'total': None, 'total_is_estimate': False}
+    if mode == 'estimate':
+        estimate = estimated_count(queryset)
+        if estimate is not None:
+            return {'total': estimate, 'total_is_estimate': True}
+    return {'total': queryset.count(), 'total_is_estimate': False}
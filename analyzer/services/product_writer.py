@@ -0,0 +1,112 @@
+import logging
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Product
+from . import search_key_stats
+from .near_duplicates import simhash, stored_index
+
+logger = logging.getLogger(__name__)
+
+
+class ProductWriter:
+    """
+    Buffers scraped products and upserts them in batches.
+
+    Each batch is a single INSERT ... ON CONFLICT (asin, search_key) DO UPDATE
+    committed in its own short transaction, so nothing stays open while the
+    scraper waits on the network and a failure late in a run only affects the
+    batch it happened in. If a batch fails, its rows are retried one by one so
+    a single bad product does not take the rest of the batch down with it.
+    The search key's SearchKeyStats row is updated in the same transaction.
+    Each product's description SimHash is stored, and a product within
+    NEAR_DUPLICATE_MAX_DISTANCE of one already under the search key is
+    flagged with that product's ASIN in duplicate_of.
+
+    Products without an ASIN are skipped and counted in `skipped`: NULLs never
+    conflict under the (asin, search_key) constraint, so every scrape would
+    insert them again.
+    """
+
+    def __init__(self, batch_size: int = None):
+        self.batch_size = batch_size or settings.SCRAPE_WRITE_BATCH_SIZE
+        self.buffer: List[Product] = []
+        self.written = 0
+        self.failed = 0
+        self.skipped = 0
+        self.batches = 0
+        self.near_duplicates = 0
+        self._indexes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def add(self, product_data: Dict):
+        if not product_data.get('asin'):
+            self.skipped += 1
+            logger.warning(f"Skipping product without an ASIN: {product_data.get('url')}")
+            return
+        product = Product(**product_data)
+        if settings.NEAR_DUPLICATE_ENABLED:
+            self._flag_near_duplicate(product)
+        self.buffer.append(product)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def _flag_near_duplicate(self, product: Product):
+        product.simhash = simhash(product.description)
+        if product.simhash is None:
+            return
+        index = self._indexes.get(product.search_key)
+        if index is None:
+            # Products that are not duplicates themselves, loaded once per search key and writer
+            index = self._indexes[product.search_key] = stored_index(
+                Product.objects.filter(search_key=product.search_key, duplicate_of__isnull=True, asin__isnull=False),
+                'asin'
+            )
+        representative = index.nearest(product.simhash)
+        if representative is None:
+            index.add(product.simhash, product.asin)
+        elif representative != product.asin:
+            product.duplicate_of = representative
+            self.near_duplicates += 1
+
+    def flush(self):
+        # The same ASIN twice in one statement would make ON CONFLICT fail, so keep the last copy
+        batch = list({(p.asin, p.search_key): p for p in self.buffer}.values())
+        self.buffer = []
+        if not batch:
+            return
+
+        try:
+            with transaction.atomic():
+                self._upsert(batch)
+            self.written += len(batch)
+            self.batches += 1
+            logger.info(f"Saved batch of {len(batch)} products")
+        except Exception as e:
+            logger.error(f"Error saving batch of {len(batch)} products, retrying individually: {str(e)}")
+            for product in batch:
+                try:
+                    with transaction.atomic():
+                        self._upsert([product])
+                    self.written += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Error saving product {product.url}: {str(e)}")
+
+    def _upsert(self, batch: List[Product]):
+        locked = search_key_stats.lock(p.search_key for p in batch)
+        previous = search_key_stats.previous_values(batch)
+        Product.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['asin', 'search_key'],
+            update_fields=Product.UPSERT_FIELDS
+        )
+        search_key_stats.record_upsert(locked, batch, previous)
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket that hands out request slots at a steady rate with a small burst allowance"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take one token and return how long the caller must wait before using it.
+
+        Tokens are allowed to go negative so that concurrent callers queue up
+        behind each other instead of all waking up at the same moment.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            now = time.monotonic()
+            # Settle the tokens earned at the old rate before switching
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self.rate = rate
+
+    def wait(self):
+        """Block the current thread until a token is available"""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire(self):
+        """Wait without blocking the event loop until a token is available"""
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class HostRateLimiter:
+    """Keeps one token bucket per host so each site gets its own request budget"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.capacity)
+            return self._buckets[host]
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self.rate = rate
+            buckets = list(self._buckets.values())
+        for bucket in buckets:
+            bucket.set_rate(rate)
+
+    def wait(self, url: str):
+        self.bucket_for(url).wait()
+
+    async def acquire(self, url: str):
+        await self.bucket_for(url).acquire()
+
+
+class AdaptiveController:
+    """
+    AIMD controller for the scraper's concurrency and request rate.
+
+    Healthy responses raise both limits additively, one step per round of
+    `concurrency` successes. A throttle signal (block page, 429/503, timeout)
+    halves them. Only one cut is made per round trip: signals from requests
+    that started before the last cut carry an older epoch and are just
+    counted, so one burst of blocked in-flight requests does not collapse the
+    limits to their floor. With `adaptive` off the limits stay where they
+    started and only the counters move.
+
+    Each step starts from the rate limiter's current `rate`. A limiter shared
+    by several processes may have been changed by another one, and that
+    change must not be overwritten by a stale local rate.
+    """
+
+    RATE_STEP = 0.1
+    DECREASE_FACTOR = 0.5
+
+    def __init__(
+        self,
+        rate_limiter,
+        concurrency: int,
+        rate: float,
+        max_concurrency: int = None,
+        max_rate: float = None,
+        min_rate: float = None,
+        adaptive: bool = True
+    ):
+        self.rate_limiter = rate_limiter
+        self.adaptive = adaptive
+        self.concurrency = concurrency
+        self.rate = rate
+        self.max_concurrency = max(max_concurrency or concurrency, concurrency) if adaptive else concurrency
+        self.max_rate = max(max_rate or rate, rate) if adaptive else rate
+        self.min_rate = min(min_rate or rate, rate)
+        self._in_flight = 0
+        self._slots = None
+        self._slots_loop = None
+        self._wakeups = set()
+        self._epoch = 0
+        self._round = 0
+        self._lock = threading.Lock()
+        self.counters = {
+            'successes': 0,
+            'throttled': 0,
+            'increases': 0,
+            'decreases': 0,
+        }
+
+    def _condition(self) -> asyncio.Condition:
+        # Made in the running loop, since before Python 3.10 a Condition is bound to the loop it was created in
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = asyncio.Condition()
+            self._slots_loop = loop
+        return self._slots
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the current `concurrency` request slots, yielding the epoch it started in"""
+        # The limit moves while requests wait, which a fixed-size asyncio.Semaphore cannot follow
+        slots = self._condition()
+        async with slots:
+            await slots.wait_for(lambda: self._in_flight < self.concurrency)
+            self._in_flight += 1
+        try:
+            yield self._epoch
+        finally:
+            async with slots:
+                self._in_flight -= 1
+                slots.notify()
+
+    def _limits_changed(self):
+        """Let waiting requests re-check the concurrency limit"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Nothing can be waiting for a slot outside an event loop
+        if loop is not self._slots_loop:
+            return
+        # The callers are synchronous, and notifying needs the condition's lock
+        task = loop.create_task(self._notify_all())
+        self._wakeups.add(task)
+        task.add_done_callback(self._wakeups.discard)
+
+    async def _notify_all(self):
+        async with self._slots:
+            self._slots.notify_all()
+
+    def on_success(self):
+        with self._lock:
+            self.counters['successes'] += 1
+            self._round += 1
+            if not self.adaptive or self._round < self.concurrency:
+                return
+            self._round = 0
+            self.rate = self.rate_limiter.rate
+            if self.concurrency >= self.max_concurrency and self.rate >= self.max_rate:
+                return
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            self._set_rate(min(self.max_rate, self.rate + self.RATE_STEP))
+            self.counters['increases'] += 1
+        self._limits_changed()
+
+    def on_throttle(self, epoch: int, reason: str):
+        with self._lock:
+            self.counters['throttled'] += 1
+            if not self.adaptive or epoch != self._epoch:
+                return
+            self._epoch += 1
+            self._round = 0
+            self.rate = self.rate_limiter.rate
+            self.concurrency = max(1, int(self.concurrency * self.DECREASE_FACTOR))
+            self._set_rate(max(self.min_rate, self.rate * self.DECREASE_FACTOR))
+            self.counters['decreases'] += 1
+        self._limits_changed()
+        logger.warning(f"Throttled ({reason}), backing off to {self.concurrency} concurrent requests at {self.rate:.2f}/s")
+
+    def _set_rate(self, rate: float):
+        self.rate = rate
+        self.rate_limiter.set_rate(rate)
+
+    def limits(self) -> Dict:
+        return {'concurrency': self.concurrency, 'rate': round(self.rate, 3)}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters, **self.limits())
+        responses = stats['successes'] + stats['throttled']
+        stats['throttle_rate'] = round(stats['throttled'] / responses, 3) if responses else 0.0
+        return stats
@@ -0,0 +1,76 @@
+import logging
+from datetime import timedelta
+from typing import Callable, Dict
+
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import Product
+from ..management.commands.run_scraper import AsyncAmazonScraper
+from .product_writer import ProductWriter
+
+logger = logging.getLogger(__name__)
+
+
+def fresh_asins(search_term: str) -> set:
+    """ASINs of products under this search term that were refreshed within the freshness window"""
+    if not settings.SCRAPE_FRESHNESS_HOURS:
+        return set()
+    cutoff = timezone.now() - timedelta(hours=settings.SCRAPE_FRESHNESS_HOURS)
+    return set(Product.objects.filter(
+        search_key=search_term,
+        asin__isnull=False,
+        updated_at__gte=cutoff
+    ).values_list('asin', flat=True))
+
+
+def scrape_search_term(
+    search_term: str,
+    max_pages: int = 1,
+    incremental: bool = True,
+    progress: Callable = None
+) -> Dict:
+    """
+    Scrape a search term and upsert the products found
+
+    Args:
+        search_term: Amazon search query, also stored as the products' search_key
+        max_pages: Number of search result pages to walk
+        incremental: Skip products refreshed within SCRAPE_FRESHNESS_HOURS
+        progress: Optional callable receiving (products saved, pages fetched) and the
+            scraper's current concurrency and rate as keyword arguments
+    """
+    scraper = AsyncAmazonScraper()
+    skip_asins = fresh_asins(search_term) if incremental else set()
+
+    # Products are upserted in batches, each committed on its own, while scraping continues
+    with ProductWriter() as writer:
+        for product_data in scraper.iter_products(
+            search_term=search_term,
+            max_pages=max_pages,
+            skip_asins=skip_asins
+        ):
+            writer.add(product_data)
+            if progress:
+                progress(writer.written + len(writer.buffer), scraper.pages_fetched, **scraper.controller.limits())
+
+    logger.info(
+        f"Scraped {writer.written} products from {scraper.pages_fetched} pages, "
+        f"skipped {scraper.skipped_fresh} fresh products, {writer.near_duplicates} near-duplicates"
+    )
+    logger.info(f"Adaptive limits: {scraper.controller.stats()}")
+    cache_stats = scraper.cache.stats() if scraper.cache else None
+    if cache_stats:
+        logger.info(f"Page cache: {cache_stats}")
+
+    return {
+        'products_scraped': writer.written,
+        'products_failed': writer.failed,
+        'products_without_asin': writer.skipped,
+        'products_skipped': scraper.skipped_fresh,
+        'near_duplicates': writer.near_duplicates,
+        'pages_fetched': scraper.pages_fetched,
+        'cache': cache_stats,
+        'adaptive': scraper.controller.stats(),
+        'streaming': scraper.stream_stats()
+    }
@@ -0,0 +1,98 @@
+import logging
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+from ..models import Product, SearchKeyStats
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild(stats: SearchKeyStats) -> SearchKeyStats:
+    """Recompute a search key's totals from its products; only needed when the row is first created"""
+    stats.reset()
+    for price, rating in Product.objects.filter(search_key=stats.search_key).values_list('price', 'rating').iterator():
+        stats.add(price, rating)
+    return stats
+
+
+def refresh_extremes(stats: SearchKeyStats):
+    extremes = Product.objects.filter(search_key=stats.search_key).aggregate(
+        price_min=Min('price'), price_max=Max('price'), rating_min=Min('rating'), rating_max=Max('rating')
+    )
+    for field, value in extremes.items():
+        setattr(stats, field, value)
+
+
+def lock(search_keys: Iterable[str]) -> Dict[str, SearchKeyStats]:
+    """
+    Lock the stats rows of `search_keys` for the current transaction, creating missing ones
+
+    Writers of the same search key queue on this row lock, so the products a
+    writer reads before its upsert are the ones it replaces. Keys are locked in
+    sorted order so two writers never wait on each other's rows. A row created
+    here is filled from the products already stored.
+    """
+    locked = {}
+    for search_key in sorted(set(search_keys)):
+        stats, created = SearchKeyStats.objects.get_or_create(search_key=search_key)
+        if created:
+            locked[search_key] = rebuild(stats)
+        else:
+            locked[search_key] = SearchKeyStats.objects.select_for_update().get(pk=stats.pk)
+    return locked
+
+
+def previous_values(products: List[Product]) -> Dict:
+    """(asin, search_key) -> (price, rating) of the stored rows an upsert of `products` will overwrite"""
+    asins = {p.asin for p in products if p.asin}
+    if not asins:
+        return {}
+    rows = Product.objects.filter(
+        asin__in=asins, search_key__in={p.search_key for p in products}
+    ).values_list('asin', 'search_key', 'price', 'rating')
+    return {(asin, search_key): (price, rating) for asin, search_key, price, rating in rows}
+
+
+def record_upsert(locked: Dict[str, SearchKeyStats], products: List[Product], previous: Dict):
+    """Swap the previous values of upserted products for their new ones in the locked totals"""
+    stale = set()
+    for product in products:
+        stats = locked[product.search_key]
+        old = previous.get((product.asin, product.search_key))
+        if old and stats.add(*old, sign=-1):
+            stale.add(product.search_key)
+        stats.add(product.price, product.rating)
+    for search_key, stats in locked.items():
+        if search_key in stale:
+            refresh_extremes(stats)
+        stats.save()
+
+
+def record_delete(product: Product):
+    """Take a deleted product out of its search key's totals"""
+    with transaction.atomic():
+        stats = SearchKeyStats.objects.select_for_update().filter(search_key=product.search_key).first()
+        # Without a row there is nothing to correct; the next write rebuilds it from what is left
+        if stats is None:
+            return
+        if stats.add(product.price, product.rating, sign=-1):
+            refresh_extremes(stats)
+        stats.save()
+
+
+def rebuild_all(search_keys: Iterable[str] = None) -> int:
+    """Recompute the stats of every search key (or just `search_keys`) and drop rows without products"""
+    if search_keys is None:
+        search_keys = Product.objects.values_list('search_key', flat=True).distinct()
+        SearchKeyStats.objects.exclude(search_key__in=Product.objects.values('search_key')).delete()
+    count = 0
+    for search_key in search_keys:
+        with transaction.atomic():
+            SearchKeyStats.objects.get_or_create(search_key=search_key)
+            stats = rebuild(SearchKeyStats.objects.select_for_update().get(search_key=search_key))
+            stats.save()
+        count += 1
+        logger.info(f"Rebuilt stats for '{search_key}': {stats.product_count} products")
+    return count
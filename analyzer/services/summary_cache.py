@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import threading
+from datetime import timedelta
+from typing import Dict, List
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import SummaryCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_payload(payload: Dict) -> Dict:
+    """The parts of a product payload a summary depends on, with whitespace and number formatting evened out"""
+    text = lambda value: ' '.join(str(value).split()) if value else ''
+    number = lambda value: round(float(value), 2) if value is not None else None
+    return {
+        'name': text(payload.get('name')),
+        'description': text(payload.get('description')),
+        'price': number(payload.get('price')),
+        'rating': number(payload.get('rating')),
+    }
+
+
+class SummaryStore:
+    """
+    Persistent cache of product summaries, shared by every worker through the SummaryCache table.
+
+    Keys hash the model, the prompt version and the normalized product content,
+    so the same product under another search key or a rescraped row with the
+    same content reuses its summary, while a prompt or model change misses.
+    Entries unused for LLM_SUMMARY_CACHE_TTL_DAYS are evicted, and beyond
+    LLM_SUMMARY_CACHE_MAX_ENTRIES the least recently used ones go first.
+    """
+
+    # Keeps IN (...) lists well under the database's bound parameter limit
+    LOOKUP_BATCH_SIZE = 500
+
+    def __init__(self, model: str, prompt_version: str):
+        self.model = model
+        self.prompt_version = prompt_version
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+
+    def key_for(self, payload: Dict) -> str:
+        content = json.dumps(
+            [self.model, self.prompt_version, normalize_payload(payload)],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def get_many(self, payloads: List[Dict]) -> Dict[str, str]:
+        """Cached summaries for the payloads that have one, by product uuid"""
+        if not settings.LLM_SUMMARY_CACHE_ENABLED or not payloads:
+            return {}
+        keys = {payload['uuid']: self.key_for(payload) for payload in payloads}
+        unique_keys = list(set(keys.values()))
+        summaries = {}
+        for start in range(0, len(unique_keys), self.LOOKUP_BATCH_SIZE):
+            batch = unique_keys[start:start + self.LOOKUP_BATCH_SIZE]
+            found = dict(SummaryCache.objects.filter(key__in=batch).values_list('key', 'summary'))
+            if found:
+                SummaryCache.objects.filter(key__in=found.keys()).update(
+                    hits=F('hits') + 1,
+                    last_used_at=timezone.now()
+                )
+            summaries.update(found)
+        found = {uuid: summaries[key] for uuid, key in keys.items() if key in summaries}
+        self._count('hits', len(found))
+        self._count('misses', len(payloads) - len(found))
+        return found
+
+    def put_many(self, payloads: List[Dict], summaries: Dict[str, str]):
+        """Store freshly generated summaries, given by product uuid, for their payloads"""
+        if not settings.LLM_SUMMARY_CACHE_ENABLED:
+            return
+        now = timezone.now()
+        entries = {}
+        for payload in payloads:
+            summary = summaries.get(payload['uuid'])
+            if summary:
+                key = self.key_for(payload)
+                entries[key] = SummaryCache(
+                    key=key,
+                    model=self.model,
+                    prompt_version=self.prompt_version,
+                    summary=summary,
+                    last_used_at=now
+                )
+        if not entries:
+            return
+        SummaryCache.objects.bulk_create(
+            entries.values(),
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['summary', 'last_used_at', 'updated_at']
+        )
+        self._count('stored', len(entries))
+
+    def evict(self) -> int:
+        cutoff = timezone.now() - timedelta(days=settings.LLM_SUMMARY_CACHE_TTL_DAYS)
+        evicted, _ = SummaryCache.objects.filter(last_used_at__lt=cutoff).delete()
+        excess = SummaryCache.objects.count() - settings.LLM_SUMMARY_CACHE_MAX_ENTRIES
+        if excess > 0:
+            oldest = SummaryCache.objects.order_by('last_used_at').values_list('pk', flat=True)[:excess]
+            deleted, _ = SummaryCache.objects.filter(pk__in=list(oldest)).delete()
+            evicted += deleted
+        if evicted:
+            self._count('evicted', evicted)
+            logger.info(f"Evicted {evicted} cached summaries")
+        return evicted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['entries'] = SummaryCache.objects.count()
+        return stats
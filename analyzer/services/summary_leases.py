@@ -0,0 +1,62 @@
+import logging
+from datetime import timedelta
+from typing import List
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def _claimable(search_key: str, now):
+    return Product.objects.filter(search_key=search_key, ai_summary__isnull=True).filter(
+        Q(summary_leased_by__isnull=True) | Q(summary_lease_expires_at__lt=now)
+    )
+
+
+def claim_products(search_key: str, owner: str, size: int = None, lease_seconds: int = None) -> List[Product]:
+    """
+    Lease up to `size` unsummarized products of a search key to `owner`.
+
+    Works like claim_batch for the frontier: SELECT ... FOR UPDATE SKIP LOCKED
+    lets concurrent process jobs claim side by side without ever getting the
+    same product. Leases of a job that died expire after LLM_LEASE_SECONDS,
+    after which its products are claimable again.
+    """
+    size = size or settings.LLM_CLAIM_BATCH_SIZE
+    lease_seconds = lease_seconds or settings.LLM_LEASE_SECONDS
+    now = timezone.now()
+    with transaction.atomic():
+        products = list(
+            _claimable(search_key, now).select_for_update(skip_locked=True).order_by('created_at')[:size]
+        )
+        if not products:
+            return []
+        lease_expires_at = now + timedelta(seconds=lease_seconds)
+        Product.objects.filter(pk__in=[product.pk for product in products]).update(
+            summary_leased_by=owner,
+            summary_lease_expires_at=lease_expires_at
+        )
+    for product in products:
+        product.summary_leased_by = owner
+        product.summary_lease_expires_at = lease_expires_at
+    return products
+
+
+def release_products(owner: str) -> int:
+    """Drop every lease `owner` still holds, putting products it could not summarize back in play"""
+    released = Product.objects.filter(summary_leased_by=owner).update(
+        summary_leased_by=None,
+        summary_lease_expires_at=None
+    )
+    if released:
+        logger.info(f"Released {released} product leases held by {owner}")
+    return released
+
+
+def claimable_count(search_key: str) -> int:
+    return _claimable(search_key, timezone.now()).count()
@@ -0,0 +1,102 @@
+import logging
+import uuid
+from typing import Dict, Iterable, List
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from ..models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryWriter:
+    """
+    Buffers generated summaries and writes them back in batches.
+
+    On PostgreSQL (and SQLite 3.33+) a batch is one UPDATE ... FROM (VALUES ...)
+    statement; other databases fall back to bulk_update. Writing a summary also clears the
+    product's summary lease. Only UUIDs of the products being summarized are
+    accepted, so a UUID the model made up or copied from another chunk is
+    rejected before it can overwrite anything.
+    """
+
+    def __init__(self, allowed_uuids: Iterable[str], batch_size: int = None):
+        self.allowed_uuids = set(allowed_uuids)
+        self.batch_size = batch_size or settings.LLM_WRITE_BATCH_SIZE
+        self.buffer: Dict[str, str] = {}
+        self.written = 0
+        self.rejected = 0
+        self.batches = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def add(self, summary: Dict) -> bool:
+        """Queue a {uuid, summary} for writing; returns False if the UUID is not one being summarized"""
+        key = str(summary.get('uuid', ''))
+        try:
+            key = str(uuid.UUID(key))
+        except ValueError:
+            key = None
+        if key not in self.allowed_uuids or not summary.get('summary'):
+            self.rejected += 1
+            logger.warning(f"Rejected summary for unexpected product UUID {summary.get('uuid')!r}")
+            return False
+        self.buffer[key] = summary['summary']
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        batch, self.buffer = list(self.buffer.items()), {}
+        if not batch:
+            return
+        try:
+            with transaction.atomic():
+                if self._supports_update_from():
+                    updated = self._update_from_values(batch)
+                else:
+                    updated = self._bulk_update(batch)
+            self.written += updated
+            self.batches += 1
+            logger.info(f"Saved batch of {updated} summaries")
+        except Exception as e:
+            logger.error(f"Error saving batch of {len(batch)} summaries: {str(e)}")
+
+    @staticmethod
+    def _supports_update_from() -> bool:
+        if connection.vendor == 'postgresql':
+            return True
+        return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 33)
+
+    def _update_from_values(self, batch: List) -> int:
+        quote = connection.ops.quote_name
+        table = quote(Product._meta.db_table)
+        pk = Product._meta.pk
+        # VALUES columns are untyped text on PostgreSQL, so the uuid needs a cast to compare with the key
+        row = '(%s::uuid, %s)' if connection.vendor == 'postgresql' else '(%s, %s)'
+        params = []
+        for key, summary in batch:
+            params.extend([pk.get_db_prep_value(uuid.UUID(key), connection), summary])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {quote('ai_summary')} = v.summary, "
+                f"{quote('summary_leased_by')} = NULL, {quote('summary_lease_expires_at')} = NULL "
+                f"FROM (SELECT column1 AS uuid, column2 AS summary FROM (VALUES {', '.join([row] * len(batch))}) AS vals) AS v "
+                f"WHERE {table}.{quote(pk.column)} = v.uuid",
+                params
+            )
+            return cursor.rowcount
+
+    def _bulk_update(self, batch: List) -> int:
+        products = [
+            Product(uuid=key, ai_summary=summary, summary_leased_by=None, summary_lease_expires_at=None)
+            for key, summary in batch
+        ]
+        return Product.objects.bulk_update(
+            products, ['ai_summary', 'summary_leased_by', 'summary_lease_expires_at'], batch_size=self.batch_size
+        )
@@ -0,0 +1,38 @@
+import threading
+from typing import Dict, List
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples))) - 1))
+    return samples[index]
+
+
+class Timings:
+    """Collects durations by kind ('request', 'parse', ...) and summarizes them as percentiles"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, seconds: float):
+        with self._lock:
+            self.samples.setdefault(kind, []).append(seconds)
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            samples = {kind: sorted(values) for kind, values in self.samples.items()}
+        return {
+            kind: {
+                'count': len(values),
+                'total_s': round(sum(values), 3),
+                'mean_ms': round(sum(values) / len(values) * 1000, 2),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                'p90_ms': round(percentile(values, 0.90) * 1000, 2),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2),
+            }
+            for kind, values in samples.items() if values
+        }
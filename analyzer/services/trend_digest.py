@@ -0,0 +1,126 @@
+import re
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r'[a-z][a-z0-9+\-]{2,}')
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'you', 'your', 'this', 'that', 'from', 'are', 'has', 'have', 'can',
+    'its', 'all', 'any', 'more', 'into', 'also', 'our', 'not', 'but', 'will', 'than', 'which', 'one',
+    'per', 'upto', 'up', 'while', 'when', 'what', 'each', 'other', 'over', 'out', 'use', 'get', 'make',
+    'new', 'via', 'most', 'just', 'like', 'even', 'only', 'about', 'them', 'they', 'their', 'every',
+    'inch', 'inches', 'cm', 'black', 'silver', 'grey', 'gray', 'blue', 'white', 'model', 'product',
+}
+PRICE_BANDS = 5
+TOP_KEYWORDS = 15
+BAND_KEYWORDS = 5
+# Words in more listings than this are page boilerplate ("see more product details"), not features
+BOILERPLATE_SHARE = 0.8
+
+
+def _document_frequency(word_sets: List[set]) -> Counter:
+    """How many listings mention each word, so a word repeated in one listing counts once"""
+    counts = Counter()
+    for words in word_sets:
+        counts.update(words)
+    return counts
+
+
+def _round(value, digits: int = 2):
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def _correlation(x: np.ndarray, y: np.ndarray) -> float:
+    if len(x) < 3 or np.std(x) == 0 or np.std(y) == 0:
+        return None
+    return _round(np.corrcoef(x, y)[0, 1], 3)
+
+
+def _ranks(values: np.ndarray) -> np.ndarray:
+    """Ranks with ties sharing their average rank, as Spearman's coefficient expects"""
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values, kind='mergesort')] = np.arange(len(values))
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    return np.bincount(inverse, weights=ranks)[inverse] / counts[inverse]
+
+
+def build_trend_digest(products: List[Dict]) -> Dict:
+    """
+    Summarize a catalogue into a fixed-size digest for trend analysis
+
+    Args:
+        products: Dicts with name, description, price and rating (None when unrated)
+
+    The digest holds overall price statistics, PRICE_BANDS quantile price bands
+    with their rating statistics and distinctive keywords, Pearson and Spearman
+    price/rating correlation, and the TOP_KEYWORDS most common feature words.
+    Its size does not grow with the number of products.
+    """
+    if not products:
+        return {'product_count': 0}
+
+    prices = np.array([float(p['price']) for p in products])
+    ratings = np.array([float(p['rating']) if p.get('rating') else np.nan for p in products])
+    rated = ~np.isnan(ratings)
+    word_sets = [
+        set(WORD_PATTERN.findall(f"{p.get('name') or ''} {p.get('description') or ''}".lower())) - STOPWORDS
+        for p in products
+    ]
+    keywords = _document_frequency(word_sets)
+    boilerplate = {word for word, count in keywords.items() if count > BOILERPLATE_SHARE * len(products)}
+    for word in boilerplate:
+        del keywords[word]
+
+    # Quantile edges give bands with similar product counts whatever the price distribution
+    edges = np.unique(np.quantile(prices, np.linspace(0, 1, PRICE_BANDS + 1)))
+    band_of = np.clip(np.searchsorted(edges, prices, side='right') - 1, 0, max(len(edges) - 2, 0))
+
+    bands = []
+    for band in range(max(len(edges) - 1, 1)):
+        members = band_of == band
+        band_ratings = ratings[members & rated]
+        band_keywords = _document_frequency([words for words, member in zip(word_sets, members) if member])
+        # Rank by over-representation against the whole catalogue, so bands show what sets them apart
+        size = max(int(members.sum()), 1)
+        distinctive = sorted(
+            (word for word, count in band_keywords.items() if count > 1 and word not in boilerplate),
+            key=lambda word: band_keywords[word] / size - keywords[word] / len(products),
+            reverse=True
+        )
+        bands.append({
+            'price_from': _round(prices[members].min()) if members.any() else None,
+            'price_to': _round(prices[members].max()) if members.any() else None,
+            'products': int(members.sum()),
+            'median_price': _round(np.median(prices[members])) if members.any() else None,
+            'rated_products': int(len(band_ratings)),
+            'mean_rating': _round(band_ratings.mean()) if len(band_ratings) else None,
+            'share_rated_4_plus': _round((band_ratings >= 4).mean()) if len(band_ratings) else None,
+            'distinctive_keywords': distinctive[:BAND_KEYWORDS],
+        })
+
+    return {
+        'product_count': len(products),
+        'rated_count': int(rated.sum()),
+        'price': {
+            'min': _round(prices.min()),
+            'p25': _round(np.percentile(prices, 25)),
+            'median': _round(np.median(prices)),
+            'p75': _round(np.percentile(prices, 75)),
+            'max': _round(prices.max()),
+            'mean': _round(prices.mean()),
+        },
+        'rating': {
+            'mean': _round(ratings[rated].mean()) if rated.any() else None,
+            'median': _round(np.median(ratings[rated])) if rated.any() else None,
+        },
+        'price_bands': bands,
+        'price_rating_correlation': {
+            'pearson': _correlation(prices[rated], ratings[rated]),
+            'spearman': _correlation(_ranks(prices[rated]), _ranks(ratings[rated])),
+        },
+        'top_keywords': [
+            {'keyword': word, 'share_of_products': _round(count / len(products))}
+            for word, count in keywords.most_common(TOP_KEYWORDS)
+        ],
+    }
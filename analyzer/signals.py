@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Product
+from .services.search_key_stats import record_delete
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_key_stats(sender, instance, **kwargs):
+    record_delete(instance)
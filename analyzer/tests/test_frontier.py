@@ -0,0 +1,168 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from tenacity import wait_none
+
+from analyzer.management.commands.run_scraper import AsyncAmazonScraper
+from analyzer.models import FrontierURL, HostRateLimit, Job, Product
+from analyzer.services.fake_amazon import FakeAmazonServer
+from analyzer.services.frontier import (
+    DatabaseRateLimiter, claim_batch, complete, enqueue_urls, fail, frontier_counts, process_frontier_batch
+)
+from analyzer.services.rate_limiter import AdaptiveController
+
+from .test_scraping import CATALOGUE, FAST_SCRAPER
+
+ORIGIN = 'http://127.0.0.1:8000'
+
+
+def urls(*asins):
+    return [f'{ORIGIN}/{asin}/dp/{asin}' for asin in asins]
+
+
+class EnqueueUrlsTests(TestCase):
+    def setUp(self):
+        self.running = Job.objects.create(kind=Job.KIND_SCRAPE, status=Job.STATUS_RUNNING)
+        self.job = Job.objects.create(kind=Job.KIND_SCRAPE, status=Job.STATUS_RUNNING)
+
+    def test_pending_entries_of_an_active_job_stay_with_it(self):
+        enqueue_urls(urls('B000000001', 'B000000002'), 'laptops', job=self.running)
+        enqueue_urls(urls('B000000002', 'B000000003'), 'laptops', job=self.job)
+        self.assertEqual(frontier_counts(self.running)[FrontierURL.STATUS_PENDING], 2)
+        self.assertEqual(frontier_counts(self.job)[FrontierURL.STATUS_PENDING], 1)
+
+    def test_finished_and_orphaned_entries_are_taken_over(self):
+        enqueue_urls(urls('B000000001', 'B000000002', 'B000000003'), 'laptops', job=self.running)
+        done, failed = sorted(claim_batch('worker-1', size=2), key=lambda entry: entry.asin)
+        complete('worker-1', [done])
+        FrontierURL.objects.filter(pk=failed.pk).update(attempts=99)
+        fail('worker-1', [failed], 'broken')
+        self.running.status = Job.STATUS_FAILED
+        self.running.save()
+
+        enqueue_urls(urls('B000000001', 'B000000002', 'B000000003'), 'laptops', job=self.job)
+        self.assertEqual(frontier_counts(self.job)[FrontierURL.STATUS_PENDING], 3)
+        self.assertFalse(FrontierURL.objects.filter(attempts__gt=0).exists())
+
+    def test_leased_entries_stay_with_their_worker(self):
+        enqueue_urls(urls('B000000001'), 'laptops')
+        claim_batch('worker-1')
+        enqueue_urls(urls('B000000001'), 'laptops', job=self.job)
+        entry = FrontierURL.objects.get()
+        self.assertEqual(entry.status, FrontierURL.STATUS_LEASED)
+        self.assertIsNone(entry.job)
+
+
+@override_settings(FRONTIER_MAX_ATTEMPTS=2)
+class ClaimBatchTests(TestCase):
+    def setUp(self):
+        enqueue_urls(urls('B000000001', 'B000000002', 'B000000003'), 'laptops')
+
+    def test_workers_get_different_entries(self):
+        first = claim_batch('worker-1', size=2)
+        second = claim_batch('worker-2', size=2)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({entry.pk for entry in first} & {entry.pk for entry in second})
+        self.assertEqual(claim_batch('worker-3'), [])
+
+    def test_expired_leases_are_claimed_again(self):
+        claim_batch('worker-1')
+        FrontierURL.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        entries = claim_batch('worker-2')
+        self.assertEqual(len(entries), 3)
+        self.assertEqual({entry.attempts for entry in entries}, {2})
+
+        # Out of attempts once this lease runs out as well
+        FrontierURL.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_batch('worker-3'), [])
+        self.assertEqual(set(FrontierURL.objects.values_list('status', flat=True)), {FrontierURL.STATUS_FAILED})
+
+    def test_failed_entries_are_retried_until_attempts_run_out(self):
+        fail('worker-1', claim_batch('worker-1'), 'HTTP 503')
+        self.assertEqual(set(FrontierURL.objects.values_list('status', flat=True)), {FrontierURL.STATUS_PENDING})
+        fail('worker-1', claim_batch('worker-1'), 'HTTP 503')
+        self.assertEqual(set(FrontierURL.objects.values_list('status', flat=True)), {FrontierURL.STATUS_FAILED})
+        self.assertEqual(set(FrontierURL.objects.values_list('last_error', flat=True)), {'HTTP 503'})
+
+    def test_a_reclaimed_entry_stays_with_its_new_holder(self):
+        stale = claim_batch('worker-1')
+        FrontierURL.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        reclaimed = claim_batch('worker-2', size=2)
+
+        # worker-1 only still holds the entry nobody reclaimed
+        finished = complete('worker-1', stale)
+        self.assertEqual([entry.pk for entry in finished], [stale[2].pk])
+        self.assertEqual(fail('worker-1', stale, 'HTTP 503'), [])
+        for entry in FrontierURL.objects.filter(pk__in=[entry.pk for entry in reclaimed]):
+            self.assertEqual((entry.status, entry.leased_by), (FrontierURL.STATUS_LEASED, 'worker-2'))
+
+        self.assertEqual(len(complete('worker-2', reclaimed)), 2)
+        self.assertEqual(set(FrontierURL.objects.values_list('status', flat=True)), {FrontierURL.STATUS_DONE})
+
+
+@override_settings(**FAST_SCRAPER)
+class ProcessFrontierBatchTests(TestCase):
+    def test_leased_pages_are_scraped_and_saved(self):
+        job = Job.objects.create(kind=Job.KIND_SCRAPE, status=Job.STATUS_RUNNING)
+        with FakeAmazonServer(products=CATALOGUE) as server, \
+                mock.patch.object(AsyncAmazonScraper._fetch.retry, 'wait', wait_none()):
+            found = [f"{server.origin}/dp/{p['asin']}" for p in CATALOGUE[:5]]
+            enqueue_urls(found + [f"{server.origin}/dp/B0MISSING0"], 'laptops', job=job)
+            result = process_frontier_batch('worker-1', AsyncAmazonScraper(origin=server.origin), size=10)
+        self.assertEqual(result, {'claimed': 6, 'done': 5, 'failed': 1, 'lost': 0, 'near_duplicates': 0})
+        self.assertEqual(set(Product.objects.values_list('asin', flat=True)), {p['asin'] for p in CATALOGUE[:5]})
+        counts = frontier_counts(job)
+        self.assertEqual(counts[FrontierURL.STATUS_DONE], 5)
+        # A 404 is released for another attempt
+        self.assertEqual(counts[FrontierURL.STATUS_PENDING], 1)
+
+    def test_pages_whose_lease_was_lost_are_not_written(self):
+        def complete_after_takeover(worker, entries):
+            # Another worker takes the batch over while this one was still fetching it
+            FrontierURL.objects.update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+            claim_batch('worker-2')
+            return complete(worker, entries)
+
+        with FakeAmazonServer(products=CATALOGUE) as server, \
+                mock.patch('analyzer.services.frontier.complete', complete_after_takeover):
+            enqueue_urls([f"{server.origin}/dp/{p['asin']}" for p in CATALOGUE[:3]], 'laptops')
+            result = process_frontier_batch('worker-1', AsyncAmazonScraper(origin=server.origin))
+        self.assertEqual((result['done'], result['lost']), (0, 3))
+        self.assertFalse(Product.objects.exists())
+        self.assertEqual(set(FrontierURL.objects.values_list('leased_by', flat=True)), {'worker-2'})
+
+
+class DatabaseRateLimiterTests(TransactionTestCase):
+    def setUp(self):
+        self.workers = [DatabaseRateLimiter(rate=1.0, capacity=1) for _ in range(2)]
+        for limiter in self.workers:
+            self.addCleanup(limiter.close)
+
+    def test_rate_changes_reach_every_worker(self):
+        first, second = self.workers
+        url = urls('B000000001')[0]
+        first.reserve(url)
+        second.reserve(url)
+        first.set_rate(0.25).result()
+        self.assertEqual(HostRateLimit.objects.get().rate, 0.25)
+
+        # The bucket is empty, so the next token is a whole interval away at the new rate
+        self.assertAlmostEqual(second.reserve(url), 2 / 0.25, delta=0.2)
+        self.assertEqual(second.rate, 0.25)
+
+    def test_adaptive_cut_starts_from_the_shared_rate(self):
+        first, second = self.workers
+        url = urls('B000000001')[0]
+        first.reserve(url)
+        second.reserve(url)
+        controller = AdaptiveController(second, concurrency=4, rate=1.0, min_rate=0.01)
+        first.set_rate(0.4).result()
+        second.reserve(url)
+        controller.on_throttle(controller._epoch, 'HTTP 503')
+        # Wait for the write the controller queued on the limiter's thread
+        second._executor.submit(lambda: None).result()
+        self.assertAlmostEqual(controller.rate, 0.2)
+        self.assertAlmostEqual(HostRateLimit.objects.get().rate, 0.2)
@@ -0,0 +1,165 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase, override_settings
+
+from analyzer.services.fake_groq import FakeGroqServer
+from analyzer.services.groq_client import GroqClient
+from analyzer.services.hedging import LatencyTracker, Superseded, run_hedged
+from analyzer.services.llm_rate_limiter import RateLimitTracker
+
+
+class LatencyTrackerTests(SimpleTestCase):
+    def test_no_deadline_until_warmed_up(self):
+        tracker = LatencyTracker(min_samples=3)
+        tracker.record(0.1)
+        tracker.record(0.1)
+        self.assertIsNone(tracker.deadline(0.9))
+        tracker.record(0.1)
+        self.assertIsNotNone(tracker.deadline(0.9))
+
+    def test_stalls_do_not_drag_the_capped_deadline_out(self):
+        tracker = LatencyTracker(min_samples=10)
+        for _ in range(85):
+            tracker.record(0.3)
+        for _ in range(15):
+            tracker.record(2.3)
+        self.assertAlmostEqual(tracker.deadline(0.9), 2.3)
+        self.assertAlmostEqual(tracker.deadline(0.9, max_multiple=2), 0.6)
+
+
+class RunHedgedTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_fast_primary_is_not_hedged(self):
+        calls = []
+
+        def call(attempt):
+            calls.append(attempt.backup)
+            attempt.sent.set()
+            return 'primary'
+
+        self.assertEqual(run_hedged(call, 0.5, self.executor), ('primary', None))
+        self.assertEqual(calls, [False])
+
+    def test_backup_wins_over_a_stalled_primary(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        discarded, abandoned = [], []
+
+        def call(attempt):
+            attempt.sent.set()
+            if not attempt.backup:
+                release.wait(5)
+                return 'primary'
+            return 'backup'
+
+        started = time.monotonic()
+        result = run_hedged(call, 0.05, self.executor, discard=discarded.append, abandon=abandoned.append)
+        self.assertEqual(result, ('backup', 'backup'))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual([a.backup for a in abandoned], [False])
+        release.set()
+        self.executor.shutdown(wait=True)
+        self.assertEqual(discarded, ['primary'])
+
+    def test_refused_backup_leaves_the_primary_unhedged(self):
+        def call(attempt):
+            if attempt.backup:
+                raise Superseded()
+            attempt.sent.set()
+            time.sleep(0.1)
+            return 'primary'
+
+        self.assertEqual(run_hedged(call, 0.01, self.executor), ('primary', None))
+
+    def test_primary_error_is_raised_when_the_backup_was_refused(self):
+        def call(attempt):
+            if attempt.backup:
+                raise Superseded()
+            attempt.sent.set()
+            time.sleep(0.1)
+            raise ValueError('primary failed')
+
+        with self.assertRaisesMessage(ValueError, 'primary failed'):
+            run_hedged(call, 0.01, self.executor)
+
+
+class HedgeCapacityTests(SimpleTestCase):
+    def test_hedges_have_their_own_slots(self):
+        limiter = RateLimitTracker(max_in_flight=1, hedge_slots=1)
+        regular = limiter.acquire(100)
+        hedge = limiter.try_acquire_hedge(100)
+        self.assertIsNotNone(hedge)
+        self.assertIsNone(limiter.try_acquire_hedge(100))
+        limiter.release(hedge)
+        self.assertIsNotNone(limiter.try_acquire_hedge(100))
+        limiter.release(regular)
+
+    def test_no_hedges_without_slots(self):
+        limiter = RateLimitTracker(max_in_flight=4)
+        self.assertIsNone(limiter.try_acquire_hedge(100))
+
+    def test_hedges_count_against_the_minute_budget(self):
+        limiter = RateLimitTracker(max_in_flight=4, requests_per_minute=2, tokens_per_minute=1000, hedge_slots=2)
+        limiter.release(limiter.acquire(100))
+        limiter.release(limiter.try_acquire_hedge(100))
+        # Both requests are in the window, so a further hedge would go over the limit
+        self.assertIsNone(limiter.try_acquire_hedge(100))
+        self.assertEqual(limiter.stats()['hedges'], 1)
+        self.assertEqual(limiter.stats()['hedges_refused'], 1)
+
+    def test_no_hedge_while_a_regular_request_waits(self):
+        limiter = RateLimitTracker(max_in_flight=1, hedge_slots=2)
+        held = limiter.acquire(100)
+        acquired = threading.Event()
+
+        def waiter():
+            limiter.release(limiter.acquire(100))
+            acquired.set()
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        deadline = time.monotonic() + 2
+        while not limiter._waiting and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(limiter.try_acquire_hedge(100))
+        limiter.release(held)
+        thread.join(2)
+        self.assertTrue(acquired.is_set())
+
+
+@override_settings(LLM_HEDGE_MIN_SAMPLES=5, LLM_HEDGE_PERCENTILE=0.9, LLM_HEDGE_MAX_MEDIAN_MULTIPLE=2)
+class GroqClientHedgingTests(SimpleTestCase):
+    STALL_SECONDS = 0.4
+    REQUESTS = 30
+    WARMUP = 5
+
+    def stream_latencies(self, hedge: bool):
+        with FakeGroqServer(latency=0.02, stall_rate=0.3, stall_seconds=self.STALL_SECONDS, seed=7) as server, \
+                override_settings(LLM_HEDGE_ENABLED=hedge):
+            client = GroqClient(
+                rate_limiter=RateLimitTracker(max_in_flight=1, hedge_slots=1 if hedge else 0),
+                base_url=server.origin,
+                api_key='fake-groq-key'
+            )
+            latencies = []
+            for _ in range(self.REQUESTS):
+                started = time.monotonic()
+                self.assertTrue(''.join(client.stream_completion('Digest: {}', max_tokens=200)))
+                latencies.append(time.monotonic() - started)
+        return latencies[self.WARMUP:], client.stats(), server.counters
+
+    def test_hedging_cuts_the_stalled_tail(self):
+        plain, _, plain_counters = self.stream_latencies(hedge=False)
+        hedged, stats, counters = self.stream_latencies(hedge=True)
+        self.assertGreater(plain_counters['stalled'], 3)
+        self.assertGreater(stats['hedges_won'], 0)
+        slow = lambda latencies: sum(1 for latency in latencies if latency >= self.STALL_SECONDS)
+        # Only requests whose copy stalled as well are still slow
+        self.assertLess(slow(hedged), slow(plain) / 2)
+        self.assertLess(max(hedged), max(plain) + 0.1)
+        self.assertEqual(counters['requests'], self.REQUESTS + stats['hedged'])
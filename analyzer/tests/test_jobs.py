@@ -0,0 +1,135 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from analyzer.models import Job, Product
+from analyzer.services.fake_groq import FakeGroqServer
+from analyzer.services.jobs import HANDLERS, JobProgress, claim_next_job, enqueue, requeue_stale_jobs, run_job
+from analyzer.services.summary_leases import claim_products, claimable_count, release_products
+
+from .test_llm_service import FAST_LLM, make_products
+
+
+class JobQueueTests(TestCase):
+    def test_oldest_queued_job_is_claimed(self):
+        first = enqueue(Job.KIND_SCRAPE, {'search_term': 'laptops'})
+        second = enqueue(Job.KIND_PROCESS, {'search_key': 'laptops'})
+        claimed = claim_next_job('worker-1')
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual((claimed.status, claimed.worker, claimed.attempts), (Job.STATUS_RUNNING, 'worker-1', 1))
+        self.assertEqual(claim_next_job('worker-2').pk, second.pk)
+        self.assertIsNone(claim_next_job('worker-3'))
+
+    @override_settings(JOB_STALE_SECONDS=60, JOB_MAX_ATTEMPTS=2)
+    def test_stale_jobs_are_requeued_until_attempts_run_out(self):
+        enqueue(Job.KIND_SCRAPE, {})
+        job = claim_next_job('worker-1')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.STATUS_QUEUED, None))
+
+        job = claim_next_job('worker-2')
+        self.assertEqual(job.attempts, 2)
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (Job.STATUS_FAILED, 'Worker stopped responding'))
+
+    def test_live_jobs_are_left_alone(self):
+        enqueue(Job.KIND_SCRAPE, {})
+        job = claim_next_job('worker-1')
+        self.assertEqual(requeue_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_RUNNING)
+
+
+class SummaryLeaseTests(TestCase):
+    def setUp(self):
+        Product.objects.bulk_create([
+            Product(
+                name=f"Laptop {i}", price=Decimal('100.00'), description="A laptop",
+                url=f"https://www.amazon.in/dp/B00000000{i}", asin=f"B00000000{i}", search_key='laptops'
+            )
+            for i in range(5)
+        ])
+
+    def test_jobs_split_the_products(self):
+        first = claim_products('laptops', 'job-1', size=3)
+        second = claim_products('laptops', 'job-2', size=3)
+        self.assertEqual((len(first), len(second)), (3, 2))
+        self.assertFalse({p.pk for p in first} & {p.pk for p in second})
+        self.assertEqual(claimable_count('laptops'), 0)
+
+    def test_released_and_expired_leases_are_claimable(self):
+        claim_products('laptops', 'job-1', size=2)
+        claim_products('laptops', 'job-2', size=3, lease_seconds=60)
+        self.assertEqual(release_products('job-1'), 2)
+        self.assertEqual(claimable_count('laptops'), 2)
+        Product.objects.filter(summary_leased_by='job-2').update(
+            summary_lease_expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(len(claim_products('laptops', 'job-3')), 5)
+
+
+@override_settings(**FAST_LLM, JOB_HEARTBEAT_SECONDS=0.05)
+class RunJobTests(TransactionTestCase):
+    def test_process_job_summarizes_its_search_key(self):
+        make_products()
+        enqueue(Job.KIND_PROCESS, {'search_key': 'laptops'})
+        job = claim_next_job('worker-1')
+        with FakeGroqServer() as server, self.settings(LLM_BASE_URL=server.origin, GROQ_API_KEY='fake-groq-key'):
+            run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertFalse(Product.objects.filter(ai_summary__isnull=True).exists())
+        self.assertFalse(Product.objects.filter(summary_leased_by__isnull=False).exists())
+        self.assertEqual(job.result['summaries']['summaries'], Product.objects.count())
+        self.assertEqual(job.llm_calls.filter(call_type='trends').count(), 1)
+
+    def test_failure_is_recorded(self):
+        job = Job.objects.create(kind='unknown', status=Job.STATUS_RUNNING)
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(JOB_STALE_SECONDS=60)
+    def test_a_requeued_attempt_keeps_what_the_new_one_writes(self):
+        enqueue(Job.KIND_PROCESS, {'search_key': 'laptops'})
+        stale = claim_next_job('worker-1')
+        Job.objects.filter(pk=stale.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+        requeue_stale_jobs()
+        current = claim_next_job('worker-2')
+        current.progress = {'processed': 5}
+        Job.objects.filter(pk=current.pk).update(progress=current.progress)
+
+        def handler(job, progress):
+            progress(1, 10)
+            # Long enough for a few heartbeats
+            time.sleep(0.2)
+            return {'from': 'worker-1'}
+
+        with mock.patch.dict(HANDLERS, {Job.KIND_PROCESS: handler}):
+            run_job(stale)
+        job = Job.objects.get(pk=current.pk)
+        self.assertEqual((job.status, job.worker, job.attempts), (Job.STATUS_RUNNING, 'worker-2', 2))
+        self.assertEqual(job.progress, {'processed': 5})
+        self.assertIsNone(job.result)
+        self.assertEqual(job.heartbeat_at, current.heartbeat_at)
+
+    def test_heartbeats_stop_once_the_job_is_taken_over(self):
+        enqueue(Job.KIND_PROCESS, {})
+        job = claim_next_job('worker-1')
+        with JobProgress(job) as progress:
+            progress(1, 10)
+            time.sleep(0.12)
+            self.assertEqual(Job.objects.get(pk=job.pk).progress['processed'], 1)
+            Job.objects.filter(pk=job.pk).update(worker='worker-2', attempts=2, progress={})
+            time.sleep(0.12)
+            self.assertFalse(progress._thread.is_alive())
+        self.assertEqual(Job.objects.get(pk=job.pk).progress, {})
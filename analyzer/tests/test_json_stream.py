@@ -0,0 +1,88 @@
+import json
+
+from django.test import SimpleTestCase
+
+from analyzer.services.json_stream import JsonArrayStream, salvage_json
+
+ITEMS = [
+    {'uuid': 'a', 'summary': 'Brackets [like] {these} and "quotes" stay inside strings'},
+    {'uuid': 'b', 'summary': 'Second'},
+    {'uuid': 'c', 'summary': 'Third'},
+]
+CLEAN = json.dumps(ITEMS, indent=2)
+
+
+def parse(text, piece=7):
+    parser = JsonArrayStream()
+    items = []
+    for start in range(0, len(text), piece):
+        items += parser.feed(text[start:start + piece])
+    return parser, items
+
+
+class JsonArrayStreamTests(SimpleTestCase):
+    def test_items_arrive_as_they_complete(self):
+        parser = JsonArrayStream()
+        first_item_end = CLEAN.index('\n  }') + len('\n  }')
+        self.assertEqual(parser.feed(CLEAN[:first_item_end - 1]), [])
+        self.assertEqual(parser.feed(CLEAN[first_item_end - 1:first_item_end + 1]), ITEMS[:1])
+        self.assertEqual(parser.feed(CLEAN[first_item_end + 1:]), ITEMS[1:])
+        self.assertTrue(parser.complete)
+
+    def test_clean_and_wrapped_arrays_are_not_salvaged(self):
+        for text in (CLEAN, json.dumps({'summaries': ITEMS, 'note': 'done ]'})):
+            for piece in (1, 7, len(text)):
+                with self.subTest(text=text[:20], piece=piece):
+                    parser, items = parse(text, piece)
+                    self.assertEqual(items, ITEMS)
+                    self.assertTrue(parser.complete)
+                    self.assertFalse(parser.salvaged)
+
+    def test_repairs_are_reported(self):
+        cases = {
+            'fence': (f'Here are the summaries:\n```json\n{CLEAN}\n```', 0, True),
+            'prose': (f'{CLEAN}\n\nLet me know if you need anything else.', 0, True),
+            'trailing comma in items': (CLEAN.replace('"\n  }', '",\n  }'), 3, False),
+            'trailing comma in array': (CLEAN[:-2] + ',\n]', 1, False),
+        }
+        for name, (text, repaired, extra_text) in cases.items():
+            for piece in (1, 7, len(text)):
+                with self.subTest(name, piece=piece):
+                    parser, items = parse(text, piece)
+                    self.assertEqual(items, ITEMS)
+                    self.assertEqual(parser.repaired, repaired)
+                    self.assertEqual(parser.extra_text, extra_text)
+                    self.assertTrue(parser.salvaged)
+
+    def test_brackets_in_a_preamble_are_skipped(self):
+        for text in (
+            f'The summaries, see [below] and [1]:\n{CLEAN}',
+            json.dumps({'note': 'done', 'tags': ['a', 'b'], 'summaries': ITEMS}),
+        ):
+            for piece in (1, 7, len(text)):
+                with self.subTest(text=text[:20], piece=piece):
+                    parser, items = parse(text, piece)
+                    self.assertEqual(items, ITEMS)
+                    self.assertTrue(parser.complete)
+                    self.assertEqual(parser.skipped, 0)
+
+    def test_broken_item_is_skipped(self):
+        text = CLEAN.replace('"Second"', '"Second" oops')
+        parser, items = parse(text)
+        self.assertEqual(items, [ITEMS[0], ITEMS[2]])
+        self.assertEqual(parser.skipped, 1)
+        self.assertTrue(parser.salvaged)
+
+    def test_truncated_array_keeps_completed_items(self):
+        parser, items = parse(CLEAN[:CLEAN.index('Third')])
+        self.assertEqual(items, ITEMS[:2])
+        self.assertFalse(parser.complete)
+
+
+class SalvageJsonTests(SimpleTestCase):
+    def test_salvages_near_json(self):
+        self.assertEqual(salvage_json(f'```json\n{CLEAN}\n```'), ITEMS)
+        self.assertEqual(salvage_json('{"summary": "x",}'), {'summary': 'x'})
+        self.assertEqual(salvage_json(CLEAN[:CLEAN.index('Third')]), ITEMS[:2])
+        self.assertIsNone(salvage_json('no json here'))
+        self.assertEqual(salvage_json(f'See [below]:\n{CLEAN[:CLEAN.index("Third")]}'), ITEMS[:2])
@@ -0,0 +1,32 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from analyzer.models import Job, LLMCall
+
+
+class LLMMetricsViewTests(TestCase):
+    def setUp(self):
+        self.job = Job.objects.create(kind=Job.KIND_PROCESS)
+        for job in (self.job, None):
+            LLMCall.objects.create(call_type='summary', search_key='laptop', job=job, model='test', latency_ms=100)
+
+    def test_filters_by_job(self):
+        response = self.client.get(reverse('llm-metrics'), {'job': str(self.job.uuid)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([group['calls'] for group in response.json()['results']], [1])
+
+    def test_job_must_be_a_uuid(self):
+        response = self.client.get(reverse('llm-metrics'), {'job': 'not-a-uuid'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'job must be a UUID'})
+
+    def test_hours_must_be_a_number(self):
+        response = self.client.get(reverse('llm-metrics'), {'hours': 'a day'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_hours_must_be_positive_and_finite(self):
+        for hours in ('nan', 'inf', '-inf', '0', '-1', '1e300'):
+            with self.subTest(hours=hours):
+                response = self.client.get(reverse('llm-metrics'), {'hours': hours})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'error': 'hours must be a positive number'})
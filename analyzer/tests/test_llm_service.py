@@ -0,0 +1,187 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from analyzer.models import LLMCall, Product, ProductTrend, SummaryCache
+from analyzer.services.fake_amazon import load_products
+from analyzer.services.fake_groq import FakeGroqServer, fake_summary
+from analyzer.services.groq_client import GroqClient
+from analyzer.services.llm_rate_limiter import RateLimitTracker
+from analyzer.services.llm_service import LLMService
+from analyzer.services.summary_leases import claim_products
+
+CATALOGUE = load_products()[:12]
+
+# Limits that never hold a test up; the fake server enforces its own where a test wants them
+FAST_LLM = dict(
+    LLM_REQUESTS_PER_MINUTE=10000,
+    LLM_TOKENS_PER_MINUTE=10000000,
+    LLM_HEDGE_ENABLED=False,
+    LLM_RETRY_BASE_SECONDS=0.01,
+)
+
+
+def make_products(search_key='laptops', catalogue=CATALOGUE):
+    return Product.objects.bulk_create([
+        Product(
+            name=p['name'], price=Decimal(str(p['price'])), rating=p.get('rating'), description=p['description'],
+            url=f"https://www.amazon.in/dp/{p['asin']}", asin=p['asin'], search_key=search_key
+        )
+        for p in catalogue
+    ])
+
+
+@override_settings(**FAST_LLM)
+class ProcessProductsTests(TestCase):
+    def process(self, server, products=None, **kwargs):
+        service = LLMService(base_url=server.origin, api_key='fake-groq-key', **kwargs)
+        return service, service.process_products(products or list(Product.objects.all()))
+
+    def assertAllSummarized(self):
+        for product in Product.objects.all():
+            self.assertEqual(product.ai_summary, fake_summary(LLMService._product_payload(product)))
+
+    def test_products_get_summaries_and_trends(self):
+        make_products()
+        with FakeGroqServer() as server:
+            service, trends = self.process(server)
+        self.assertAllSummarized()
+        self.assertEqual(list(ProductTrend.objects.values_list('search_key', flat=True)), ['laptops'])
+        self.assertEqual(len(trends['trend_analysis']['trends']), 3)
+        calls = LLMCall.objects.all()
+        self.assertEqual({call.outcome for call in calls}, {LLMCall.OUTCOME_OK})
+        self.assertEqual(calls.filter(call_type='summary').count(), service.summary_stats()['requests'])
+        self.assertEqual(calls.filter(call_type='trends').count(), 1)
+
+    def test_malformed_json_is_salvaged(self):
+        make_products()
+        with FakeGroqServer(malformed_rate=1, malformations=('fence', 'prose', 'trailing_comma'), seed=1) as server:
+            service, _ = self.process(server)
+        self.assertAllSummarized()
+        self.assertEqual(service.summary_stats()['retried_products'], 0)
+        outcomes = set(LLMCall.objects.values_list('outcome', flat=True))
+        self.assertEqual(outcomes, {LLMCall.OUTCOME_SALVAGED})
+
+    @override_settings(LLM_SUMMARY_RETRIES=5)
+    def test_truncated_responses_keep_their_complete_items(self):
+        make_products()
+        with FakeGroqServer(malformed_rate=0.5, malformations=('truncate',), seed=2) as server:
+            service, _ = self.process(server)
+        self.assertGreater(server.counters['malformed'], 0)
+        self.assertAllSummarized()
+        self.assertGreater(service.summary_stats()['retried_products'], 0)
+        self.assertTrue(LLMCall.objects.filter(call_type='summary', outcome=LLMCall.OUTCOME_TRUNCATED).exists())
+
+    @override_settings(LLM_SUMMARY_RETRIES=5)
+    def test_skipped_products_are_retried(self):
+        make_products()
+        with FakeGroqServer(skip_rate=0.3, seed=3) as server:
+            service, _ = self.process(server)
+        self.assertGreater(server.counters['skipped_products'], 0)
+        self.assertAllSummarized()
+        self.assertEqual(service.summary_stats()['retried_products'], server.counters['skipped_products'])
+
+    @override_settings(LLM_SUMMARY_RETRIES=1, LLM_MAX_IN_FLIGHT=2)
+    def test_a_failed_chunk_is_retried_with_the_leftovers(self):
+        make_products()
+        generate = LLMService._generate_product_summaries
+        calls = []
+
+        def fail_first(service, products_data, *args, **kwargs):
+            calls.append(len(products_data))
+            if len(calls) == 1:
+                raise RuntimeError('connection reset')
+            return generate(service, products_data, *args, **kwargs)
+
+        with FakeGroqServer() as server, \
+                mock.patch.object(LLMService, '_generate_product_summaries', fail_first):
+            service, trends = self.process(server)
+        self.assertAllSummarized()
+        self.assertIsNotNone(trends)
+        stats = service.summary_stats()
+        self.assertEqual(stats['failed_requests'], 1)
+        self.assertEqual(stats['retried_products'], calls[0])
+
+    @override_settings(LLM_SUMMARY_RETRIES=0)
+    def test_products_left_without_a_summary_stay_unsummarized(self):
+        make_products()
+        with FakeGroqServer(skip_rate=1) as server:
+            self.process(server)
+        self.assertFalse(Product.objects.filter(ai_summary__isnull=False).exists())
+
+    def test_stalled_responses_still_arrive(self):
+        make_products()
+        with FakeGroqServer(stall_rate=0.5, stall_seconds=0.2, seed=4) as server:
+            self.process(server)
+        self.assertGreater(server.counters['stalled'], 0)
+        self.assertAllSummarized()
+
+    def test_cached_summaries_need_no_request(self):
+        make_products()
+        with FakeGroqServer() as server:
+            self.process(server)
+            requests = server.counters['requests']
+            self.assertEqual(SummaryCache.objects.count(), len(CATALOGUE))
+            # The same products under another search key
+            make_products('notebooks')
+            service, _ = self.process(server, list(Product.objects.filter(search_key='notebooks')))
+            # Only the trends request
+            self.assertEqual(server.counters['requests'], requests + 1)
+        self.assertAllSummarized()
+        self.assertEqual(service.summary_cache.stats()['hits'], len(CATALOGUE))
+
+    @override_settings(LLM_INPUT_TOKEN_BUDGET=600)
+    def test_trimmed_products_hit_the_cache(self):
+        long = [dict(p, description=' '.join([p['description']] * 8)) for p in CATALOGUE[:2]]
+        make_products(catalogue=long)
+        with FakeGroqServer() as server:
+            self.process(server)
+            requests = server.counters['requests']
+            make_products('notebooks', catalogue=long)
+            service, _ = self.process(server, list(Product.objects.filter(search_key='notebooks')))
+            self.assertEqual(server.counters['requests'], requests + 1)
+        self.assertEqual(service.summary_cache.stats()['hits'], 2)
+        self.assertFalse(Product.objects.filter(ai_summary__isnull=True).exists())
+
+    def test_process_search_key_releases_its_leases(self):
+        make_products()
+        claim_products('laptops', 'other-job', size=4, lease_seconds=600)
+        with FakeGroqServer() as server:
+            service = LLMService(base_url=server.origin, api_key='fake-groq-key')
+            service.process_search_key('laptops', owner='this-job')
+        # Products leased to another live job are left to it
+        unsummarized = Product.objects.filter(ai_summary__isnull=True)
+        self.assertEqual(set(unsummarized.values_list('summary_leased_by', flat=True)), {'other-job'})
+        self.assertEqual(unsummarized.count(), 4)
+        self.assertFalse(Product.objects.filter(summary_leased_by='this-job').exists())
+
+
+@override_settings(**FAST_LLM)
+class RateLimitTests(TestCase):
+    def test_429_is_retried_after_the_pause_it_asks_for(self):
+        with FakeGroqServer(rate_limit_rate=0.3, seed=1) as server:
+            limiter = RateLimitTracker(max_in_flight=1)
+            client = GroqClient(rate_limiter=limiter, base_url=server.origin, api_key='fake-groq-key')
+            with self.settings(LLM_RETRY_ATTEMPTS=10):
+                for _ in range(3):
+                    self.assertTrue(''.join(client.stream_completion('Digest: {}', max_tokens=200)))
+        self.assertGreater(server.counters['rate_limited'], 0)
+        self.assertEqual(limiter.stats()['rate_limited'], server.counters['rate_limited'])
+        self.assertEqual(server.counters['requests'], 3 + server.counters['rate_limited'])
+
+    def test_provider_limits_are_learned_from_headers(self):
+        with FakeGroqServer(requests_per_minute=100, tokens_per_minute=50000) as server:
+            limiter = RateLimitTracker(max_in_flight=2, tokens_per_minute=1000000)
+            client = GroqClient(rate_limiter=limiter, base_url=server.origin, api_key='fake-groq-key')
+            client.generate_completion('Digest: {}', max_tokens=200)
+        stats = limiter.stats()
+        self.assertEqual(stats['tokens_per_minute'], 50000)
+        self.assertEqual(stats['remaining_requests'], 99)
+        self.assertLess(stats['remaining_tokens'], 50000)
+
+    def test_requests_wait_for_the_minute_budget(self):
+        limiter = RateLimitTracker(max_in_flight=4, requests_per_minute=2)
+        limiter.release(limiter.acquire(10))
+        limiter.release(limiter.acquire(10))
+        self.assertGreater(limiter._delay(10, limiter._window[0][0]), 59)
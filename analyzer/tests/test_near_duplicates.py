@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase, TestCase
+
+from analyzer.models import Product
+from analyzer.services.llm_service import LLMService
+from analyzer.services.near_duplicates import distance, group_near_duplicates, simhash, stored_index
+
+DESCRIPTION = (
+    "Thin and light laptop with a 14 inch full HD display, backlit keyboard, fingerprint reader, "
+    "all day battery life and fast charging, {ram} GB RAM and a 512 GB SSD, in {colour}"
+)
+OTHER = (
+    "Gaming laptop with a 16 inch 165 Hz display, dedicated graphics card, per key RGB keyboard, "
+    "vapour chamber cooling and a 1 TB SSD for a large game library, in {colour}"
+)
+
+
+class SimHashTests(SimpleTestCase):
+    def test_variants_are_close_and_different_products_are_not(self):
+        silver = simhash(DESCRIPTION.format(ram=16, colour='silver'))
+        grey = simhash(DESCRIPTION.format(ram=16, colour='grey'))
+        gaming = simhash(OTHER.format(colour='black'))
+        self.assertLessEqual(distance(silver, grey), 4)
+        self.assertGreater(distance(silver, gaming), 4)
+
+    def test_short_descriptions_have_no_hash(self):
+        self.assertIsNone(simhash("A laptop"))
+        self.assertIsNone(simhash(None))
+
+    def test_groups_follow_the_first_variant(self):
+        hashes = {
+            'a': simhash(DESCRIPTION.format(ram=16, colour='silver')),
+            'b': simhash(OTHER.format(colour='black')),
+            'c': simhash(DESCRIPTION.format(ram=16, colour='grey')),
+            'd': None,
+        }
+        self.assertEqual(group_near_duplicates(hashes, max_distance=4), {'a': 'a', 'b': 'b', 'c': 'a'})
+
+
+class GroupNearDuplicatesTests(TestCase):
+    def setUp(self):
+        description = DESCRIPTION.format(ram=16, colour='silver')
+        self.stored = Product.objects.create(
+            name="Laptop silver", price=Decimal('100.00'), description=description, simhash=simhash(description),
+            url="https://www.amazon.in/dp/B000000001", asin='B000000001', search_key='laptop',
+            ai_summary="A light laptop"
+        )
+        self.service = LLMService(api_key='fake-groq-key')
+
+    def payload(self, uuid, description):
+        return {'uuid': uuid, 'name': uuid, 'description': description, 'price': 100.0, 'rating': None}
+
+    def test_stored_and_batch_representatives_are_told_apart(self):
+        stored_variant = self.payload('stored-variant', DESCRIPTION.format(ram=16, colour='grey'))
+        first = self.payload('first', OTHER.format(colour='black'))
+        batch_variant = self.payload('batch-variant', OTHER.format(colour='white'))
+        to_send, variants, reused = self.service._group_near_duplicates(
+            [stored_variant, first, batch_variant], 'laptop'
+        )
+        self.assertEqual(to_send, [first])
+        self.assertEqual(variants, {'first': ['batch-variant']})
+        self.assertEqual(reused, {'stored-variant': "A light laptop"})
+
+    def test_variant_is_sent_when_the_stored_summary_went_away(self):
+        stored_variant = self.payload('stored-variant', DESCRIPTION.format(ram=16, colour='grey'))
+        index = stored_index(Product.objects.all(), 'uuid', tag='stored')
+        self.assertEqual(index.nearest(self.stored.simhash), ('stored', self.stored.uuid))
+        Product.objects.filter(uuid=self.stored.uuid).update(ai_summary='')
+        to_send, _, reused = self.service._group_near_duplicates([stored_variant], 'laptop')
+        self.assertEqual(to_send, [stored_variant])
+        self.assertEqual(reused, {})
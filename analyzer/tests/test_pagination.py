@@ -0,0 +1,113 @@
+from datetime import timedelta
+from decimal import Decimal
+from itertools import count
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from analyzer.models import Product
+from analyzer.services.pagination import AFTER, encode_cursor, keyset_page
+
+
+ASINS = count()
+
+
+def make_products(number, created_at):
+    asins = [f"B{next(ASINS):09d}" for _ in range(number)]
+    products = Product.objects.bulk_create([
+        Product(
+            name=f"Laptop {asin}", price=Decimal('100.00'), description="A laptop",
+            url=f"https://www.amazon.in/dp/{asin}", asin=asin
+        )
+        for asin in asins
+    ])
+    Product.objects.filter(uuid__in=[p.uuid for p in products]).update(created_at=created_at)
+    return products
+
+
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        now = timezone.now().replace(microsecond=0)
+        # Most rows share one timestamp, so page boundaries fall inside a run of equal created_at
+        make_products(3, now)
+        Product.objects.filter(created_at=now).update(created_at=now + timedelta(seconds=1))
+        make_products(10, now)
+        Product.objects.filter(created_at=now).exclude(
+            uuid__in=Product.objects.filter(created_at=now).order_by('uuid').values('uuid')[:8]
+        ).update(created_at=now - timedelta(seconds=1))
+        self.expected = list(Product.objects.order_by('-created_at', '-uuid').values_list('uuid', flat=True))
+
+    def walk_forward(self, page_size):
+        pages, cursor = [], None
+        while True:
+            page = keyset_page(Product.objects.all(), page_size, cursor)
+            pages.append(page)
+            cursor = page['next']
+            if cursor is None:
+                return pages
+
+    def test_forward_pages_cover_every_row_once_in_order(self):
+        for page_size in (1, 3, 4, 13, 20):
+            with self.subTest(page_size=page_size):
+                pages = self.walk_forward(page_size)
+                seen = [p.uuid for page in pages for p in page['results']]
+                self.assertEqual(seen, self.expected)
+                self.assertIsNone(pages[0]['prev'])
+                self.assertTrue(all(len(page['results']) == page_size for page in pages[:-1]))
+
+    def test_backward_pages_return_the_same_pages(self):
+        pages = self.walk_forward(3)
+        cursor = pages[-1]['prev']
+        for expected in reversed(pages[:-1]):
+            page = keyset_page(Product.objects.all(), 3, cursor)
+            self.assertEqual([p.uuid for p in page['results']], [p.uuid for p in expected['results']])
+            self.assertEqual(page['next'], expected['next'])
+            cursor = page['prev']
+        self.assertIsNone(cursor)
+
+    def test_rows_added_while_paging_do_not_shift_later_pages(self):
+        first = keyset_page(Product.objects.all(), 4)
+        make_products(5, timezone.now() + timedelta(days=1))
+        second = keyset_page(Product.objects.all(), 4, first['next'])
+        self.assertEqual([p.uuid for p in second['results']], self.expected[4:8])
+
+    def test_seeks_with_a_row_value_comparison(self):
+        first = keyset_page(Product.objects.all(), 3)
+        with CaptureQueriesContext(connection) as queries:
+            keyset_page(Product.objects.all(), 3, first['next'])
+        table = Product._meta.db_table
+        self.assertIn(f'("{table}"."created_at", "{table}"."uuid") < (', queries[0]['sql'])
+
+    def test_cursor_past_the_last_row_is_an_empty_page(self):
+        last = Product.objects.get(uuid=self.expected[-1])
+        page = keyset_page(Product.objects.all(), 3, encode_cursor(last, AFTER))
+        self.assertEqual(page, {'results': [], 'next': None, 'prev': None})
+
+
+class ProductListViewTests(TestCase):
+    def setUp(self):
+        make_products(5, timezone.now())
+
+    def test_pages_through_the_api(self):
+        response = self.client.get(reverse('product-list'), {'page_size': 2, 'count': 'exact'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 5)
+        self.assertFalse(response.json()['total_is_estimate'])
+        uuids = [p['uuid'] for p in response.json()['results']]
+        cursor = response.json()['next']
+        while cursor:
+            body = self.client.get(reverse('product-list'), {'page_size': 2, 'cursor': cursor, 'count': 'none'}).json()
+            self.assertIsNone(body['total'])
+            uuids += [p['uuid'] for p in body['results']]
+            cursor = body['next']
+        self.assertEqual(len(uuids), 5)
+        self.assertEqual(len(set(uuids)), 5)
+
+    def test_rejects_bad_input(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'page_size': 0}, {'page_size': 'ten'}, {'count': 'approximate'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('product-list'), params)
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import tempfile
+from functools import partial
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from tenacity import wait_none
+
+from analyzer.management.commands.benchmark_parsers import FIXTURES_DIR
+from analyzer.management.commands.run_scraper import AmazonScraper, AsyncAmazonScraper, extract_asin
+from analyzer.services.extractors import EXTRACTORS, available_extractors
+from analyzer.models import Product
+from analyzer.services.fake_amazon import (
+    FakeAmazonServer, load_products, multiply_products, render_product_page, render_search_page, variant_asin
+)
+from analyzer.services.rate_limiter import AdaptiveController, HostRateLimiter, TokenBucket
+from analyzer.services.scraping import scrape_search_term
+
+CATALOGUE = load_products()[:25]
+
+# Fast enough that the token bucket never holds a test up, and no page cache left behind
+FAST_SCRAPER = dict(
+    SCRAPE_CACHE_ENABLED=False,
+    SCRAPE_RATE_LIMIT=500,
+    SCRAPE_BURST=50,
+    SCRAPE_MAX_RATE=1000,
+    SCRAPE_CONCURRENCY=4,
+    SCRAPE_FRESHNESS_HOURS=24,
+)
+
+
+class ParserTests(SimpleTestCase):
+    def setUp(self):
+        self.scraper = AmazonScraper(origin='http://fake.test')
+
+    def test_search_page_links(self):
+        links = self.scraper._parse_product_links(render_search_page(CATALOGUE[:3]).encode('utf-8'))
+        expected = [f"http://fake.test/{p['asin']}/dp/{p['asin']}/ref=sr_1_{i}" for i, p in enumerate(CATALOGUE[:3], 1)]
+        self.assertEqual(links, expected)
+
+    def test_product_page(self):
+        product = next(p for p in CATALOGUE if p.get('rating'))
+        url = f"http://fake.test/dp/{product['asin']}"
+        page = render_product_page(product, padding_kb=20).encode('utf-8')
+        parsed = self.scraper._parse_product(page, url, 'laptops')
+        self.assertEqual(parsed['name'], product['name'].strip())
+        self.assertEqual(parsed['price'], round(product['price']))
+        self.assertEqual(parsed['rating'], product['rating'])
+        self.assertEqual(parsed['asin'], product['asin'])
+        self.assertEqual(parsed['search_key'], 'laptops')
+
+    def test_page_missing_fields_is_dropped(self):
+        page = render_product_page(dict(CATALOGUE[0], description='')).encode('utf-8')
+        self.assertIsNone(self.scraper._parse_product(page, 'http://fake.test/dp/X', 'laptops'))
+
+    def test_backends_agree_on_the_saved_pages(self):
+        pages = sorted(FIXTURES_DIR.glob('*.html'))
+        self.assertTrue(pages)
+        for path in pages:
+            content = path.read_bytes()
+            expected = EXTRACTORS['soup']().extract_product(content)
+            for name in available_extractors():
+                with self.subTest(page=path.name, backend=name):
+                    fields = EXTRACTORS[name]().extract_product(content)
+                    self.assertEqual(
+                        {key: value and ' '.join(value.split()) for key, value in fields.items()},
+                        {key: value and ' '.join(value.split()) for key, value in expected.items()}
+                    )
+
+
+class FakeCatalogueTests(SimpleTestCase):
+    def test_variants_keep_valid_unique_asins(self):
+        catalogue = multiply_products(CATALOGUE[:3], 150)
+        asins = [p['asin'] for p in catalogue]
+        self.assertEqual(len(set(asins)), len(catalogue))
+        for asin in asins:
+            self.assertEqual(extract_asin(f'https://www.amazon.in/dp/{asin}'), asin)
+
+    def test_variant_numbers_must_fit_in_an_asin(self):
+        self.assertEqual(variant_asin(36 ** 8 - 1), 'BXZZZZZZZZ')
+        with self.assertRaises(ValueError):
+            variant_asin(36 ** 8)
+
+
+@override_settings(**FAST_SCRAPER)
+class ScrapeSearchTermTests(TestCase):
+    def scrape(self, server, **kwargs):
+        scraper = partial(AsyncAmazonScraper, origin=server.origin)
+        with mock.patch('analyzer.services.scraping.AsyncAmazonScraper', scraper):
+            return scrape_search_term('laptops', max_pages=1, **kwargs)
+
+    def test_scraped_products_are_saved(self):
+        with FakeAmazonServer(products=CATALOGUE) as server:
+            result = self.scrape(server)
+        self.assertEqual(result['products_scraped'], 20)
+        self.assertEqual(result['products_failed'], 0)
+        self.assertEqual(result['pages_fetched'], 21)
+        saved = {p.asin: p for p in Product.objects.filter(search_key='laptops')}
+        self.assertEqual(set(saved), {p['asin'] for p in CATALOGUE[:20]})
+        for product in CATALOGUE[:20]:
+            self.assertEqual(saved[product['asin']].name, product['name'].strip())
+            self.assertEqual(float(saved[product['asin']].price), round(product['price']))
+
+    def test_fresh_products_are_skipped(self):
+        with FakeAmazonServer(products=CATALOGUE) as server:
+            self.scrape(server)
+            result = self.scrape(server)
+            self.assertEqual(result['products_skipped'], 20)
+            self.assertEqual(result['pages_fetched'], 1)
+            result = self.scrape(server, incremental=False)
+        self.assertEqual(result['products_scraped'], 20)
+        self.assertEqual(Product.objects.count(), 20)
+
+    def test_server_errors_are_retried(self):
+        with FakeAmazonServer(products=CATALOGUE, error_rate=0.1, seed=3) as server, \
+                mock.patch.object(AsyncAmazonScraper._fetch.retry, 'wait', wait_none()):
+            result = self.scrape(server)
+        self.assertGreater(server.counters['errors'], 0)
+        self.assertEqual(result['products_scraped'], 20)
+        self.assertEqual(result['adaptive']['throttled'], server.counters['errors'])
+
+    def test_streamed_prefixes_stay_out_of_the_full_page_cache(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                self.settings(SCRAPE_CACHE_ENABLED=True, SCRAPE_CACHE_PATH=os.path.join(tmp, 'cache.sqlite3')), \
+                FakeAmazonServer(products=CATALOGUE, padding_kb=200) as server:
+            self.scrape(server)
+            scraper = AmazonScraper(origin=server.origin)
+            url = f"{server.origin}/dp/{CATALOGUE[0]['asin']}"
+            _, full = scraper._cache_lookup(url)
+            _, prefix = scraper._cache_lookup(url, partial=True)
+            self.assertIsNone(full)
+            self.assertLess(len(prefix.body), 200 * 1024)
+            # A second streamed run is served from the prefixes
+            result = self.scrape(server, incremental=False)
+            self.assertEqual(result['products_scraped'], 20)
+            self.assertEqual(result['pages_fetched'], 1)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_then_steady_rate(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta=0.01)
+        # Callers queue up behind each other
+        self.assertAlmostEqual(bucket.reserve(), 0.2, delta=0.01)
+
+    def test_rate_change_applies_to_the_next_reservation(self):
+        bucket = TokenBucket(rate=10)
+        bucket.reserve()
+        bucket.set_rate(1)
+        self.assertAlmostEqual(bucket.reserve(), 1.0, delta=0.01)
+
+    def test_hosts_have_their_own_buckets(self):
+        limiter = HostRateLimiter(rate=1)
+        self.assertIs(limiter.bucket_for('https://www.amazon.in/s'), limiter.bucket_for('https://WWW.amazon.in/dp/X'))
+        self.assertIsNot(limiter.bucket_for('https://www.amazon.in/s'), limiter.bucket_for('http://127.0.0.1:8000/s'))
+        limiter.set_rate(5)
+        self.assertEqual(limiter.bucket_for('https://www.amazon.in/s').rate, 5)
+        self.assertEqual(limiter.bucket_for('https://other.test/').rate, 5)
+
+
+class AdaptiveControllerTests(SimpleTestCase):
+    def setUp(self):
+        self.limiter = HostRateLimiter(rate=1)
+        self.controller = AdaptiveController(
+            self.limiter, concurrency=4, rate=1, max_concurrency=8, max_rate=2, min_rate=0.2
+        )
+
+    def test_a_round_of_successes_steps_up(self):
+        for _ in range(3):
+            self.controller.on_success()
+        self.assertEqual(self.controller.limits(), {'concurrency': 4, 'rate': 1})
+        self.controller.on_success()
+        self.assertEqual(self.controller.limits(), {'concurrency': 5, 'rate': 1.1})
+        self.assertAlmostEqual(self.limiter.rate, 1.1)
+
+    def test_one_cut_per_round_trip(self):
+        self.controller.on_throttle(0, 'blocked')
+        # Requests that started before the cut report the old epoch
+        self.controller.on_throttle(0, 'blocked')
+        self.assertEqual(self.controller.limits(), {'concurrency': 2, 'rate': 0.5})
+        self.controller.on_throttle(1, 'HTTP 503')
+        self.assertEqual(self.controller.limits(), {'concurrency': 1, 'rate': 0.25})
+        self.controller.on_throttle(2, 'HTTP 503')
+        self.assertEqual(self.controller.limits(), {'concurrency': 1, 'rate': 0.2})
+        self.assertEqual(self.controller.stats()['throttled'], 4)
+        self.assertEqual(self.controller.stats()['decreases'], 3)
+
+    def test_fixed_limits_when_not_adaptive(self):
+        controller = AdaptiveController(self.limiter, concurrency=4, rate=1, max_concurrency=8, adaptive=False)
+        controller.on_throttle(0, 'blocked')
+        for _ in range(8):
+            controller.on_success()
+        self.assertEqual(controller.limits(), {'concurrency': 4, 'rate': 1})
+
+    def test_waiting_requests_take_freed_and_added_slots(self):
+        controller = AdaptiveController(self.limiter, concurrency=1, rate=1, max_concurrency=2, max_rate=2)
+        started = []
+
+        async def request(name, hold):
+            async with controller.slot():
+                started.append(name)
+                await hold.wait()
+
+        async def run():
+            first, second, third = asyncio.Event(), asyncio.Event(), asyncio.Event()
+            tasks = [
+                asyncio.ensure_future(request(name, hold))
+                for name, hold in (('first', first), ('second', second), ('third', third))
+            ]
+            await asyncio.sleep(0.01)
+            self.assertEqual(started, ['first'])
+            # A round of successes adds a second slot
+            controller.on_success()
+            await asyncio.sleep(0.01)
+            self.assertEqual(started, ['first', 'second'])
+            first.set()
+            await asyncio.sleep(0.01)
+            self.assertEqual(started, ['first', 'second', 'third'])
+            second.set()
+            third.set()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
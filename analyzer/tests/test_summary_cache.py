@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from analyzer.models import SummaryCache
+from analyzer.services.summary_cache import SummaryStore
+
+PAYLOAD = {'uuid': 'a', 'name': 'Laptop  X', 'description': 'Fast\nand light', 'price': 100, 'rating': 4.0}
+
+
+class SummaryStoreTests(TestCase):
+    def setUp(self):
+        self.store = SummaryStore('model', 'v1')
+
+    def test_same_content_hits_under_another_product(self):
+        self.store.put_many([PAYLOAD], {'a': "Summary"})
+        same = dict(PAYLOAD, uuid='b', name='Laptop X', description='Fast and light', price='100.00')
+        changed = dict(PAYLOAD, uuid='c', price=90)
+        self.assertEqual(self.store.get_many([same, changed]), {'b': "Summary"})
+        self.assertEqual(self.store.stats()['hit_rate'], 0.5)
+        self.assertEqual(SummaryCache.objects.get().hits, 1)
+
+    def test_prompt_or_model_change_misses(self):
+        self.store.put_many([PAYLOAD], {'a': "Summary"})
+        self.assertEqual(SummaryStore('model', 'v2').get_many([PAYLOAD]), {})
+        self.assertEqual(SummaryStore('other-model', 'v1').get_many([PAYLOAD]), {})
+
+    @override_settings(LLM_SUMMARY_CACHE_MAX_ENTRIES=2, LLM_SUMMARY_CACHE_TTL_DAYS=30)
+    def test_stale_and_least_recently_used_entries_are_evicted(self):
+        payloads = [dict(PAYLOAD, uuid=str(i), price=i) for i in range(4)]
+        self.store.put_many(payloads, {str(i): f"Summary {i}" for i in range(4)})
+        now = timezone.now()
+        for i, payload in enumerate(payloads):
+            # 40, 30, 20 and 10 days unused
+            last_used_at = now - timedelta(days=40 - i * 10)
+            SummaryCache.objects.filter(key=self.store.key_for(payload)).update(last_used_at=last_used_at)
+        self.assertEqual(self.store.evict(), 2)
+        self.assertEqual(set(self.store.get_many(payloads)), {'2', '3'})
+
+    @override_settings(LLM_SUMMARY_CACHE_ENABLED=False)
+    def test_disabled_cache_stores_nothing(self):
+        self.store.put_many([PAYLOAD], {'a': "Summary"})
+        self.assertEqual(self.store.get_many([PAYLOAD]), {})
+        self.assertFalse(SummaryCache.objects.exists())
@@ -0,0 +1,93 @@
+import uuid
+
+from django.test import TestCase
+
+from analyzer.models import Product, SearchKeyStats
+from analyzer.services.product_writer import ProductWriter
+from analyzer.services.summary_leases import claim_products
+from analyzer.services.summary_writer import SummaryWriter
+
+from .test_near_duplicates import DESCRIPTION, OTHER
+
+
+def product_data(asin, price=100.0, rating=4.0, description=None, search_key='laptops'):
+    return {
+        'name': f"Laptop {asin}", 'price': price, 'rating': rating,
+        'description': description or OTHER.format(colour=asin),
+        'url': f"https://www.amazon.in/dp/{asin}", 'asin': asin, 'search_key': search_key,
+    }
+
+
+class ProductWriterTests(TestCase):
+    def test_products_are_upserted_in_batches(self):
+        with ProductWriter(batch_size=2) as writer:
+            for asin in ('B000000001', 'B000000002', 'B000000003'):
+                writer.add(product_data(asin))
+        self.assertEqual((writer.written, writer.batches, writer.failed), (3, 2, 0))
+
+        with ProductWriter() as writer:
+            writer.add(product_data('B000000001', price=80.0))
+            # The last copy of an ASIN in a batch wins
+            writer.add(product_data('B000000002', price=90.0))
+            writer.add(product_data('B000000002', price=95.0))
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(Product.objects.get(asin='B000000001').price, 80)
+        self.assertEqual(Product.objects.get(asin='B000000002').price, 95)
+
+        stats = SearchKeyStats.objects.get(search_key='laptops')
+        self.assertEqual(stats.product_count, 3)
+        self.assertEqual(stats.price_min, 80)
+        self.assertAlmostEqual(stats.price_sum, 275)
+
+    def test_a_bad_product_does_not_take_its_batch_down(self):
+        with ProductWriter() as writer:
+            writer.add(product_data('B000000001'))
+            writer.add(dict(product_data('B000000002'), name=None))
+        self.assertEqual((writer.written, writer.failed), (1, 1))
+        self.assertEqual(list(Product.objects.values_list('asin', flat=True)), ['B000000001'])
+
+    def test_products_without_an_asin_are_skipped(self):
+        for _ in range(2):
+            with ProductWriter() as writer:
+                writer.add(product_data('B000000001'))
+                writer.add(dict(product_data('B000000002'), asin=None, url='https://www.amazon.in/gp/offer'))
+            self.assertEqual((writer.written, writer.skipped), (1, 1))
+        self.assertEqual(list(Product.objects.values_list('asin', flat=True)), ['B000000001'])
+
+    def test_variants_are_flagged_as_near_duplicates(self):
+        with ProductWriter() as writer:
+            writer.add(product_data('B000000001', description=DESCRIPTION.format(ram=16, colour='silver')))
+        with ProductWriter() as writer:
+            writer.add(product_data('B000000002', description=DESCRIPTION.format(ram=16, colour='grey')))
+            writer.add(product_data('B000000003', description=OTHER.format(colour='black')))
+        self.assertEqual(writer.near_duplicates, 1)
+        flags = dict(Product.objects.values_list('asin', 'duplicate_of'))
+        self.assertEqual(flags, {'B000000001': None, 'B000000002': 'B000000001', 'B000000003': None})
+
+
+class SummaryWriterTests(TestCase):
+    def setUp(self):
+        with ProductWriter() as writer:
+            for asin in ('B000000001', 'B000000002'):
+                writer.add(product_data(asin))
+        self.products = claim_products('laptops', 'job-1')
+        self.uuids = [str(p.uuid) for p in self.products]
+
+    def test_summaries_are_written_and_leases_cleared(self):
+        with SummaryWriter(self.uuids) as writer:
+            for key in self.uuids:
+                self.assertTrue(writer.add({'uuid': key.upper(), 'summary': f"Summary of {key}"}))
+        self.assertEqual(writer.written, 2)
+        for product in Product.objects.all():
+            self.assertEqual(product.ai_summary, f"Summary of {product.uuid}")
+            self.assertIsNone(product.summary_leased_by)
+
+    def test_unexpected_uuids_are_rejected(self):
+        other = Product.objects.create(**product_data('B000000009'))
+        with SummaryWriter(self.uuids[:1]) as writer:
+            self.assertFalse(writer.add({'uuid': str(other.uuid), 'summary': "Stolen"}))
+            self.assertFalse(writer.add({'uuid': str(uuid.uuid4()), 'summary': "Made up"}))
+            self.assertFalse(writer.add({'uuid': 'not-a-uuid', 'summary': "Broken"}))
+            self.assertFalse(writer.add({'uuid': self.uuids[0], 'summary': ''}))
+        self.assertEqual((writer.written, writer.rejected), (0, 4))
+        self.assertFalse(Product.objects.filter(ai_summary__isnull=False).exists())
@@ -1,13 +1,16 @@
 from django.urls import path
 from .views import (
-    ProductListView, ProductDetailView, ProductInsightsView,
-    ScrapingView, ProcessProductsView
+    ProductListView, ProductDetailView, ProductInsightsView, SearchKeyStatsView, LLMMetricsView,
+    ScrapingView, ProcessProductsView, JobDetailView
 )
 
 urlpatterns = [
     path('products/', ProductListView.as_view(), name='product-list'),
     path('products/<uuid:uuid>/', ProductDetailView.as_view(), name='product-detail'),
     path('insights/', ProductInsightsView.as_view(), name='product-insights'),
+    path('stats/', SearchKeyStatsView.as_view(), name='search-key-stats'),
+    path('metrics/', LLMMetricsView.as_view(), name='llm-metrics'),
     path('scrape/', ScrapingView.as_view(), name='scrape-products'),
     path('process/', ProcessProductsView.as_view(), name='process-products'),
+    path('jobs/<uuid:uuid>/', JobDetailView.as_view(), name='job-detail'),
 ] 
\ No newline at end of file
@@ -1,17 +1,22 @@
 import logging
+import math
+import uuid
+from datetime import timedelta
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.core.paginator import Paginator
-from django.db import transaction
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import Product, ProductTrend
-from .services.llm_service import LLMService
-from .management.commands.run_scraper import AmazonScraper
+from .models import Job, LLMCall, Product, ProductTrend, SearchKeyStats
+from .services.jobs import enqueue
+from .services.llm_metrics import aggregate_calls
+from .services.pagination import InvalidCursor, count_rows, keyset_page
 
 logger = logging.getLogger(__name__)
 
@@ -25,41 +30,69 @@ class BaseAPIView(APIView):
         )
 
 class ProductListView(BaseAPIView):
+    COUNT_MODES = ('estimate', 'exact', 'none')
+
     @swagger_auto_schema(
-        operation_description="Retrieve a list of products",
+        operation_description=(
+            "Retrieve a list of products, newest first. Follow the `next` and `prev` cursors to page through it"
+        ),
         manual_parameters=[
             openapi.Parameter(
-                'page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER, default=1
+                'cursor', openapi.IN_QUERY, description="A `next` or `prev` cursor from an earlier page; omit for the first page",
+                type=openapi.TYPE_STRING
             ),
             openapi.Parameter(
                 'page_size', openapi.IN_QUERY, description="Number of products per page", type=openapi.TYPE_INTEGER, default=20
             ),
+            openapi.Parameter(
+                'count', openapi.IN_QUERY,
+                description=(
+                    "How to compute `total`: estimate (from planner statistics where the database has them), "
+                    "exact, or none"
+                ),
+                type=openapi.TYPE_STRING, enum=list(COUNT_MODES), default='estimate'
+            ),
         ],
         responses={200: openapi.Response('List of products', openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
-                'total': openapi.Schema(type=openapi.TYPE_INTEGER),
-                'total_pages': openapi.Schema(type=openapi.TYPE_INTEGER),
-                'current_page': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'total': openapi.Schema(type=openapi.TYPE_INTEGER, nullable=True),
+                'total_is_estimate': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                'page_size': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'next': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
+                'prev': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
                 'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Items(type=openapi.TYPE_OBJECT))
             }
         ))}
     )
     def get(self, request):
         try:
-            page = request.GET.get('page', 1)
-            page_size = request.GET.get('page_size', 20)
-            
-            products = Product.objects.all().order_by('-created_at')
-            paginator = Paginator(products, page_size)
-            
-            current_page = paginator.page(page)
+            page_size = int(request.GET.get('page_size', 20))
+        except ValueError:
+            return self.json_response({'error': 'page_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= page_size <= settings.PRODUCT_PAGE_MAX_SIZE:
+            return self.json_response(
+                {'error': f'page_size must be between 1 and {settings.PRODUCT_PAGE_MAX_SIZE}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        count = request.GET.get('count', 'estimate')
+        if count not in self.COUNT_MODES:
+            return self.json_response(
+                {'error': f"count must be one of {', '.join(self.COUNT_MODES)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            products = Product.objects.all()
+            page = keyset_page(products, page_size, request.GET.get('cursor') or None)
             return self.json_response({
-                'total': paginator.count,
-                'total_pages': paginator.num_pages,
-                'current_page': int(page),
-                'results': [product.to_dict() for product in current_page]
+                **count_rows(products, count),
+                'page_size': page_size,
+                'next': page['next'],
+                'prev': page['prev'],
+                'results': [product.to_dict() for product in page['results']]
             })
+        except InvalidCursor as e:
+            return self.json_response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             logger.error(f"Error retrieving product list: {str(e)}")
             return self.json_response({'error': 'An error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -142,66 +175,153 @@ class ProductInsightsView(BaseAPIView):
             logger.error(f"Error retrieving insights: {str(e)}")
             return self.json_response({'error': 'An error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class ScrapingView(APIView):
+class SearchKeyStatsView(BaseAPIView):
+    @swagger_auto_schema(
+        operation_description="Price and rating statistics of the products under a search key, or of every search key",
+        manual_parameters=[
+            openapi.Parameter(
+                'search_key', openapi.IN_QUERY, description="Search key; omit for all search keys", type=openapi.TYPE_STRING
+            ),
+        ],
+        responses={200: openapi.Response('Search key statistics', openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'search_key': openapi.Schema(type=openapi.TYPE_STRING),
+                'product_count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'rated_count': openapi.Schema(type=openapi.TYPE_INTEGER),
+                'price': openapi.Schema(type=openapi.TYPE_OBJECT),
+                'rating': openapi.Schema(type=openapi.TYPE_OBJECT),
+                'price_rating_correlation': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
+                'updated_at': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+            }
+        ))}
+    )
+    def get(self, request):
+        try:
+            search_key = request.GET.get('search_key')
+            if search_key is None:
+                return self.json_response({
+                    'results': [stats.to_dict() for stats in SearchKeyStats.objects.order_by('search_key')]
+                })
+            return self.json_response(SearchKeyStats.objects.get(search_key=search_key).to_dict())
+        except SearchKeyStats.DoesNotExist:
+            logger.warning(f"No stats available for search key: {search_key}")
+            return self.json_response({'error': 'No stats available'}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.error(f"Error retrieving stats: {str(e)}")
+            return self.json_response({'error': 'An error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class LLMMetricsView(BaseAPIView):
     @swagger_auto_schema(
-        operation_description="Trigger product scraping from Amazon",
+        operation_description=(
+            "LLM call metrics by call type and search key: calls, retries, hedges, outcomes and JSON failure rate, "
+            "token and cost totals, and histograms of latency, time to first chunk, tokens and cost"
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                'hours', openapi.IN_QUERY, description="Only calls made in the last this many hours",
+                type=openapi.TYPE_NUMBER, default=24
+            ),
+            openapi.Parameter('call_type', openapi.IN_QUERY, description="summary or trends", type=openapi.TYPE_STRING),
+            openapi.Parameter('search_key', openapi.IN_QUERY, description="Search key", type=openapi.TYPE_STRING),
+            openapi.Parameter('job', openapi.IN_QUERY, description="Only calls made by this job", type=openapi.TYPE_STRING),
+        ],
+        responses={200: openapi.Response('LLM call metrics', openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'since': openapi.Schema(type=openapi.TYPE_STRING, format='date-time'),
+                'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+            }
+        ))}
+    )
+    def get(self, request):
+        try:
+            hours = float(request.GET.get('hours', 24))
+            if not math.isfinite(hours) or hours <= 0:
+                raise ValueError(hours)
+            since = timezone.now() - timedelta(hours=hours)
+        except (ValueError, OverflowError):
+            return self.json_response({'error': 'hours must be a positive number'}, status=status.HTTP_400_BAD_REQUEST)
+        job = None
+        if request.GET.get('job'):
+            try:
+                job = uuid.UUID(request.GET['job'])
+            except ValueError:
+                return self.json_response({'error': 'job must be a UUID'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            calls = LLMCall.objects.filter(created_at__gte=since)
+            for param in ('call_type', 'search_key'):
+                if request.GET.get(param):
+                    calls = calls.filter(**{param: request.GET[param]})
+            if job is not None:
+                calls = calls.filter(job_id=job)
+            return self.json_response({'since': since.isoformat(), 'results': aggregate_calls(calls)})
+        except Exception as e:
+            logger.error(f"Error retrieving LLM metrics: {str(e)}")
+            return self.json_response({'error': 'An error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+JOB_ACCEPTED_SCHEMA = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'message': openapi.Schema(type=openapi.TYPE_STRING),
+        'job_id': openapi.Schema(type=openapi.TYPE_STRING),
+        'status_url': openapi.Schema(type=openapi.TYPE_STRING),
+    }
+)
+
+class JobQueueMixin:
+    def enqueue_response(self, request, kind, params, message):
+        job = enqueue(kind, params)
+        return Response({
+            'message': message,
+            'job_id': str(job.uuid),
+            'status_url': request.build_absolute_uri(reverse('job-detail', kwargs={'uuid': job.uuid}))
+        }, status=status.HTTP_202_ACCEPTED)
+
+class ScrapingView(JobQueueMixin, APIView):
+    @swagger_auto_schema(
+        operation_description="Queue a product scraping job; poll the returned status_url for progress and results",
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
                 'search_term': openapi.Schema(type=openapi.TYPE_STRING, default='laptops'),
                 'max_pages': openapi.Schema(type=openapi.TYPE_INTEGER, default=1),
+                'incremental': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN, default=True,
+                    description="Skip products refreshed within SCRAPE_FRESHNESS_HOURS"
+                ),
+                'distributed': openapi.Schema(
+                    type=openapi.TYPE_BOOLEAN, default=settings.SCRAPE_DISTRIBUTED,
+                    description="Spread product pages over the frontier workers instead of scraping in this job alone"
+                ),
             },
             required=['search_term']
         ),
-        responses={
-            200: openapi.Response('Scraping results', openapi.Schema(
-                type=openapi.TYPE_OBJECT,
-                properties={
-                    'message': openapi.Schema(type=openapi.TYPE_STRING),
-                    'products_scraped': openapi.Schema(type=openapi.TYPE_INTEGER),
-                }
-            ))
-        }
+        responses={202: openapi.Response('Scraping job queued', JOB_ACCEPTED_SCHEMA)}
     )
     def post(self, request):
         try:
             search_term = request.data.get('search_term', 'laptops')
             max_pages = int(request.data.get('max_pages', 1))
+            incremental = request.data.get('incremental', True) not in (False, 'false', 'False', 0, '0')
+            distributed = request.data.get('distributed', settings.SCRAPE_DISTRIBUTED) not in (False, 'false', 'False', 0, '0')
             
-            scraper = AmazonScraper()
-            product_links = scraper.get_product_links(
-                search_term=search_term,
-                max_pages=max_pages
-            )
-            
-            successful_scrapes = 0
-            logger.info(f"Received total of {len(product_links) - 1} product links from scrape")
-            with transaction.atomic():
-                for url in product_links:
-                    try:
-                        product_data = scraper.scrape_product(url, search_term)
-                        if product_data:
-                            Product.objects.create(**product_data)
-                            successful_scrapes += 1
-                            logger.info(f"Scraped {successful_scrapes}")
-                    except Exception as e:
-                        logger.error(f"Error scraping product {url}: {str(e)}")
-                        continue
-            
-            return Response({
-                'message': 'Scraping completed successfully',
-                'products_scraped': successful_scrapes
-            })
+            return self.enqueue_response(request, Job.KIND_SCRAPE, {
+                'search_term': search_term,
+                'max_pages': max_pages,
+                'incremental': incremental,
+                'distributed': distributed
+            }, 'Scraping job queued')
         except Exception as e:
-            logger.error(f"Error during scraping: {str(e)}")
+            logger.error(f"Error queueing scraping job: {str(e)}")
             return Response(
                 {'error': 'An error occurred during scraping'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class ProcessProductsView(APIView):
+class ProcessProductsView(JobQueueMixin, APIView):
     @swagger_auto_schema(
-        operation_description="Process products with LLM for summaries and trends",
+        operation_description="Queue LLM processing of products for summaries and trends; poll the returned status_url",
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
@@ -209,30 +329,45 @@ class ProcessProductsView(APIView):
             },
             required=['search_key']
         ),
-        responses={
-            200: openapi.Response('Processing results', openapi.Schema(
-                type=openapi.TYPE_OBJECT,
-                properties={
-                    'message': openapi.Schema(type=openapi.TYPE_STRING),
-                    'trends': openapi.Schema(type=openapi.TYPE_OBJECT),
-                }
-            ))
-        }
+        responses={202: openapi.Response('Processing job queued', JOB_ACCEPTED_SCHEMA)}
     )
     def post(self, request):
         try:
             search_key = request.data.get('search_key', 'laptops')
-            llm_service = LLMService()
-            products = Product.objects.filter(ai_summary__isnull=True, search_key=search_key)
-            trends = llm_service.process_products(products=products)
-
-            return Response({
-                'message': 'Products processed successfully',
-                'trends': trends
-            })
+            return self.enqueue_response(
+                request, Job.KIND_PROCESS, {'search_key': search_key}, 'Processing job queued'
+            )
         except Exception as e:
-            logger.error(f"Error processing products: {str(e)}")
+            logger.error(f"Error queueing processing job: {str(e)}")
             return Response(
                 {'error': 'An error occurred during processing'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+class JobDetailView(BaseAPIView):
+    @swagger_auto_schema(
+        operation_description="Retrieve the status, progress and throughput of a scrape or process job",
+        responses={200: openapi.Response('Job status', openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'uuid': openapi.Schema(type=openapi.TYPE_STRING),
+                'kind': openapi.Schema(type=openapi.TYPE_STRING),
+                'status': openapi.Schema(type=openapi.TYPE_STRING),
+                'progress': openapi.Schema(type=openapi.TYPE_OBJECT),
+                'result': openapi.Schema(type=openapi.TYPE_OBJECT, nullable=True),
+                'error': openapi.Schema(type=openapi.TYPE_STRING, nullable=True),
+                'elapsed_seconds': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
+                'throughput_per_second': openapi.Schema(type=openapi.TYPE_NUMBER, nullable=True),
+            }
+        ))}
+    )
+    def get(self, request, uuid):
+        try:
+            job = Job.objects.get(uuid=uuid)
+            return self.json_response(job.to_dict())
+        except Job.DoesNotExist:
+            logger.warning(f"Job with UUID {uuid} not found")
+            return self.json_response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            logger.error(f"Error retrieving job: {str(e)}")
+            return self.json_response({'error': 'An error occurred'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -17,6 +17,6 @@ python ProductAnalyzer/manage.py migrate --noinput
 python ProductAnalyzer/manage.py collectstatic --noinput
 
 # Start Gunicorn
-exec gunicorn ProductAnalyzer.ProductAnalyzer.wsgi:application --bind 0.0.0.0:8000 --workers=4 --timeout=3600
+exec gunicorn ProductAnalyzer.ProductAnalyzer.wsgi:application --bind 0.0.0.0:8000 --workers=4 --timeout=120
 
 exec "$@"
\ No newline at end of file
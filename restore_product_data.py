@@ -5,19 +5,26 @@ import django
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ProductAnalyzer.ProductAnalyzer.settings")  # Replace with your actual project name
 django.setup()
 
-from analyzer.models import Product  # Now you can import Django models
+from analyzer.management.commands.run_scraper import extract_asin  # Now you can import Django code
+from analyzer.services.product_writer import ProductWriter
 import json
 
 # Load from JSON file
 with open("products_backup.json", "r") as f:
     products_list = json.load(f)
 
-# Restore products
-for product_data in products_list:
-    product_data.pop("uuid", None)  # Remove UUID if auto-generated
-    product_data.pop("created_at", None)  # Remove timestamps if auto-generated
-    product_data.pop("updated_at", None)
+# Restore products through ProductWriter, which also keeps the search key stats up to date
+with ProductWriter() as writer:
+    for product_data in products_list:
+        product_data.pop("uuid", None)  # Remove UUID if auto-generated
+        product_data.pop("created_at", None)  # Remove timestamps if auto-generated
+        product_data.pop("updated_at", None)
 
-    Product.objects.create(**product_data)
+        product_data.pop("ai_summary", None)  # Keep summaries already generated for restored products
+
+        # Upsert on (asin, search_key) so restoring twice does not duplicate products
+        product_data["asin"] = extract_asin(product_data["url"])
+        product_data.setdefault("search_key", "laptops")
+        writer.add(product_data)
 
 print("Products restored successfully!")